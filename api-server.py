@@ -6,6 +6,8 @@ from flask import Flask
 from flask_cors import CORS
 import sys
 import os
+import atexit
+import shutil
 
 # 加入模組路徑
 sys.path.append(os.path.join(os.path.dirname(__file__), 'modules'))
@@ -13,7 +15,16 @@ sys.path.append(os.path.join(os.path.dirname(__file__), 'modules'))
 from modules.config import Config
 from modules.converter import PPTXConverter
 from modules.file_manager import FileManager
+from modules.conversion_cache import ConversionCache
+from modules.inspector import PresentationInspector
+from modules.metrics import MetricsRegistry
+from modules.jobs import JobManager
+from modules.admission import ConversionQueue
+from modules.batch import BatchScheduler
+from modules.office_pool import ProfilePool, create_office_pool, process_profile_root
 from modules.routes import create_routes
+from modules.spool import Spool
+from modules.state_store import StateStore
 
 
 def create_app():
@@ -32,37 +43,132 @@ def create_app():
     return app
 
 
-def initialize_components():
-    """初始化系統組件"""
+def initialize_components(multi_process=False):
+    """
+    初始化系統組件
+    multi_process 為 True 時每個程序使用獨立的 LibreOffice 設定檔目錄
+    """
     # 驗證配置
     config_errors = Config.validate_config()
     if config_errors:
         print("配置錯誤:")
         for error in config_errors:
             print(f"  - {error}")
-        return None, None, None
+        return None, None, None, None, None, None, None, None, None, "配置驗證失敗"
       # 建立組件
-    converter = PPTXConverter()
+    profile_root = Config.OFFICE_PROFILE_FOLDER
+    if multi_process:
+        profile_root = process_profile_root(profile_root)
+    office_pool = create_office_pool(
+        Config.LIBREOFFICE_PATH,
+        profile_root,
+        size=Config.OFFICE_POOL_SIZE,
+        max_conversions=Config.OFFICE_MAX_CONVERSIONS_PER_WORKER,
+        conversion_timeout=Config.CONVERSION_TIMEOUT_SECONDS,
+        startup_timeout=Config.OFFICE_STARTUP_TIMEOUT_SECONDS,
+        health_check_seconds=Config.OFFICE_HEALTH_CHECK_SECONDS
+    )
+    if office_pool:
+        atexit.register(office_pool.shutdown)
+
+    # 單次執行模式使用的獨立設定檔池，常駐實例池停用時預先初始化
+    profile_pool = ProfilePool(
+        shutil.which(Config.LIBREOFFICE_PATH) or Config.LIBREOFFICE_PATH,
+        profile_root,
+        Config.MAX_CONCURRENT_CONVERSIONS
+    )
+    if office_pool is None:
+        profile_pool.initialize()
+
+    converter = PPTXConverter(office_pool=office_pool, profile_pool=profile_pool)
+    # 清理排程、儲存用量、工作狀態與快取索引存放於共用資料庫，多個程序看到相同的狀態
+    state_store = StateStore(Config.STATE_DB_PATH)
     file_manager = FileManager(
         temp_base_dir=Config.TEMP_FOLDER,
         upload_dir=Config.UPLOAD_FOLDER,
-        max_size_gb=int(Config.MAX_STORAGE_GB)
+        max_size_gb=int(Config.MAX_STORAGE_GB),
+        reconcile_interval_seconds=Config.STORAGE_RECONCILE_SECONDS,
+        store=state_store
+    )
+
+    conversion_cache = None
+    if Config.CACHE_ENABLED:
+        conversion_cache = ConversionCache(Config.CACHE_FOLDER, max_size_gb=Config.CACHE_MAX_GB, store=state_store)
+
+    inspector = PresentationInspector(max_entries=Config.INSPECT_CACHE_ENTRIES, store=state_store)
+
+    job_manager = JobManager(
+        max_workers=Config.JOB_WORKERS,
+        retention_minutes=Config.DEFAULT_CLEANUP_MINUTES,
+        store=state_store
+    )
+
+
+    conversion_queue = ConversionQueue(
+        max_concurrent=Config.MAX_CONCURRENT_CONVERSIONS,
+        max_queue_depth=Config.MAX_QUEUE_DEPTH
     )
     
-    return converter, file_manager, None
+    # 多個程序時計數器寫入共用資料庫，任一程序回應 /metrics 都是所有程序的合計
+    metrics = None
+    if Config.METRICS_ENABLED:
+        metrics = MetricsRegistry(store=state_store if multi_process else None)
+    
+    batch_scheduler = BatchScheduler(workers=Config.BATCH_WORKERS)
+    
+    # 多節點模式：/jobs 的工作經由共用目錄分派給工作節點
+    spool = None
+    if Config.SPOOL_FOLDER:
+        spool = Spool(
+            Config.SPOOL_FOLDER,
+            lease_seconds=Config.SPOOL_LEASE_SECONDS,
+            max_attempts=Config.SPOOL_MAX_ATTEMPTS,
+            retention_minutes=Config.DEFAULT_CLEANUP_MINUTES,
+            poll_interval=Config.SPOOL_POLL_SECONDS,
+            workers=Config.SPOOL_WORKERS
+        )
+    
+    return (converter, file_manager, conversion_cache, job_manager, conversion_queue, inspector, metrics, spool,
+            batch_scheduler, None)
+
+
+def build_app(multi_process=False):
+    """
+    建立應用程式、組件與路由
+    multi_process 為 True 時（gunicorn 工作程序）不執行啟動清理，由主程序啟動時執行一次
+    
+    Returns:
+        tuple: (app, converter, file_manager, error)
+    """
+    app = create_app()
+    
+    (converter, file_manager, conversion_cache, job_manager, conversion_queue, inspector, metrics, spool,
+     batch_scheduler, error) = initialize_components(multi_process)
+    if error:
+        return None, None, None, error
+    
+    if not multi_process:
+        startup_cleanup(file_manager)
+    
+    create_routes(
+        app, converter, file_manager, conversion_cache, job_manager, conversion_queue, inspector, metrics, spool,
+        batch_scheduler
+    )
+    return app, converter, file_manager, None
 
 
 def startup_cleanup(file_manager):
     """啟動時清理舊檔案"""
     print("執行啟動清理...")
     
-    # 清理所有現有的臨時檔案
-    cleanup_result = file_manager.cleanup_all_temp_files()
+    # 只清理沒有排程的遺留資料夾，已排程的資料夾沿用原本的清理時間
+    cleanup_result = file_manager.cleanup_unscheduled_folders()
     
     if cleanup_result['success']:
         freed_mb = cleanup_result['total_freed_bytes'] / (1024 * 1024)
         print(f"啟動清理完成:")
         print(f"  - 清理的資料夾: {len(cleanup_result['cleaned_folders'])}")
+        print(f"  - 保留的排程: {file_manager.scheduled_cleanup_count()}")
         print(f"  - 釋放空間: {freed_mb:.2f} MB")
         if cleanup_result['failed_folders']:
             print(f"  - 清理失敗: {cleanup_result['failed_folders']}")
@@ -79,6 +185,11 @@ def print_startup_info(file_manager, converter):
     # 系統狀態
     print("\n系統狀態:")
     print(f"  - LibreOffice: {'可用' if converter.is_libreoffice_available() else '不可用'}")
+    if converter.office_pool:
+        print(f"  - LibreOffice 常駐實例: {len(converter.office_pool.workers)} 個")
+    else:
+        print("  - LibreOffice 常駐實例: 停用（每次轉換啟動新程序）")
+    print(f"  - 同時轉換上限: {Config.MAX_CONCURRENT_CONVERSIONS}（佇列上限 {Config.MAX_QUEUE_DEPTH}）")
     
     # 儲存資訊
     if file_manager:
@@ -92,17 +203,35 @@ def print_startup_info(file_manager, converter):
     config_info = Config.get_config_info()
     print(f"  - 預設清理時間: {config_info['cleanup']['default_minutes']} 分鐘")
     print(f"  - 預設 DPI: {config_info['conversion']['default_dpi']}")
+    if config_info['cache']['enabled']:
+        print(f"  - 轉換快取: {config_info['cache']['max_size_gb']:.1f}GB")
+    else:
+        print("  - 轉換快取: 停用")
     print(f"  - 最大檔案大小: {config_info['conversion']['max_file_size_mb']:.0f}MB")
+    if config_info['spool']['enabled']:
+        print(f"  - 共用佇列目錄: {config_info['spool']['folder']}（認領執行緒 {config_info['spool']['workers']} 個）")
       # API 端點
     print("\nAPI 端點:")
     print("  - POST   /convert              - 轉換 PPTX 檔案")
-    print("           參數: file (必填), include_hidden_slides (可選, 預設true), dpi (可選, 預設200)")
+    print("           參數: file (必填), include_hidden_slides (可選, 預設true), dpi (可選, 預設200), pages (可選, 例如 1-3,7)")
+    print("           widths / thumb_width (可選, 縮小版本寬度，例如 320,1024)")
+    print("           format (可選, jpg/webp/png/avif), quality, progressive, optimize, quantize")
+    print("           render (可選, eager 或 lazy；lazy 只產生 PDF，圖片於下載時渲染)")
+    print("  - POST   /convert/batch        - 批次轉換多個 PPTX 或 ZIP（參數同 /convert），以 NDJSON 逐份回傳結果")
+    print("  - POST   /jobs                 - 提交非同步轉換工作（參數同 /convert）")
+    print("  - GET    /jobs/<id>            - 查詢工作狀態，可加 ?wait=秒數 等待完成")
+    print("  - GET    /jobs/<id>/events     - 以 Server-Sent Events 接收工作進度")
+    print("  - POST   /inspect              - 快速取得投影片數量、隱藏投影片與媒體大小（不轉換）")
+    print("  - GET    /inspect?sha256=<hash> - 查詢已檢查過的檔案")
     print("  - GET    /download/<folder>/<file> - 下載檔案")
+    print("  - GET    /download/<folder>.zip - 以串流 ZIP 下載 PDF 與所有圖片")
     print("  - GET    /status/<folder>      - 檢查資料夾狀態")
     print("  - POST   /cleanup/all          - 清理所有臨時檔案")
     print("  - POST   /cleanup/old          - 清理舊檔案")
     print("  - GET    /storage/info         - 儲存空間資訊")
     print("  - GET    /health               - 健康檢查")
+    if Config.METRICS_ENABLED:
+        print("  - GET    /metrics              - Prometheus 監控指標")
     
     print(f"\n服務器將啟動在: http://{Config.HOST}:{Config.PORT}")
     print("=" * 60)
@@ -111,22 +240,14 @@ def print_startup_info(file_manager, converter):
 def main():
     """主函數"""
     try:
-        # 建立應用程式
-        app = create_app()
-        
-        # 初始化組件
-        converter, file_manager, error = initialize_components()
+        # 建立應用程式、初始化組件、執行啟動清理並建立路由
+        app, converter, file_manager, error = build_app()
         
         if error:
             print(f"初始化失敗: {error}")
             return
         
-        # 執行啟動清理
-        startup_cleanup(file_manager)
-        
-        # 建立路由
-        create_routes(app, converter, file_manager)
-          # 顯示啟動資訊
+        # 顯示啟動資訊
         print_startup_info(file_manager, converter)
         
         # 最終儲存檢查
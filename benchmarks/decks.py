@@ -0,0 +1,129 @@
+"""
+合成測試簡報模組
+以固定亂數種子產生投影片數量、圖片數量與隱藏投影片可調整的 PPTX 與 PDF，
+同一組參數每次產生相同內容，不同版本的效能數據才能比較
+"""
+import io
+import random
+
+from PIL import Image, ImageDraw
+
+try:
+    from pptx import Presentation
+    from pptx.util import Inches, Pt
+    PPTX_AVAILABLE = True
+except ImportError:
+    PPTX_AVAILABLE = False
+
+# 預設的簡報規模：投影片數、每張投影片的圖片數、隱藏投影片數
+DECK_PRESETS = {
+    'small': {'slides': 5, 'images_per_slide': 0, 'hidden_slides': 1},
+    'medium': {'slides': 30, 'images_per_slide': 1, 'hidden_slides': 3},
+    'large': {'slides': 100, 'images_per_slide': 2, 'hidden_slides': 10}
+}
+
+# 16:9 投影片，PDF 以 72 DPI 的點數表示
+SLIDE_WIDTH_INCHES = 13.333
+SLIDE_HEIGHT_INCHES = 7.5
+
+
+def _noise_image(rng, size, image_format):
+    """產生壓縮效益低的雜訊圖片，接近照片在簡報中的大小"""
+    width, height = size
+    image = Image.frombytes('RGB', size, rng.randbytes(width * height * 3))
+    buffer = io.BytesIO()
+    image.save(buffer, image_format, quality=85)
+    image.close()
+    buffer.seek(0)
+    return buffer
+
+
+def hidden_slide_indexes(slides, hidden_slides):
+    """平均分布隱藏投影片的位置（從 1 開始）"""
+    if hidden_slides <= 0:
+        return set()
+    step = slides / hidden_slides
+    return {int(step * i) + 1 for i in range(hidden_slides)}
+
+
+def build_deck(path, slides, images_per_slide=0, hidden_slides=0, seed=0, image_size=(800, 600)):
+    """
+    產生合成 PPTX
+
+    Args:
+        path (str): 輸出路徑
+        slides (int): 投影片數量
+        images_per_slide (int): 每張投影片嵌入的圖片數
+        hidden_slides (int): 隱藏投影片數量
+        seed (int): 亂數種子
+        image_size (tuple): 圖片像素大小
+
+    Raises:
+        RuntimeError: 未安裝 python-pptx
+    """
+    if not PPTX_AVAILABLE:
+        raise RuntimeError("產生測試簡報需要 python-pptx")
+
+    rng = random.Random(seed)
+    hidden = hidden_slide_indexes(slides, hidden_slides)
+    presentation = Presentation()
+    presentation.slide_width = Inches(SLIDE_WIDTH_INCHES)
+    presentation.slide_height = Inches(SLIDE_HEIGHT_INCHES)
+    layout = presentation.slide_layouts[5]  # 只有標題
+
+    for index in range(1, slides + 1):
+        slide = presentation.slides.add_slide(layout)
+        slide.shapes.title.text = f"Slide {index}"
+
+        body = slide.shapes.add_textbox(Inches(0.5), Inches(1.5), Inches(5.5), Inches(5)).text_frame
+        body.word_wrap = True
+        for line in range(6):
+            paragraph = body.add_paragraph() if line else body.paragraphs[0]
+            paragraph.text = f"Item {line + 1}: " + ' '.join(
+                rng.choice(('alpha', 'beta', 'gamma', 'delta', 'render', 'export')) for _ in range(8)
+            )
+            paragraph.font.size = Pt(18)
+
+        for image_index in range(images_per_slide):
+            left = Inches(6.5 + 0.4 * image_index)
+            top = Inches(1.5 + 0.4 * image_index)
+            slide.shapes.add_picture(_noise_image(rng, image_size, 'JPEG'), left, top, width=Inches(6))
+
+        if index in hidden:
+            slide._element.set('show', '0')
+
+    presentation.save(path)
+
+
+def build_pdf(path, pages, images_per_slide=0, seed=0, dpi=72):
+    """
+    產生與合成簡報頁數相同的 PDF，沒有 LibreOffice 時用於測量圖片渲染
+
+    Args:
+        path (str): 輸出路徑
+        pages (int): 頁數
+        images_per_slide (int): 每頁的雜訊圖片數
+        seed (int): 亂數種子
+        dpi (int): 頁面內容的解析度
+    """
+    rng = random.Random(seed)
+    size = (int(SLIDE_WIDTH_INCHES * dpi), int(SLIDE_HEIGHT_INCHES * dpi))
+    images = []
+    try:
+        for index in range(1, pages + 1):
+            page = Image.new('RGB', size, 'white')
+            draw = ImageDraw.Draw(page)
+            draw.text((size[0] // 20, size[1] // 20), f"Slide {index}", fill='black')
+            for line in range(6):
+                y = size[1] // 5 + line * size[1] // 12
+                draw.rectangle((size[0] // 20, y, size[0] // 2, y + size[1] // 40), fill=(60, 60, 60))
+            for image_index in range(images_per_slide):
+                patch_size = (size[0] // 3, size[1] // 2)
+                patch = Image.open(_noise_image(rng, patch_size, 'JPEG'))
+                page.paste(patch, (size[0] // 2 + image_index * 20, size[1] // 5 + image_index * 20))
+                patch.close()
+            images.append(page)
+        images[0].save(path, 'PDF', resolution=dpi, save_all=True, append_images=images[1:])
+    finally:
+        for image in images:
+            image.close()
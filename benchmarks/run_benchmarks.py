@@ -0,0 +1,436 @@
+"""
+轉換流程效能測試
+以合成簡報分別測量隱藏投影片處理、PDF 轉換、圖片渲染與完整 /convert 請求，
+結果（延遲百分位數、吞吐量、峰值記憶體、寫入大小）以 JSON 輸出，可在不同版本間比較
+
+用法:
+    python benchmarks/run_benchmarks.py --decks small,medium --iterations 5 --output result.json
+
+缺少 LibreOffice 或 poppler 時，需要它們的階段標記為 skipped 後繼續
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.dirname(BENCHMARK_DIR)
+sys.path.insert(0, REPO_ROOT)
+sys.path.insert(0, BENCHMARK_DIR)
+
+from flask import Flask
+
+from decks import DECK_PRESETS, PPTX_AVAILABLE, build_deck, build_pdf
+from modules.admission import ConversionQueue
+from modules.config import Config
+from modules.converter import PPTXConverter
+from modules.file_manager import FileManager
+from modules.office_pool import ProfilePool, create_office_pool
+from modules.routes import create_routes
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+STAGES = ('hidden_slides', 'pptx_to_pdf', 'pdf_to_images', 'convert_route', 'convert_concurrent')
+
+
+def percentile(sorted_values, fraction):
+    """線性內插的百分位數，sorted_values 需已排序"""
+    if not sorted_values:
+        return None
+    position = (len(sorted_values) - 1) * fraction
+    lower = int(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+
+def summarize_latencies(latencies):
+    values = sorted(latencies)
+    return {
+        'min': round(values[0], 4),
+        'mean': round(sum(values) / len(values), 4),
+        'p50': round(percentile(values, 0.50), 4),
+        'p95': round(percentile(values, 0.95), 4),
+        'p99': round(percentile(values, 0.99), 4),
+        'max': round(values[-1], 4)
+    }
+
+
+def peak_rss_bytes():
+    """
+    目前為止的峰值記憶體（程序啟動後只增不減）
+
+    Returns:
+        dict: self 為本程序，children 為已結束的子程序（LibreOffice、pdftoppm、渲染程序）中最大者
+    """
+    if resource is not None:
+        # Linux 的 ru_maxrss 單位為 KB，macOS 為 bytes
+        scale = 1 if sys.platform == 'darwin' else 1024
+        return {
+            'self': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale,
+            'children': resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * scale
+        }
+    if psutil is not None:
+        memory = psutil.Process().memory_info()
+        return {'self': getattr(memory, 'peak_wset', memory.rss), 'children': None}
+    return {'self': None, 'children': None}
+
+
+def directory_bytes(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        for filename in files:
+            try:
+                total += os.path.getsize(os.path.join(root, filename))
+            except OSError:
+                pass
+    return total
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_ROOT, capture_output=True, text=True, timeout=10
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+class BenchmarkRunner:
+    def __init__(self, work_dir, iterations, warmup, dpi, concurrency, concurrent_requests):
+        self.work_dir = work_dir
+        self.iterations = iterations
+        self.warmup = warmup
+        self.dpi = dpi
+        self.concurrency = concurrency
+        self.concurrent_requests = concurrent_requests
+        self.office_pool, self.converter = self._create_converter()
+        self.libreoffice_available = self.converter.is_libreoffice_available()
+        self.poppler_available = all(shutil.which(binary) for binary in ('pdftoppm', 'pdfinfo'))
+        self._app = None
+        self._file_manager = None
+        self._run_count = 0
+        self._run_lock = threading.Lock()
+
+    def _create_converter(self):
+        """
+        與 initialize_components 相同的方式建立常駐實例池與設定檔池，測量的是部署時的轉換路徑
+        設定檔放在暫存目錄中，不與執行中的服務共用；OFFICE_POOL_SIZE=0 時測量單次執行模式
+        """
+        profile_root = os.path.join(self.work_dir, 'office_profiles')
+        office_pool = create_office_pool(
+            Config.LIBREOFFICE_PATH,
+            profile_root,
+            size=Config.OFFICE_POOL_SIZE,
+            max_conversions=Config.OFFICE_MAX_CONVERSIONS_PER_WORKER,
+            conversion_timeout=Config.CONVERSION_TIMEOUT_SECONDS,
+            startup_timeout=Config.OFFICE_STARTUP_TIMEOUT_SECONDS,
+            health_check_seconds=Config.OFFICE_HEALTH_CHECK_SECONDS
+        )
+        profile_pool = ProfilePool(
+            shutil.which(Config.LIBREOFFICE_PATH) or Config.LIBREOFFICE_PATH,
+            profile_root,
+            Config.MAX_CONCURRENT_CONVERSIONS
+        )
+        # 設定檔初始化屬於服務啟動成本，在測量前完成
+        if office_pool is None:
+            profile_pool.initialize()
+        return office_pool, PPTXConverter(office_pool=office_pool, profile_pool=profile_pool)
+
+    def close(self):
+        if self.office_pool is not None:
+            self.office_pool.shutdown()
+
+    def _new_output_dir(self):
+        with self._run_lock:
+            self._run_count += 1
+            run_id = self._run_count
+        path = os.path.join(self.work_dir, 'runs', f"run_{run_id:05d}")
+        os.makedirs(path)
+        return path
+
+    def _get_client(self):
+        """建立只含轉換路由的應用程式（不使用快取與非同步工作），每個執行緒各自取得 test client"""
+        if self._app is None:
+            app = Flask(__name__)
+            app.config['MAX_CONTENT_LENGTH'] = Config.MAX_CONTENT_LENGTH
+            self._file_manager = FileManager(
+                temp_base_dir=os.path.join(self.work_dir, 'temp'),
+                upload_dir=os.path.join(self.work_dir, 'uploads'),
+                max_size_gb=1024
+            )
+            # 佇列不設限，測量的是轉換本身而不是 429
+            conversion_queue = ConversionQueue(
+                max_concurrent=Config.MAX_CONCURRENT_CONVERSIONS,
+                max_queue_depth=max(self.concurrent_requests, Config.MAX_QUEUE_DEPTH)
+            )
+            create_routes(app, self.converter, self._file_manager, conversion_queue=conversion_queue)
+            self._app = app
+        return self._app.test_client()
+
+    def _measure(self, operation, iterations=None):
+        """
+        執行 warmup 次後測量 iterations 次
+
+        Args:
+            operation (callable): 接收輸出資料夾並回傳 None 的函數，失敗時拋出例外
+
+        Returns:
+            dict: 延遲統計、吞吐量與寫入大小
+        """
+        iterations = iterations or self.iterations
+        for _ in range(self.warmup):
+            operation(self._new_output_dir())
+
+        latencies = []
+        bytes_written = 0
+        started = time.perf_counter()
+        for _ in range(iterations):
+            output_dir = self._new_output_dir()
+            before = directory_bytes(output_dir)
+            start = time.perf_counter()
+            operation(output_dir)
+            latencies.append(time.perf_counter() - start)
+            bytes_written += directory_bytes(output_dir) - before
+        elapsed = time.perf_counter() - started
+
+        return {
+            'iterations': iterations,
+            'latency_seconds': summarize_latencies(latencies),
+            'throughput_per_second': round(iterations / elapsed, 3) if elapsed > 0 else None,
+            'disk_bytes_written': bytes_written,
+            'disk_bytes_per_iteration': bytes_written // iterations
+        }
+
+    def bench_hidden_slides(self, deck):
+        def operation(output_dir):
+            if self.converter._process_hidden_slides(deck['pptx'], output_dir) is None:
+                raise RuntimeError("隱藏投影片處理失敗")
+        return self._measure(operation)
+
+    def bench_pptx_to_pdf(self, deck):
+        if not self.libreoffice_available:
+            return None, f"找不到 LibreOffice（{Config.LIBREOFFICE_PATH}）"
+
+        def operation(output_dir):
+            success, result = self.converter.convert_pptx_to_pdf(deck['pptx'], output_dir, include_hidden_slides=True)
+            if not success:
+                raise RuntimeError(result)
+        return self._measure(operation), None
+
+    def bench_pdf_to_images(self, deck):
+        if not self.poppler_available:
+            return None, "找不到 poppler（pdftoppm、pdfinfo）"
+
+        def operation(output_dir):
+            success, result = self.converter.convert_pdf_to_images(deck['pdf'], output_dir, dpi=self.dpi)
+            if not success:
+                raise RuntimeError(result)
+        result = self._measure(operation)
+        result['pdf_source'] = deck['pdf_source']
+        return result, None
+
+    def _post_convert(self, deck):
+        with open(deck['pptx'], 'rb') as f:
+            response = self._get_client().post(
+                '/convert',
+                data={'file': (f, os.path.basename(deck['pptx'])), 'dpi': str(self.dpi)},
+                content_type='multipart/form-data'
+            )
+        if response.status_code != 200:
+            raise RuntimeError(f"/convert 回應 {response.status_code}: {response.get_json()}")
+        return response.get_json()
+
+    def bench_convert_route(self, deck):
+        if not (self.libreoffice_available and self.poppler_available):
+            return None, "完整轉換需要 LibreOffice 與 poppler"
+
+        temp_dir = os.path.join(self.work_dir, 'temp')
+
+        def operation(output_dir):
+            # 路由將結果寫入臨時資料夾，完成後移到本次的輸出資料夾以計算寫入大小
+            result = self._post_convert(deck)
+            shutil.move(os.path.join(temp_dir, result['temp_folder']), output_dir)
+        return self._measure(operation), None
+
+    def bench_convert_concurrent(self, deck):
+        if not (self.libreoffice_available and self.poppler_available):
+            return None, "完整轉換需要 LibreOffice 與 poppler"
+
+        temp_dir = os.path.join(self.work_dir, 'temp')
+        self._get_client()
+        for _ in range(self.warmup):
+            self._post_convert(deck)
+
+        before = directory_bytes(temp_dir)
+
+        def timed_request(_):
+            start = time.perf_counter()
+            self._post_convert(deck)
+            return time.perf_counter() - start
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            latencies = list(executor.map(timed_request, range(self.concurrent_requests)))
+        elapsed = time.perf_counter() - started
+
+        bytes_written = directory_bytes(temp_dir) - before
+        return {
+            'iterations': self.concurrent_requests,
+            'concurrency': self.concurrency,
+            'latency_seconds': summarize_latencies(latencies),
+            'throughput_per_second': round(self.concurrent_requests / elapsed, 3) if elapsed > 0 else None,
+            'disk_bytes_written': bytes_written,
+            'disk_bytes_per_iteration': bytes_written // self.concurrent_requests
+        }, None
+
+    def prepare_deck(self, name, spec, seed):
+        """產生合成簡報；有 LibreOffice 時以實際匯出的 PDF 測量圖片渲染，否則使用合成 PDF"""
+        deck_dir = os.path.join(self.work_dir, 'decks')
+        os.makedirs(deck_dir, exist_ok=True)
+        pptx_path = os.path.join(deck_dir, f"{name}.pptx")
+        build_deck(pptx_path, spec['slides'], spec['images_per_slide'], spec['hidden_slides'], seed=seed)
+
+        pdf_path, pdf_source = None, 'synthetic'
+        if self.libreoffice_available:
+            export_dir = os.path.join(deck_dir, f"{name}_export")
+            os.makedirs(export_dir, exist_ok=True)
+            success, result = self.converter.convert_pptx_to_pdf(pptx_path, export_dir, include_hidden_slides=True)
+            if success:
+                pdf_path, pdf_source = result, 'libreoffice'
+        if pdf_path is None:
+            pdf_path = os.path.join(deck_dir, f"{name}.pdf")
+            build_pdf(pdf_path, spec['slides'], spec['images_per_slide'], seed=seed)
+
+        return {
+            'pptx': pptx_path,
+            'pdf': pdf_path,
+            'pdf_source': pdf_source,
+            'pptx_bytes': os.path.getsize(pptx_path),
+            **spec
+        }
+
+    def run(self, deck_names, stages, seed):
+        results = []
+        decks = {}
+        for name in deck_names:
+            deck = self.prepare_deck(name, DECK_PRESETS[name], seed)
+            decks[name] = {key: value for key, value in deck.items() if key not in ('pptx', 'pdf')}
+
+            for stage in stages:
+                print(f"[{name}] {stage} ...", file=sys.stderr)
+                entry = {'deck': name, 'stage': stage}
+                try:
+                    outcome = getattr(self, f"bench_{stage}")(deck)
+                    measured, skip_reason = outcome if isinstance(outcome, tuple) else (outcome, None)
+                    if measured is None:
+                        entry.update({'status': 'skipped', 'reason': skip_reason})
+                    else:
+                        entry.update({'status': 'ok', **measured})
+                except Exception as e:
+                    entry.update({'status': 'error', 'error': str(e)})
+                entry['peak_rss_bytes'] = peak_rss_bytes()
+                results.append(entry)
+                # 每個階段的輸出只用於計算大小，測完即刪除
+                shutil.rmtree(os.path.join(self.work_dir, 'runs'), ignore_errors=True)
+        return decks, results
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='PPTX 轉換流程效能測試')
+    parser.add_argument('--decks', default='small,medium', help=f"簡報規模，逗號分隔（{', '.join(DECK_PRESETS)}）")
+    parser.add_argument('--stages', default=','.join(STAGES), help=f"測試階段，逗號分隔（{', '.join(STAGES)}）")
+    parser.add_argument('--iterations', type=int, default=5, help='每個階段測量的次數')
+    parser.add_argument('--warmup', type=int, default=1, help='測量前的暖身次數')
+    parser.add_argument('--dpi', type=int, default=Config.DEFAULT_DPI, help='圖片解析度')
+    parser.add_argument('--concurrency', type=int, default=4, help='並行模式的同時請求數')
+    parser.add_argument('--requests', type=int, default=8, help='並行模式的請求總數')
+    parser.add_argument('--seed', type=int, default=0, help='合成簡報的亂數種子')
+    parser.add_argument('--work-dir', help='暫存目錄（預設使用系統暫存目錄，結束後刪除）')
+    parser.add_argument('--output', help='JSON 結果的輸出路徑（預設輸出到標準輸出）')
+    args = parser.parse_args()
+
+    args.decks = [name.strip() for name in args.decks.split(',') if name.strip()]
+    args.stages = [stage.strip() for stage in args.stages.split(',') if stage.strip()]
+    unknown = [name for name in args.decks if name not in DECK_PRESETS]
+    unknown += [stage for stage in args.stages if stage not in STAGES]
+    if unknown:
+        parser.error(f"未知的簡報規模或階段: {', '.join(unknown)}")
+    if args.iterations <= 0 or args.warmup < 0 or args.concurrency <= 0 or args.requests <= 0:
+        parser.error('iterations、concurrency、requests 必須大於 0，warmup 不可小於 0')
+    return args
+
+
+def main():
+    args = parse_args()
+    if not PPTX_AVAILABLE:
+        print("產生測試簡報需要 python-pptx（pip install python-pptx）", file=sys.stderr)
+        return 1
+
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix='pptx_benchmark_')
+    os.makedirs(work_dir, exist_ok=True)
+    runner = None
+    try:
+        runner = BenchmarkRunner(
+            work_dir, args.iterations, args.warmup, args.dpi, args.concurrency, args.requests
+        )
+        started_at = time.time()
+        decks, results = runner.run(args.decks, args.stages, args.seed)
+        report = {
+            'meta': {
+                'git_revision': git_revision(),
+                'started_at': started_at,
+                'duration_seconds': round(time.time() - started_at, 3),
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'cpu_count': os.cpu_count(),
+                'libreoffice_available': runner.libreoffice_available,
+                'poppler_available': runner.poppler_available,
+                'settings': {
+                    'iterations': args.iterations,
+                    'warmup': args.warmup,
+                    'dpi': args.dpi,
+                    'concurrency': args.concurrency,
+                    'concurrent_requests': args.requests,
+                    'seed': args.seed,
+                    'render_workers': Config.RENDER_WORKERS,
+                    'render_window_pages': Config.RENDER_WINDOW_PAGES,
+                    'encode_threads': Config.ENCODE_THREADS,
+                    'max_concurrent_conversions': Config.MAX_CONCURRENT_CONVERSIONS,
+                    'office_pool_size': runner.office_pool.size if runner.office_pool else 0
+                }
+            },
+            'decks': decks,
+            'results': results
+        }
+    finally:
+        if runner is not None:
+            runner.close()
+        if not args.work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
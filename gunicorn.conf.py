@@ -0,0 +1,52 @@
+"""
+gunicorn 配置
+每個工作程序各自執行 LibreOffice 與渲染程序池，清理排程、儲存用量、
+非同步工作、轉換快取索引、檢查結果與監控指標透過 STATE_DB_PATH 的 SQLite 資料庫共用
+"""
+import os
+
+_workers = max(1, int(os.environ.get('WEB_WORKERS', 1)))
+_cpus = os.cpu_count() or 1
+
+# 轉換並發數與渲染程序數是每個工作程序的上限，未設定時平分 CPU 核心
+os.environ.setdefault('MAX_CONCURRENT_CONVERSIONS', str(max(1, _cpus // _workers)))
+os.environ.setdefault('RENDER_WORKERS', str(max(1, _cpus // _workers)))
+
+from modules.config import Config  # noqa: E402
+
+bind = f"{Config.HOST}:{Config.PORT}"
+workers = Config.WEB_WORKERS
+worker_class = 'gthread'
+threads = Config.WEB_THREADS
+# 同步轉換的請求最長需要 CONVERSION_TIMEOUT_SECONDS
+timeout = Config.CONVERSION_TIMEOUT_SECONDS + 60
+graceful_timeout = 30
+# 每個工作程序自行初始化，不共用 fork 前建立的執行緒與資料庫連線
+preload_app = False
+accesslog = '-'
+
+
+def on_starting(server):
+    """主程序啟動時執行一次啟動清理，工作程序不重複執行"""
+    from modules.file_manager import FileManager
+    from modules.metrics import reset_shared_metrics
+    from modules.state_store import StateStore
+
+    store = StateStore(Config.STATE_DB_PATH)
+    file_manager = FileManager(
+        temp_base_dir=Config.TEMP_FOLDER,
+        upload_dir=Config.UPLOAD_FOLDER,
+        max_size_gb=int(Config.MAX_STORAGE_GB),
+        store=store,
+        background_tasks=False
+    )
+    result = file_manager.cleanup_unscheduled_folders()
+    if result['success']:
+        print(f"啟動清理完成: 清理 {len(result['cleaned_folders'])} 個資料夾，"
+              f"保留 {file_manager.scheduled_cleanup_count()} 個排程")
+    else:
+        print(f"啟動清理失敗: {result.get('error', '未知錯誤')}")
+    # 各工作程序的監控數值合計於共用資料庫，服務重新啟動時從零開始
+    reset_shared_metrics(store)
+    # 關閉主程序的連線，工作程序 fork 後各自建立連線
+    store.close()
@@ -0,0 +1,128 @@
+"""
+轉換佇列模組
+限制同時進行的轉換數量與等待中的請求數量，佇列已滿時快速拒絕
+"""
+import math
+import threading
+import time
+from contextlib import contextmanager
+
+
+class AdmissionTicket:
+    """已被接受的請求，取得轉換名額前計入等待佇列"""
+
+    def __init__(self, conversion_queue):
+        self.conversion_queue = conversion_queue
+        self.state = 'waiting'
+
+    @contextmanager
+    def slot(self):
+        """
+        等待並佔用一個轉換名額
+
+        Yields:
+            float: 等待名額的秒數
+        """
+        wait_seconds = self.conversion_queue._acquire()
+        self.state = 'running'
+        start = time.time()
+        try:
+            yield wait_seconds
+        finally:
+            self.conversion_queue._release(time.time() - start)
+            self.state = 'closed'
+
+    def release(self):
+        """未進行轉換就離開佇列（例如命中快取或上傳失敗）"""
+        if self.state == 'waiting':
+            self.conversion_queue._abandon()
+            self.state = 'closed'
+
+
+class ConversionQueue:
+    def __init__(self, max_concurrent, max_queue_depth, default_conversion_seconds=5.0, smoothing=0.2):
+        self.max_concurrent = max_concurrent
+        self.max_queue_depth = max_queue_depth
+        self.smoothing = smoothing
+        self.waiting = 0
+        self.running = 0
+        self.rejected = 0
+        self.avg_conversion_seconds = default_conversion_seconds
+        self.avg_wait_seconds = 0.0
+        self._semaphore = threading.Semaphore(max_concurrent)
+        self._lock = threading.Lock()
+
+    def admit(self):
+        """
+        嘗試加入佇列
+
+        Returns:
+            AdmissionTicket | None: 佇列已滿時回傳 None
+        """
+        with self._lock:
+            # waiting 也包含即將取得空閒名額的請求，只有超出空閒名額的部分才算排隊
+            if self.waiting + self.running >= self.max_concurrent + self.max_queue_depth:
+                self.rejected += 1
+                return None
+            self.waiting += 1
+        return AdmissionTicket(self)
+
+    def reserve(self):
+        """
+        不檢查佇列深度直接加入佇列，用於數量已由批次排程限制的工作
+
+        Returns:
+            AdmissionTicket: 佇列名額
+        """
+        with self._lock:
+            self.waiting += 1
+        return AdmissionTicket(self)
+
+    def retry_after(self):
+        """
+        依近期平均轉換時間估計可重試的秒數
+
+        Returns:
+            int: 建議的 Retry-After 秒數
+        """
+        with self._lock:
+            rounds = math.ceil((self.waiting + 1) / self.max_concurrent)
+            return max(1, int(math.ceil(self.avg_conversion_seconds * rounds)))
+
+    def _acquire(self):
+        start = time.time()
+        self._semaphore.acquire()
+        wait_seconds = time.time() - start
+        with self._lock:
+            self.waiting -= 1
+            self.running += 1
+            self.avg_wait_seconds += self.smoothing * (wait_seconds - self.avg_wait_seconds)
+        return wait_seconds
+
+    def _release(self, duration):
+        with self._lock:
+            self.running -= 1
+            self.avg_conversion_seconds += self.smoothing * (duration - self.avg_conversion_seconds)
+        self._semaphore.release()
+
+    def _abandon(self):
+        with self._lock:
+            self.waiting -= 1
+
+    def get_status(self):
+        """
+        取得佇列狀態
+
+        Returns:
+            dict: 狀態資訊
+        """
+        with self._lock:
+            return {
+                'max_concurrent': self.max_concurrent,
+                'max_queue_depth': self.max_queue_depth,
+                'waiting': self.waiting,
+                'running': self.running,
+                'rejected': self.rejected,
+                'avg_wait_seconds': round(self.avg_wait_seconds, 3),
+                'avg_conversion_seconds': round(self.avg_conversion_seconds, 3)
+            }
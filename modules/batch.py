@@ -0,0 +1,117 @@
+"""
+批次轉換排程模組
+所有批次請求共用固定數量的工作執行緒，每次輪流從下一個批次取出一個工作，
+數千份簡報的大型批次不會讓之後送出的小批次等到它全部完成
+"""
+import queue
+import threading
+from collections import deque
+
+# 取消批次時放入結果佇列，讓等待中的 results() 結束
+_CANCELLED = object()
+
+
+class Batch:
+    """一次批次請求的工作與結果"""
+
+    def __init__(self, tasks):
+        self.pending = deque(tasks)
+        self.total = len(self.pending)
+        self.cancelled = False
+        self._results = queue.Queue()
+
+    def results(self):
+        """
+        依完成順序取得工作結果，全部完成或取消後結束
+
+        Yields:
+            工作的回傳值，工作拋出例外時為該例外
+        """
+        for _ in range(self.total):
+            result = self._results.get()
+            if result is _CANCELLED:
+                return
+            yield result
+
+
+class BatchScheduler:
+    def __init__(self, workers=2):
+        self.workers = workers
+        self._batches = deque()  # 輪替順序，有待處理工作的批次
+        self._condition = threading.Condition()
+        self.running = 0
+        for index in range(workers):
+            threading.Thread(target=self._worker, name=f'batch-worker-{index}', daemon=True).start()
+
+    def submit(self, tasks):
+        """
+        提交一個批次
+
+        Args:
+            tasks (list): 不需參數的函數，在工作執行緒中執行
+
+        Returns:
+            Batch: 用於取得結果或取消
+        """
+        batch = Batch(tasks)
+        if batch.total:
+            with self._condition:
+                self._batches.append(batch)
+                self._condition.notify_all()
+        return batch
+
+    def cancel(self, batch):
+        """
+        取消尚未開始的工作（例如客戶端已中斷連線），執行中的工作會完成
+
+        Returns:
+            list: 未執行的工作
+        """
+        with self._condition:
+            dropped = list(batch.pending)
+            batch.pending.clear()
+            batch.cancelled = True
+        batch._results.put(_CANCELLED)
+        return dropped
+
+    def _next_task(self):
+        with self._condition:
+            while True:
+                while self._batches:
+                    batch = self._batches.popleft()
+                    if batch.cancelled or not batch.pending:
+                        continue
+                    task = batch.pending.popleft()
+                    # 取出一個工作後排到最後，下一個執行緒先處理其他批次
+                    if batch.pending:
+                        self._batches.append(batch)
+                    self.running += 1
+                    return batch, task
+                self._condition.wait()
+
+    def _worker(self):
+        while True:
+            batch, task = self._next_task()
+            try:
+                result = task()
+            except Exception as e:
+                result = e
+            finally:
+                with self._condition:
+                    self.running -= 1
+            batch._results.put(result)
+
+    def get_status(self):
+        """
+        取得排程狀態
+
+        Returns:
+            dict: 狀態資訊
+        """
+        with self._condition:
+            return {
+                'workers': self.workers,
+                'running': self.running,
+                'active_batches': len(self._batches),
+                'pending_tasks': sum(len(batch.pending) for batch in self._batches)
+            }
@@ -19,13 +19,39 @@ class Config:
     UPLOAD_FOLDER = os.environ.get('UPLOAD_FOLDER', 'uploads')
     TEMP_FOLDER = os.environ.get('TEMP_FOLDER', 'temp')
     MAX_STORAGE_GB = float(os.environ.get('MAX_STORAGE_GB', 10))
+    # 儲存用量以增量方式記錄，每隔此秒數完整掃描一次校正
+    STORAGE_RECONCILE_SECONDS = int(os.environ.get('STORAGE_RECONCILE_SECONDS', 300))
     
     # 清理配置
     DEFAULT_CLEANUP_MINUTES = int(os.environ.get('DEFAULT_CLEANUP_MINUTES', 20))
     AUTO_CLEANUP_OLD_FILES_HOURS = int(os.environ.get('AUTO_CLEANUP_OLD_FILES_HOURS', 24))
+
+    # 轉換快取配置（快取位於臨時資料夾內，計入儲存空間限制）
+    CACHE_ENABLED = os.environ.get('CACHE_ENABLED', 'True').lower() == 'true'
+    CACHE_MAX_GB = float(os.environ.get('CACHE_MAX_GB', 2))
+    CACHE_FOLDER = os.environ.get('CACHE_FOLDER', os.path.join(TEMP_FOLDER, '_cache'))
+    # /inspect 結果以檔案雜湊快取於記憶體中的項目數
+    INSPECT_CACHE_ENTRIES = int(os.environ.get('INSPECT_CACHE_ENTRIES', 1024))
       # 轉換配置
     DEFAULT_DPI = int(os.environ.get('DEFAULT_DPI', 200))
     CONVERSION_TIMEOUT_SECONDS = int(os.environ.get('CONVERSION_TIMEOUT_SECONDS', 300))
+    # 同時進行的 LibreOffice 轉換數量上限，預設與 CPU 核心數相同
+    MAX_CONCURRENT_CONVERSIONS = int(os.environ.get('MAX_CONCURRENT_CONVERSIONS', os.cpu_count() or 1))
+    # 等待轉換名額的請求數量上限，超過時回應 429
+    MAX_QUEUE_DEPTH = int(os.environ.get('MAX_QUEUE_DEPTH', MAX_CONCURRENT_CONVERSIONS * 4))
+    # 非同步工作配置
+    JOB_WORKERS = int(os.environ.get('JOB_WORKERS', MAX_CONCURRENT_CONVERSIONS))
+    JOB_MAX_WAIT_SECONDS = int(os.environ.get('JOB_MAX_WAIT_SECONDS', 60))
+    # 每批渲染的頁數，渲染完一批存檔並釋放後才處理下一批
+    RENDER_WINDOW_PAGES = int(os.environ.get('RENDER_WINDOW_PAGES', 4))
+    # 預設圖片渲染模式：eager 在轉換時產生圖片，lazy 只產生 PDF，圖片在第一次下載時產生
+    DEFAULT_RENDER_MODE = os.environ.get('DEFAULT_RENDER_MODE', 'eager').lower()
+    # 平行渲染 PDF 頁面的工作程序數
+    RENDER_WORKERS = int(os.environ.get('RENDER_WORKERS', os.cpu_count() or 1))
+    # 每個渲染程序中編碼圖片的執行緒數，編碼與下一批點陣化同時進行
+    ENCODE_THREADS = int(os.environ.get('ENCODE_THREADS', 2))
+    # 預設圖片格式與品質（jpg、webp、png，Pillow 支援時可用 avif）
+    DEFAULT_IMAGE_FORMAT = os.environ.get('DEFAULT_IMAGE_FORMAT', 'jpg').lower()
     
     # LibreOffice 配置
     # Docker 環境使用系統路徑，Windows 環境使用絕對路徑
@@ -34,7 +60,49 @@ class Config:
     else:
         # Windows 預設路徑
         LIBREOFFICE_PATH = os.environ.get('LIBREOFFICE_PATH', 'soffice')
-    
+
+    # LibreOffice 常駐實例池配置（0 表示停用，每次轉換啟動新程序）
+    OFFICE_POOL_SIZE = int(os.environ.get('OFFICE_POOL_SIZE', 2))
+    OFFICE_MAX_CONVERSIONS_PER_WORKER = int(os.environ.get('OFFICE_MAX_CONVERSIONS_PER_WORKER', 50))
+    OFFICE_STARTUP_TIMEOUT_SECONDS = int(os.environ.get('OFFICE_STARTUP_TIMEOUT_SECONDS', 60))
+    OFFICE_HEALTH_CHECK_SECONDS = int(os.environ.get('OFFICE_HEALTH_CHECK_SECONDS', 30))
+    OFFICE_PROFILE_FOLDER = os.environ.get('OFFICE_PROFILE_FOLDER', 'office_profiles')
+
+    # 下載配置
+    # 轉換結果在清理前不會改變，允許客戶端與代理長時間快取
+    DOWNLOAD_CACHE_MAX_AGE = int(os.environ.get('DOWNLOAD_CACHE_MAX_AGE', 31536000))
+    # 啟用後由 nginx 以 X-Accel-Redirect 直接傳送檔案，Python 只回應標頭
+    DOWNLOAD_ACCEL_REDIRECT = os.environ.get('DOWNLOAD_ACCEL_REDIRECT', 'False').lower() == 'true'
+    DOWNLOAD_ACCEL_PREFIX = os.environ.get('DOWNLOAD_ACCEL_PREFIX', '/_protected_temp/')
+
+    # 批次轉換配置（/convert/batch）
+    # 所有批次共用的工作執行緒數，輪流處理各批次的簡報
+    BATCH_WORKERS = int(os.environ.get('BATCH_WORKERS', MAX_CONCURRENT_CONVERSIONS))
+    BATCH_MAX_FILES = int(os.environ.get('BATCH_MAX_FILES', 1000))
+    # 常駐實例池停用時，最多將幾份小型簡報合併為一次 LibreOffice 執行（1 表示不合併）
+    BATCH_GROUP_SIZE = int(os.environ.get('BATCH_GROUP_SIZE', 4))
+    BATCH_GROUP_MAX_MB = float(os.environ.get('BATCH_GROUP_MAX_MB', 10))
+    # ZIP 上傳在解壓前的檢查：項目總數（含非 PPTX）與單一項目的壓縮比上限
+    BATCH_ZIP_MAX_MEMBERS = int(os.environ.get('BATCH_ZIP_MAX_MEMBERS', 5000))
+    BATCH_ZIP_MAX_RATIO = float(os.environ.get('BATCH_ZIP_MAX_RATIO', 100))
+
+    # 多程序服務配置（WEB_WORKERS 大於 1 時以 gunicorn 啟動，見 gunicorn.conf.py）
+    WEB_WORKERS = int(os.environ.get('WEB_WORKERS', 1))
+    WEB_THREADS = int(os.environ.get('WEB_THREADS', 8))
+    # 清理排程、儲存用量、非同步工作與快取索引的共用資料庫，需位於本機磁碟
+    STATE_DB_PATH = os.environ.get('STATE_DB_PATH', os.path.join(TEMP_FOLDER, '_state.db'))
+
+    # 多節點配置：設定 SPOOL_FOLDER（所有節點共用的目錄）後 /jobs 的工作寫入共用目錄，由工作節點認領
+    SPOOL_FOLDER = os.environ.get('SPOOL_FOLDER', '')
+    # 本程序認領工作的執行緒數，API 節點預設為 0（spool-worker.py 預設為 JOB_WORKERS）
+    SPOOL_WORKERS = int(os.environ.get('SPOOL_WORKERS', 0))
+    SPOOL_LEASE_SECONDS = int(os.environ.get('SPOOL_LEASE_SECONDS', 60))
+    SPOOL_MAX_ATTEMPTS = int(os.environ.get('SPOOL_MAX_ATTEMPTS', 3))
+    SPOOL_POLL_SECONDS = float(os.environ.get('SPOOL_POLL_SECONDS', 1.0))
+
+    # 監控配置：啟用 /metrics 端點（Prometheus 文字格式）
+    METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'True').lower() == 'true'
+
     # 安全配置
     MAX_CONTENT_LENGTH = int(os.environ.get('MAX_CONTENT_LENGTH', 500 * 1024 * 1024))  # 500MB    ALLOWED_EXTENSIONS = {'pptx'}
     
@@ -86,7 +154,85 @@ class Config:
         
         if cls.DEFAULT_CLEANUP_MINUTES <= 0:
             errors.append("DEFAULT_CLEANUP_MINUTES 必須大於 0")
-        
+
+        if cls.CACHE_ENABLED and cls.CACHE_MAX_GB <= 0:
+            errors.append("CACHE_MAX_GB 必須大於 0")
+
+        if cls.INSPECT_CACHE_ENTRIES <= 0:
+            errors.append("INSPECT_CACHE_ENTRIES 必須大於 0")
+
+        if cls.MAX_CONCURRENT_CONVERSIONS <= 0:
+            errors.append("MAX_CONCURRENT_CONVERSIONS 必須大於 0")
+
+        if cls.MAX_QUEUE_DEPTH < 0:
+            errors.append("MAX_QUEUE_DEPTH 不可小於 0")
+
+        if cls.JOB_WORKERS <= 0:
+            errors.append("JOB_WORKERS 必須大於 0")
+
+        if cls.RENDER_WINDOW_PAGES <= 0:
+            errors.append("RENDER_WINDOW_PAGES 必須大於 0")
+
+        if cls.DEFAULT_RENDER_MODE not in ('eager', 'lazy'):
+            errors.append("DEFAULT_RENDER_MODE 必須是 eager 或 lazy")
+
+        if cls.RENDER_WORKERS <= 0:
+            errors.append("RENDER_WORKERS 必須大於 0")
+
+        if cls.DEFAULT_IMAGE_FORMAT not in ('jpg', 'jpeg', 'webp', 'png', 'avif'):
+            errors.append("DEFAULT_IMAGE_FORMAT 必須是 jpg、webp、png 或 avif")
+
+        if cls.ENCODE_THREADS <= 0:
+            errors.append("ENCODE_THREADS 必須大於 0")
+
+        if cls.OFFICE_POOL_SIZE < 0:
+            errors.append("OFFICE_POOL_SIZE 不可小於 0")
+
+        if cls.OFFICE_MAX_CONVERSIONS_PER_WORKER <= 0:
+            errors.append("OFFICE_MAX_CONVERSIONS_PER_WORKER 必須大於 0")
+
+        if cls.BATCH_WORKERS <= 0:
+            errors.append("BATCH_WORKERS 必須大於 0")
+
+        if cls.BATCH_MAX_FILES <= 0:
+            errors.append("BATCH_MAX_FILES 必須大於 0")
+
+        if cls.BATCH_GROUP_SIZE <= 0:
+            errors.append("BATCH_GROUP_SIZE 必須大於 0")
+
+        if cls.BATCH_ZIP_MAX_MEMBERS <= 0:
+            errors.append("BATCH_ZIP_MAX_MEMBERS 必須大於 0")
+
+        if cls.BATCH_ZIP_MAX_RATIO < 1:
+            errors.append("BATCH_ZIP_MAX_RATIO 不可小於 1")
+
+        if cls.WEB_WORKERS <= 0:
+            errors.append("WEB_WORKERS 必須大於 0")
+
+        if cls.WEB_THREADS <= 0:
+            errors.append("WEB_THREADS 必須大於 0")
+
+        if cls.SPOOL_WORKERS < 0:
+            errors.append("SPOOL_WORKERS 不可小於 0")
+
+        if cls.SPOOL_WORKERS > 0 and not cls.SPOOL_FOLDER:
+            errors.append("SPOOL_WORKERS 需要設定 SPOOL_FOLDER")
+
+        if cls.SPOOL_LEASE_SECONDS <= 0:
+            errors.append("SPOOL_LEASE_SECONDS 必須大於 0")
+
+        if cls.SPOOL_MAX_ATTEMPTS <= 0:
+            errors.append("SPOOL_MAX_ATTEMPTS 必須大於 0")
+
+        if cls.SPOOL_POLL_SECONDS <= 0:
+            errors.append("SPOOL_POLL_SECONDS 必須大於 0")
+
+        if cls.DOWNLOAD_CACHE_MAX_AGE < 0:
+            errors.append("DOWNLOAD_CACHE_MAX_AGE 不可小於 0")
+
+        if cls.DOWNLOAD_ACCEL_REDIRECT and not cls.DOWNLOAD_ACCEL_PREFIX.startswith('/'):
+            errors.append("DOWNLOAD_ACCEL_PREFIX 必須以 / 開頭")
+
         return errors
     
     @classmethod
@@ -96,18 +242,64 @@ class Config:
             'storage': {
                 'max_size_gb': cls.MAX_STORAGE_GB,
                 'temp_folder': cls.TEMP_FOLDER,
-                'upload_folder': cls.UPLOAD_FOLDER
+                'upload_folder': cls.UPLOAD_FOLDER,
+                'reconcile_seconds': cls.STORAGE_RECONCILE_SECONDS
             },
             'cleanup': {
                 'default_minutes': cls.DEFAULT_CLEANUP_MINUTES,
                 'auto_cleanup_hours': cls.AUTO_CLEANUP_OLD_FILES_HOURS
             },
+            'cache': {
+                'enabled': cls.CACHE_ENABLED,
+                'max_size_gb': cls.CACHE_MAX_GB,
+                'folder': cls.CACHE_FOLDER,
+                'inspect_entries': cls.INSPECT_CACHE_ENTRIES
+            },
             'conversion': {
                 'default_dpi': cls.DEFAULT_DPI,
                 'timeout_seconds': cls.CONVERSION_TIMEOUT_SECONDS,
+                'max_concurrent': cls.MAX_CONCURRENT_CONVERSIONS,
+                'max_queue_depth': cls.MAX_QUEUE_DEPTH,
+                'job_workers': cls.JOB_WORKERS,
+                'render_window_pages': cls.RENDER_WINDOW_PAGES,
+                'default_render_mode': cls.DEFAULT_RENDER_MODE,
+                'render_workers': cls.RENDER_WORKERS,
+                'encode_threads': cls.ENCODE_THREADS,
+                'default_image_format': cls.DEFAULT_IMAGE_FORMAT,
                 'max_file_size_mb': cls.MAX_CONTENT_LENGTH / (1024 * 1024)
+            },
+            'batch': {
+                'workers': cls.BATCH_WORKERS,
+                'max_files': cls.BATCH_MAX_FILES,
+                'group_size': cls.BATCH_GROUP_SIZE,
+                'group_max_mb': cls.BATCH_GROUP_MAX_MB,
+                'zip_max_members': cls.BATCH_ZIP_MAX_MEMBERS,
+                'zip_max_ratio': cls.BATCH_ZIP_MAX_RATIO
+            },
+            'download': {
+                'cache_max_age': cls.DOWNLOAD_CACHE_MAX_AGE,
+                'accel_redirect': cls.DOWNLOAD_ACCEL_REDIRECT,
+                'accel_prefix': cls.DOWNLOAD_ACCEL_PREFIX
+            },
+            'server': {
+                'web_workers': cls.WEB_WORKERS,
+                'web_threads': cls.WEB_THREADS,
+                'state_db_path': cls.STATE_DB_PATH
+            },
+            'spool': {
+                'enabled': bool(cls.SPOOL_FOLDER),
+                'folder': cls.SPOOL_FOLDER,
+                'workers': cls.SPOOL_WORKERS,
+                'lease_seconds': cls.SPOOL_LEASE_SECONDS,
+                'max_attempts': cls.SPOOL_MAX_ATTEMPTS,
+                'poll_seconds': cls.SPOOL_POLL_SECONDS
+            },
+            'metrics': {
+                'enabled': cls.METRICS_ENABLED
             },            'libreoffice': {
                 'path': cls.LIBREOFFICE_PATH,
-                'available': shutil.which(cls.LIBREOFFICE_PATH) is not None or os.path.exists(cls.LIBREOFFICE_PATH)
+                'available': shutil.which(cls.LIBREOFFICE_PATH) is not None or os.path.exists(cls.LIBREOFFICE_PATH),
+                'pool_size': cls.OFFICE_POOL_SIZE,
+                'max_conversions_per_worker': cls.OFFICE_MAX_CONVERSIONS_PER_WORKER
             }
         }
@@ -0,0 +1,269 @@
+"""
+轉換結果快取模組
+以上傳檔案的 SHA-256 與轉換參數作為索引，重複上傳相同簡報時直接回傳已產生的 PDF 與圖片
+"""
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+
+from .etags import etag_path
+from .state_store import StateStore
+
+_CACHE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS cache_entries (
+    key TEXT PRIMARY KEY,
+    meta TEXT NOT NULL,
+    size_bytes INTEGER NOT NULL,
+    last_access REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS cache_entries_last_access ON cache_entries (last_access);
+"""
+# 寫入中的暫存資料夾超過此秒數視為中斷遺留（可能屬於其他仍在執行的程序，不能直接刪除）
+_STALE_STAGING_SECONDS = 3600
+
+
+class ConversionCache:
+    def __init__(self, cache_dir, max_size_gb=2, store=None):
+        """
+        store 為多個服務程序共用的 StateStore，未提供時使用快取資料夾中的 index.db；
+        命中與移除次數為本程序的統計
+        """
+        self.cache_dir = cache_dir
+        self.max_size_bytes = int(max_size_gb * 1024 * 1024 * 1024)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self.store = store or StateStore(os.path.join(self.cache_dir, 'index.db'))
+        self.store.ensure_schema(_CACHE_SCHEMA)
+        self._sync_index()
+
+    @staticmethod
+    def make_key(file_hash, **params):
+        """
+        產生快取索引鍵
+
+        Args:
+            file_hash (str): 上傳檔案的 SHA-256
+            **params: 影響輸出結果的轉換參數
+
+        Returns:
+            str: 快取索引鍵
+        """
+        canonical = json.dumps({'file': file_hash, 'params': params}, sort_keys=True)
+        return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+    def _entry_dir(self, key):
+        return os.path.join(self.cache_dir, key)
+
+    def _sync_index(self):
+        """啟動時比對索引與快取資料夾：補上索引中缺少的項目，移除檔案已不存在的索引"""
+        indexed = {row['key'] for row in self.store.query('SELECT key FROM cache_entries')}
+        on_disk = set()
+        for key in os.listdir(self.cache_dir):
+            entry_dir = self._entry_dir(key)
+            if not os.path.isdir(entry_dir):
+                continue
+            if key.endswith('.tmp'):
+                try:
+                    if time.time() - os.path.getmtime(entry_dir) > _STALE_STAGING_SECONDS:
+                        shutil.rmtree(entry_dir, ignore_errors=True)
+                except OSError:
+                    pass
+                continue
+            meta_path = os.path.join(entry_dir, 'meta.json')
+            try:
+                with open(meta_path, 'r', encoding='utf-8') as f:
+                    meta = json.load(f)
+            except (OSError, ValueError):
+                # 項目以改名的方式完成寫入，沒有 meta.json 表示內容不完整
+                shutil.rmtree(entry_dir, ignore_errors=True)
+                continue
+            on_disk.add(key)
+            if key not in indexed:
+                self.store.execute(
+                    'INSERT OR IGNORE INTO cache_entries (key, meta, size_bytes, last_access) VALUES (?, ?, ?, ?)',
+                    (key, json.dumps(meta), meta.get('size_bytes', 0), os.path.getmtime(meta_path))
+                )
+
+        missing = indexed - on_disk
+        if missing:
+            with self.store.transaction() as connection:
+                connection.executemany('DELETE FROM cache_entries WHERE key = ?', [(key,) for key in missing])
+
+    @staticmethod
+    def _link_or_copy(source, destination):
+        try:
+            os.link(source, destination)
+        except OSError:
+            shutil.copy2(source, destination)
+
+    @classmethod
+    def _link_with_etag(cls, source, destination):
+        """連同寫入時記錄的內容雜湊一起放入，下載時不需重新計算 ETag"""
+        cls._link_or_copy(source, destination)
+        if os.path.exists(etag_path(source)):
+            cls._link_or_copy(etag_path(source), etag_path(destination))
+
+    def contains(self, key):
+        """檢查快取是否有此索引鍵（不計入命中統計，不複製檔案）"""
+        return self.store.query_one('SELECT 1 FROM cache_entries WHERE key = ?', (key,)) is not None
+
+    def get(self, key, output_dir):
+        """
+        查詢快取，命中時將檔案放入輸出資料夾
+
+        Args:
+            key (str): 快取索引鍵
+            output_dir (str): 轉換輸出資料夾
+
+        Returns:
+            dict | None: 與 convert_pptx_to_all 相同格式的結果，未命中時回傳 None
+        """
+        row = self.store.query_one('SELECT meta FROM cache_entries WHERE key = ?', (key,))
+        with self._lock:
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        meta = json.loads(row['meta'])
+        self.store.execute('UPDATE cache_entries SET last_access = ? WHERE key = ?', (time.time(), key))
+
+        entry_dir = self._entry_dir(key)
+        try:
+            for filename in [meta['pdf_file']] + meta['image_files'] + meta.get('variant_files', []):
+                self._link_with_etag(os.path.join(entry_dir, filename), os.path.join(output_dir, filename))
+        except OSError:
+            # 快取檔案遺失時視為未命中
+            self._remove(key)
+            with self._lock:
+                self.hits -= 1
+                self.misses += 1
+            return None
+
+        return {
+            'success': True,
+            'pdf_file': meta['pdf_file'],
+            'image_files': list(meta['image_files']),
+            'variant_files': list(meta.get('variant_files', [])),
+            'error': None,
+            'total_pages': meta['total_pages'],
+            'hidden_slides_processed': meta['hidden_slides_processed'],
+            'timings': {}
+        }
+
+    def put(self, key, output_dir, result):
+        """
+        儲存轉換結果
+
+        Args:
+            key (str): 快取索引鍵
+            output_dir (str): 轉換輸出資料夾
+            result (dict): convert_pptx_to_all 的結果
+        """
+        entry_dir = self._entry_dir(key)
+        staging_dir = f"{entry_dir}.{os.getpid()}.{threading.get_ident()}.tmp"
+        filenames = [result['pdf_file']] + list(result['image_files']) + list(result.get('variant_files', []))
+
+        try:
+            os.makedirs(staging_dir, exist_ok=True)
+            size_bytes = 0
+            for filename in filenames:
+                destination = os.path.join(staging_dir, filename)
+                self._link_with_etag(os.path.join(output_dir, filename), destination)
+                size_bytes += os.path.getsize(destination)
+
+            if size_bytes > self.max_size_bytes:
+                shutil.rmtree(staging_dir, ignore_errors=True)
+                return
+
+            meta = {
+                'pdf_file': result['pdf_file'],
+                'image_files': list(result['image_files']),
+                'variant_files': list(result.get('variant_files', [])),
+                'total_pages': result['total_pages'],
+                'hidden_slides_processed': result['hidden_slides_processed'],
+                'size_bytes': size_bytes,
+                'created_at': time.time()
+            }
+            with open(os.path.join(staging_dir, 'meta.json'), 'w', encoding='utf-8') as f:
+                json.dump(meta, f)
+
+            try:
+                os.rename(staging_dir, entry_dir)
+            except OSError:
+                # 其他請求或程序已寫入相同項目
+                shutil.rmtree(staging_dir, ignore_errors=True)
+                return
+            self.store.execute(
+                'INSERT OR IGNORE INTO cache_entries (key, meta, size_bytes, last_access) VALUES (?, ?, ?, ?)',
+                (key, json.dumps(meta), size_bytes, time.time())
+            )
+        except OSError as e:
+            print(f"寫入轉換快取失敗 {key}: {e}")
+            shutil.rmtree(staging_dir, ignore_errors=True)
+            return
+
+        self.evict(self.total_size() - self.max_size_bytes)
+
+    def total_size(self):
+        """取得所有快取項目的總大小（bytes）"""
+        return self.store.query_one(
+            'SELECT COALESCE(SUM(size_bytes), 0) AS size_bytes FROM cache_entries'
+        )['size_bytes']
+
+    def _remove(self, key):
+        with self.store.transaction() as connection:
+            row = connection.execute('SELECT size_bytes FROM cache_entries WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                return 0
+            connection.execute('DELETE FROM cache_entries WHERE key = ?', (key,))
+        shutil.rmtree(self._entry_dir(key), ignore_errors=True)
+        return row['size_bytes']
+
+    def evict(self, bytes_to_free):
+        """
+        依最近最少使用順序移除項目
+
+        Args:
+            bytes_to_free (int): 需要釋放的空間（bytes）
+
+        Returns:
+            int: 實際釋放的空間（bytes）
+        """
+        freed = 0
+        while freed < bytes_to_free:
+            row = self.store.query_one('SELECT key FROM cache_entries ORDER BY last_access LIMIT 1')
+            if row is None:
+                break
+            freed += self._remove(row['key'])
+            with self._lock:
+                self.evictions += 1
+        return freed
+
+    def get_stats(self):
+        """
+        取得快取統計
+
+        Returns:
+            dict: 統計資訊
+        """
+        row = self.store.query_one(
+            'SELECT COUNT(*) AS entries, COALESCE(SUM(size_bytes), 0) AS size_bytes FROM cache_entries'
+        )
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': row['entries'],
+                'size_bytes': row['size_bytes'],
+                'max_size_bytes': self.max_size_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0
+            }
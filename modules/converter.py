@@ -1,21 +1,60 @@
+import json
 import os
 import shutil
 import subprocess
+import threading
+import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
 import zipfile
-import xml.etree.ElementTree as ET
-from pdf2image import convert_from_path
+from contextlib import contextmanager
 from .config import Config
+from .etags import record_file_etag
 
 try:
-    from pptx import Presentation
-    PPTX_AVAILABLE = True
+    import fcntl
 except ImportError:
-    PPTX_AVAILABLE = False
+    # Windows 沒有 flock，按需渲染的鎖只在單一程序內有效
+    fcntl = None
+from .office_pool import profile_url
+from .pptx_package import (
+    PRESENTATION_PART,
+    copy_entry_raw,
+    is_slide_part,
+    unhide_presentation_xml,
+    unhide_slide_xml,
+    write_entry
+)
+from .rasterizer import (
+    DEFAULT_ENCODING,
+    get_page_count,
+    image_extension,
+    page_filename,
+    parse_page_filename,
+    plan_page_chunks,
+    render_chunk,
+    render_page_range,
+    select_pages
+)
+
+# 轉換資料夾中記錄 PDF 與渲染參數的檔案
+RENDER_MANIFEST = 'manifest.json'
+# 按需渲染的頁碼超出範圍（或資料夾已被清理），其他失敗為渲染錯誤
+PAGE_NOT_FOUND = "頁面不存在"
 
 
 class PPTXConverter:
-    def __init__(self):
+    def __init__(self, office_pool=None, profile_pool=None):
         self.libreoffice_path = Config.LIBREOFFICE_PATH
+        self.office_pool = office_pool
+        self.profile_pool = profile_pool
+        self.render_workers = Config.RENDER_WORKERS
+        self._render_executor = None
+        self._render_executor_lock = threading.Lock()
+        # 按需渲染時每個頁面一把鎖：{(output_dir, page_number): [lock, 使用中的請求數]}
+        self._page_locks = {}
+        self._page_locks_lock = threading.Lock()
     
     def is_libreoffice_available(self):
         if shutil.which(self.libreoffice_path):
@@ -38,60 +77,147 @@ class PPTXConverter:
                 
         return False
     
+    def _get_render_executor(self):
+        with self._render_executor_lock:
+            if self._render_executor is None:
+                # 使用 spawn 避免在多執行緒的服務程序中 fork
+                self._render_executor = ProcessPoolExecutor(
+                    max_workers=self.render_workers,
+                    mp_context=multiprocessing.get_context('spawn')
+                )
+            return self._render_executor
+
+    def _reset_render_executor(self):
+        with self._render_executor_lock:
+            if self._render_executor is not None:
+                self._render_executor.shutdown(wait=False)
+                self._render_executor = None
+
+    def _render_pages(self, pdf_path, output_dir, dpi, pages, window_size, variant_widths=(), encoding=None,
+                      on_page=None, stats=None):
+        chunks = plan_page_chunks(pages, self.render_workers, window_size)
+        stats = stats if stats is not None else {}
+        if self.render_workers <= 1 or len(chunks) <= 1:
+            return self._render_chunks_serial(
+                pdf_path, output_dir, dpi, chunks, window_size, variant_widths, encoding, on_page, stats
+            )
+
+        try:
+            executor = self._get_render_executor()
+            futures = {
+                executor.submit(
+                    render_chunk, pdf_path, output_dir, dpi, first_page, last_page, window_size,
+                    variant_widths, encoding
+                ): index
+                for index, (first_page, last_page) in enumerate(chunks)
+            }
+            # 工作程序無法呼叫回呼函數，每段完成時回報該段的頁面
+            chunk_results = [None] * len(chunks)
+            for future in as_completed(futures):
+                chunk_results[futures[future]], chunk_stats = future.result()
+                for key, value in chunk_stats.items():
+                    stats[key] = stats.get(key, 0) + value
+                if on_page:
+                    for image_file in chunk_results[futures[future]]:
+                        on_page(image_file)
+            return [image_file for chunk in chunk_results for image_file in chunk]
+        except BrokenProcessPool:
+            # 工作程序異常結束時重建程序池，本次改為單程序渲染
+            self._reset_render_executor()
+            return self._render_chunks_serial(
+                pdf_path, output_dir, dpi, chunks, window_size, variant_widths, encoding, on_page, stats
+            )
+
+    @staticmethod
+    def _render_chunks_serial(pdf_path, output_dir, dpi, chunks, window_size, variant_widths=(), encoding=None,
+                              on_page=None, stats=None):
+        image_paths = []
+        for first_page, last_page in chunks:
+            image_paths.extend(render_page_range(
+                pdf_path, output_dir, dpi, first_page, last_page, window_size, variant_widths, encoding, on_page,
+                stats
+            ))
+        return image_paths
+
+    @staticmethod
+    def _notify(progress_callback, event):
+        """回報轉換進度，回呼函數的錯誤不影響轉換"""
+        if progress_callback is None:
+            return
+        try:
+            progress_callback(event)
+        except Exception as e:
+            print(f"進度回報失敗: {e}")
+
+    def _notify_stage(self, progress_callback, stage, status, **details):
+        self._notify(progress_callback, {'type': 'stage', 'stage': stage, 'status': status, **details})
+
+    @staticmethod
+    def _wait_for_output(file_path, timeout=2.0, interval=0.05):
+        """
+        確認輸出檔案已產生
+        呼叫時轉換程序已結束（或 UNO 儲存已返回），檔案存在即代表寫入完成；
+        只有在檔案系統延遲可見時才短暫輪詢
+        """
+        deadline = time.time() + timeout
+        while True:
+            try:
+                if os.path.getsize(file_path) > 0:
+                    return True
+            except OSError:
+                pass
+            if time.time() >= deadline:
+                return False
+            time.sleep(interval)
+
     def _process_hidden_slides(self, pptx_file, output_dir):
         try:
-            base_name = os.path.splitext(os.path.basename(pptx_file))[0]
-            processed_file = os.path.join(output_dir, f"{base_name}_unhidden.pptx")
-            shutil.copy2(pptx_file, processed_file)
+            with zipfile.ZipFile(pptx_file, 'r') as zin:
+                # 只讀取投影片相關的 XML 部件，找出實際需要修改的部件
+                patched_parts = {}
+                if PRESENTATION_PART in zin.NameToInfo:
+                    patched = unhide_presentation_xml(zin.read(PRESENTATION_PART))
+                    if patched is not None:
+                        patched_parts[PRESENTATION_PART] = patched
+                for info in zin.infolist():
+                    if is_slide_part(info.filename):
+                        patched = unhide_slide_xml(zin.read(info))
+                        if patched is not None:
+                            patched_parts[info.filename] = patched
 
-            with zipfile.ZipFile(processed_file, 'r') as zin:
-                file_buffer = {name: zin.read(name) for name in zin.namelist()}
+                # 沒有隱藏投影片時直接使用原始檔案
+                if not patched_parts:
+                    return pptx_file
 
-            namespaces = {
-                'p': 'http://schemas.openxmlformats.org/presentationml/2006/main',
-                'r': 'http://schemas.openxmlformats.org/officeDocument/2006/relationships'
-            }
-            ET.register_namespace('', namespaces['p'])
-            ET.register_namespace('r', namespaces['r'])
-
-            if 'ppt/presentation.xml' in file_buffer:
-                presentation_root = ET.fromstring(file_buffer['ppt/presentation.xml'])
-                slide_refs = presentation_root.findall('.//p:sldId', namespaces)
-                for slide_ref in slide_refs:
-                    if slide_ref.get('show') == '0':
-                        slide_ref.set('show', '1')
-                    elif slide_ref.get('show') is None:
-                        slide_ref.set('show', '1')
-                file_buffer['ppt/presentation.xml'] = ET.tostring(presentation_root, encoding='utf-8', xml_declaration=True)
-
-            slide_files = [name for name in file_buffer if name.startswith('ppt/slides/slide') and name.endswith('.xml')]
-            for slide_file in slide_files:
-                try:
-                    slide_root = ET.fromstring(file_buffer[slide_file])
-                    if slide_root.tag.endswith('sld'):
-                        if 'show' in slide_root.attrib and slide_root.attrib['show'] == '0':
-                            slide_root.attrib['show'] = '1'
-                        elif 'show' not in slide_root.attrib:
-                            slide_root.attrib['show'] = '1'
-                        file_buffer[slide_file] = ET.tostring(slide_root, encoding='utf-8', xml_declaration=True)
-                except Exception:
-                    continue
+                base_name = os.path.splitext(os.path.basename(pptx_file))[0]
+                processed_file = os.path.join(output_dir, f"{base_name}_unhidden.pptx")
+                with zipfile.ZipFile(processed_file + '.tmp', 'w') as zout:
+                    for info in zin.infolist():
+                        if info.filename in patched_parts:
+                            write_entry(zout, info, patched_parts[info.filename])
+                        else:
+                            copy_entry_raw(zin, zout, info)
 
-            with zipfile.ZipFile(processed_file + '.tmp', 'w', zipfile.ZIP_DEFLATED) as zout:
-                for name, data in file_buffer.items():
-                    zout.writestr(name, data)
-            shutil.move(processed_file + '.tmp', processed_file)
+            os.replace(processed_file + '.tmp', processed_file)
             return processed_file
         except Exception:
             return None
     
-    def convert_pptx_to_pdf(self, pptx_file, output_dir, include_hidden_slides=True):
+    def convert_pptx_to_pdf(self, pptx_file, output_dir, include_hidden_slides=True, timings=None,
+                            progress_callback=None):
         if not self.is_libreoffice_available():
             return False, "找不到 LibreOffice"
 
+        if timings is None:
+            timings = {}
+
         original_file = pptx_file
-        if include_hidden_slides and PPTX_AVAILABLE:
+        if include_hidden_slides:
+            self._notify_stage(progress_callback, 'hidden_slides', 'started')
+            stage_start = time.time()
             processed_file = self._process_hidden_slides(pptx_file, output_dir)
+            timings['hidden_slides'] = round(time.time() - stage_start, 3)
+            self._notify_stage(progress_callback, 'hidden_slides', 'done', seconds=timings['hidden_slides'])
             if processed_file:
                 pptx_file = processed_file
 
@@ -103,15 +229,71 @@ class PPTXConverter:
             return False, f"LibreOffice 執行檔不存在: {libreoffice_exec}"
         
         os.makedirs(output_dir, exist_ok=True)
+
+        # LibreOffice 以輸入檔名命名輸出檔案，事先確定 PDF 路徑
+        base_name = os.path.splitext(os.path.basename(pptx_path))[0]
+        pdf_file = os.path.join(output_dir, f"{base_name}.pdf")
+
+        if self.office_pool is not None and self.office_pool.running:
+            self._notify_stage(progress_callback, 'pdf_export', 'started')
+            stage_start = time.time()
+            success, pool_result = self.office_pool.convert(pptx_path, pdf_file)
+            timings['pdf_export'] = round(time.time() - stage_start, 3)
+            if success and not self._wait_for_output(pdf_file):
+                success, pool_result = False, "找不到產生的 PDF 檔案"
+
+            if pptx_file != original_file and os.path.exists(pptx_file):
+                try:
+                    os.remove(pptx_file)
+                except:
+                    pass
+
+            return success, pool_result
+        
+        self._notify_stage(progress_callback, 'pdf_export', 'started')
+        stage_start = time.time()
+        success, error = self._run_soffice([pptx_path], output_dir)
+        timings['pdf_export'] = round(time.time() - stage_start, 3)
+        if not success:
+            return False, error
         
+        # 程序結束時輸出檔案已寫入完成，不需固定等待
+        if not self._wait_for_output(pdf_file):
+            return False, "找不到產生的 PDF 檔案"
+        
+        if pptx_file != original_file and os.path.exists(pptx_file):
+            try:
+                os.remove(pptx_file)
+            except:
+                pass
+        
+        return True, pdf_file
+    
+    def _run_soffice(self, input_paths, output_dir):
+        """
+        以單次執行的 LibreOffice 將一或多個簡報轉為 PDF，輸出檔名與輸入檔名相同
+        
+        Returns:
+            tuple: (success: bool, error: str | None)
+        """
+        libreoffice_exec = shutil.which(self.libreoffice_path) or self.libreoffice_path
         cmd_pdf = [
             libreoffice_exec,
             "--headless",
             "--invisible",
             "--convert-to", "pdf",
             "--outdir", output_dir,
-            pptx_path
+            *input_paths
         ]
+
+        # 每個同時進行的轉換使用獨立的使用者設定檔，避免預設設定檔被鎖定
+        profile_dir = None
+        if self.profile_pool is not None:
+            profile_dir = self.profile_pool.acquire(timeout=Config.CONVERSION_TIMEOUT_SECONDS)
+            if profile_dir is None:
+                return False, "等待可用的 LibreOffice 設定檔逾時"
+            cmd_pdf.insert(1, f"-env:UserInstallation={profile_url(profile_dir)}")
+        conversion_failed = True
         
         try:
             encoding = 'cp950' if os.name == 'nt' else 'utf-8'
@@ -129,64 +311,280 @@ class PPTXConverter:
                 error_msg = result.stderr if result.stderr else result.stdout
                 return False, f"PDF 轉換失敗: {error_msg}"
             
-            import time
-            time.sleep(1)
-            
-            pdf_files = [f for f in os.listdir(output_dir) if f.endswith('.pdf')]
-            
-            if not pdf_files:
-                return False, "找不到產生的 PDF 檔案"
-            
-            pdf_file = os.path.join(output_dir, pdf_files[0])
-            
-            if pptx_file != original_file and os.path.exists(pptx_file):
-                try:
-                    os.remove(pptx_file)
-                except:
-                    pass
-            
-            return True, pdf_file
+            conversion_failed = False
+            return True, None
             
         except subprocess.TimeoutExpired:
             return False, "轉換超時（5分鐘）"
         except Exception as e:
             return False, f"轉換過程中發生錯誤: {str(e)}"
+        finally:
+            if profile_dir is not None:
+                self.profile_pool.release(profile_dir, failed=conversion_failed)
     
-    def convert_pdf_to_images(self, pdf_path, output_dir, dpi=200):
+    def export_pdfs(self, items):
+        """
+        以一次 LibreOffice 執行轉換多個簡報，省下每次啟動程序與載入設定檔的時間
+        常駐實例池已避免啟動成本，只在單次執行模式下使用
+        
+        Args:
+            items (list): (pptx_file, output_dir, include_hidden_slides) 的清單
+            
+        Returns:
+            list: 每個簡報的 (pdf_path | None, timings)，失敗的簡報可改為個別轉換
+        """
+        results = [(None, {}) for _ in items]
+        if not items or not self.is_libreoffice_available():
+            return results
+        
+        # 各簡報的檔名可能相同，以序號區分後放在同一個輸出目錄
+        staging_dir = os.path.join(
+            os.path.dirname(os.path.abspath(items[0][1])), f"pdf_group_{os.getpid()}_{threading.get_ident()}"
+        )
+        os.makedirs(staging_dir, exist_ok=True)
         try:
-            pages = convert_from_path(pdf_path, dpi=dpi)
-            image_paths = []
+            staged = []
+            for index, (pptx_file, output_dir, include_hidden_slides) in enumerate(items):
+                timings = results[index][1]
+                if include_hidden_slides:
+                    stage_start = time.time()
+                    processed_file = self._process_hidden_slides(pptx_file, output_dir)
+                    timings['hidden_slides'] = round(time.time() - stage_start, 3)
+                    if processed_file:
+                        pptx_file = processed_file
+                base_name = os.path.splitext(os.path.basename(pptx_file))[0]
+                staged_name = f"{index:04d}_{base_name}"
+                staged_path = os.path.join(staging_dir, f"{staged_name}.pptx")
+                try:
+                    os.link(pptx_file, staged_path)
+                except OSError:
+                    shutil.copyfile(pptx_file, staged_path)
+                staged.append((index, pptx_file, output_dir, base_name, staged_name, staged_path))
             
-            for idx, page in enumerate(pages):
-                image_filename = f"page_{idx+1:03d}.jpg"
-                image_path = os.path.join(output_dir, image_filename)
-                page.save(image_path, "JPEG", quality=85)
-                image_paths.append(image_filename)
+            stage_start = time.time()
+            success, error = self._run_soffice([entry[5] for entry in staged], staging_dir)
+            export_seconds = round(time.time() - stage_start, 3)
+            if not success:
+                print(f"批次 PDF 轉換失敗，改為個別轉換: {error}")
+            
+            for index, pptx_file, output_dir, base_name, staged_name, _ in staged:
+                staged_pdf = os.path.join(staging_dir, f"{staged_name}.pdf")
+                if pptx_file != items[index][0] and os.path.exists(pptx_file):
+                    try:
+                        os.remove(pptx_file)
+                    except OSError:
+                        pass
+                if not success or not os.path.exists(staged_pdf):
+                    continue
+                pdf_file = os.path.join(output_dir, f"{base_name}.pdf")
+                os.replace(staged_pdf, pdf_file)
+                results[index][1]['pdf_export'] = export_seconds
+                results[index] = (pdf_file, results[index][1])
+        finally:
+            shutil.rmtree(staging_dir, ignore_errors=True)
+        
+        return results
+    
+    def convert_pdf_to_images(self, pdf_path, output_dir, dpi=200, window_size=None, pages=None, variant_widths=(),
+                              encoding=None, on_page=None, stats=None):
+        """
+        pages 為要渲染的頁碼清單，None 表示全部頁面；variant_widths 為縮小版本的寬度；
+        encoding 為 build_encoding 的結果，None 使用 JPEG；on_page 在每頁存檔後以檔名呼叫；
+        stats 累加點陣化與編碼的秒數及寫入的 bytes（多個渲染程序時為各程序的總和）
+        """
+        try:
+            window_size = window_size or Config.RENDER_WINDOW_PAGES
+            if pages is None:
+                pages = select_pages(None, get_page_count(pdf_path))
+            image_paths = self._render_pages(
+                pdf_path, output_dir, dpi, pages, window_size, tuple(variant_widths), encoding, on_page, stats
+            )
             
             return True, image_paths
             
         except Exception as e:
             return False, f"圖片轉換失敗: {str(e)}"
     
-    def convert_pptx_to_all(self, pptx_file, output_dir, dpi=200, include_hidden_slides=True):
+    def write_render_manifest(self, output_dir, pdf_file, total_pages, dpi, variant_widths=(), encoding=None,
+                              pages=None):
+        """
+        記錄轉換資料夾的 PDF 與渲染參數，供之後按需渲染其他頁面
+        
+        Args:
+            output_dir (str): 轉換輸出資料夾
+            pdf_file (str): PDF 檔名
+            total_pages (int): PDF 總頁數
+            dpi (int): 圖片解析度
+            variant_widths (list): 縮小版本的寬度
+            encoding (dict): 圖片編碼設定
+            pages (list): 轉換時要求的頁碼，None 表示全部頁面
+        """
+        manifest = {
+            'pdf_file': pdf_file,
+            'total_pages': total_pages,
+            'dpi': dpi,
+            'variant_widths': list(variant_widths),
+            'encoding': encoding or DEFAULT_ENCODING,
+            'pages': list(pages) if pages is not None else list(range(1, total_pages + 1))
+        }
+        manifest_path = os.path.join(output_dir, RENDER_MANIFEST)
+        with open(manifest_path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(manifest, f)
+        os.replace(manifest_path + '.tmp', manifest_path)
+    
+    @staticmethod
+    def read_render_manifest(output_dir):
+        """
+        讀取轉換資料夾的渲染記錄
+        
+        Returns:
+            dict | None: 記錄內容，不存在時回傳 None
+        """
+        try:
+            with open(os.path.join(output_dir, RENDER_MANIFEST), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+    
+    @contextmanager
+    def _page_lock(self, output_dir, page_number):
+        """
+        同一頁面同時只允許一個請求渲染，鎖在沒有請求使用時移除
+        程序內以執行緒鎖排隊，程序間（多個服務程序）以輸出資料夾中的鎖定檔 flock 協調
+        """
+        key = (os.path.abspath(output_dir), page_number)
+        with self._page_locks_lock:
+            entry = self._page_locks.setdefault(key, [threading.Lock(), 0])
+            entry[1] += 1
+        try:
+            with entry[0]:
+                if fcntl is None:
+                    yield
+                    return
+                # 鎖定檔不刪除：等待中的程序仍持有同一個檔案，隨資料夾一起清理
+                with open(os.path.join(output_dir, f".page_{page_number:03d}.lock"), 'a') as lock_file:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX)
+                    try:
+                        yield
+                    finally:
+                        fcntl.flock(lock_file, fcntl.LOCK_UN)
+        finally:
+            with self._page_locks_lock:
+                entry[1] -= 1
+                if entry[1] == 0:
+                    del self._page_locks[key]
+    
+    def render_page(self, output_dir, page_number, stats=None):
+        """
+        按需渲染單一頁面（先前轉換時未要求的頁面）
+        同一頁面的並行請求（包括其他服務程序）只會渲染一次，其餘請求等待後直接使用已產生的檔案
+        
+        Args:
+            output_dir (str): 轉換輸出資料夾
+            page_number (int): 頁碼（從 1 開始），縮小版本與原始圖片一起產生
+            stats (dict): 累加點陣化與編碼的秒數及寫入的 bytes（可選）
+            
+        Returns:
+            tuple: (success: bool, image_file or error: str, rendered: bool)，
+                   頁碼超出範圍時 error 為 PAGE_NOT_FOUND
+        """
+        manifest = self.read_render_manifest(output_dir)
+        if manifest is None or not 1 <= page_number <= manifest['total_pages']:
+            return False, PAGE_NOT_FOUND, False
+        
+        encoding = manifest.get('encoding', DEFAULT_ENCODING)
+        filename = page_filename(page_number, extension=image_extension(encoding))
+        with self._page_lock(output_dir, page_number):
+            if os.path.exists(os.path.join(output_dir, filename)):
+                return True, filename, False
+            
+            pdf_path = os.path.join(output_dir, manifest['pdf_file'])
+            variant_widths = tuple(manifest.get('variant_widths', ()))
+            try:
+                render_page_range(
+                    pdf_path, output_dir, manifest['dpi'], page_number, page_number, 1, variant_widths, encoding,
+                    stats=stats
+                )
+                return True, filename, True
+            except Exception as e:
+                return False, f"圖片轉換失敗: {str(e)}", False
+    
+    def convert_pptx_to_all(self, pptx_file, output_dir, dpi=200, include_hidden_slides=True, page_ranges=None,
+                            render_images=True, variant_widths=(), encoding=None, progress_callback=None,
+                            pdf_file=None):
+        """
+        page_ranges 為 parse_page_spec 的結果，只渲染這些頁面；None 表示全部頁面
+        render_images 為 False 時只產生 PDF，圖片在下載時按需渲染
+        variant_widths 為縮小版本的寬度，每頁只渲染一次再縮小產生
+        encoding 為 build_encoding 的結果，None 使用 JPEG
+        progress_callback 以事件字典回報各階段開始/完成與每頁完成（page N/M）
+        timings 記錄各階段秒數：hidden_slides、pdf_export、rasterize（實際經過時間），
+        pdftoppm、encode（各渲染程序的累計時間）；bytes_written 為 PDF 與圖片的總大小
+        pdf_file 為已由 export_pdfs 產生的 PDF，提供時略過 PDF 轉換（timings 由呼叫端補上）
+        """
         result = {
             'success': False,
             'pdf_file': None,
             'image_files': [],
+            'variant_files': [],
             'error': None,
             'total_pages': 0,
-            'hidden_slides_processed': False
+            'hidden_slides_processed': False,
+            'timings': {},
+            'bytes_written': 0
         }
         
-        pdf_success, pdf_result = self.convert_pptx_to_pdf(pptx_file, output_dir, include_hidden_slides)
+        if pdf_file is not None:
+            pdf_success, pdf_result = True, pdf_file
+        else:
+            pdf_success, pdf_result = self.convert_pptx_to_pdf(
+                pptx_file, output_dir, include_hidden_slides, timings=result['timings'],
+                progress_callback=progress_callback
+            )
         if not pdf_success:
             result['error'] = pdf_result
             return result
+        self._notify_stage(
+            progress_callback, 'pdf_export', 'done',
+            seconds=result['timings'].get('pdf_export'), pdf_file=os.path.basename(pdf_result)
+        )
         
         result['pdf_file'] = os.path.basename(pdf_result)
-        result['hidden_slides_processed'] = include_hidden_slides and PPTX_AVAILABLE
+        result['hidden_slides_processed'] = include_hidden_slides
+        result['bytes_written'] = os.path.getsize(pdf_result)
+        # 下載時的 ETag 在寫入時計算，PDF 剛寫入仍在頁面快取中
+        record_file_etag(pdf_result)
         
-        image_success, image_result = self.convert_pdf_to_images(pdf_result, output_dir, dpi)
+        render_stats = {}
+        stage_start = time.time()
+        try:
+            total_pages = get_page_count(pdf_result)
+            pages = select_pages(page_ranges, total_pages) if render_images else []
+            self._notify_stage(progress_callback, 'rasterize', 'started', pages=len(pages), total_pages=total_pages)
+            rendered = []
+            
+            def on_page(image_file):
+                rendered.append(image_file)
+                self._notify(progress_callback, {
+                    'type': 'page',
+                    'page': parse_page_filename(image_file),
+                    'file': image_file,
+                    'rendered': len(rendered),
+                    'total': len(pages)
+                })
+            
+            image_success, image_result = self.convert_pdf_to_images(
+                pdf_result, output_dir, dpi, pages=pages, variant_widths=variant_widths, encoding=encoding,
+                on_page=on_page if progress_callback else None, stats=render_stats
+            )
+        except Exception as e:
+            image_success, image_result = False, f"圖片轉換失敗: {str(e)}"
+        result['timings']['rasterize'] = round(time.time() - stage_start, 3)
+        if render_stats:
+            result['timings']['pdftoppm'] = round(render_stats.get('pdftoppm_seconds', 0), 3)
+            result['timings']['encode'] = round(render_stats.get('encode_seconds', 0), 3)
+            result['bytes_written'] += render_stats.get('bytes_written', 0)
+        self._notify_stage(progress_callback, 'rasterize', 'done', seconds=result['timings']['rasterize'])
         if not image_success:
             result['error'] = image_result
             result['success'] = True
@@ -195,7 +593,13 @@ class PPTXConverter:
             return result
         
         result['image_files'] = image_result
-        result['total_pages'] = len(image_result)
+        extension = image_extension(encoding or DEFAULT_ENCODING)
+        result['variant_files'] = [
+            page_filename(parse_page_filename(image_file), width, extension)
+            for image_file in image_result
+            for width in variant_widths
+        ]
+        result['total_pages'] = total_pages
         result['success'] = True
         
         return result
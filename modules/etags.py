@@ -0,0 +1,69 @@
+"""
+輸出檔案的內容雜湊
+寫入 PDF 與圖片時同時計算 SHA-256，存成同一資料夾中的 .<檔名>.sha256，
+下載時直接讀取作為 ETag，不需要在下載時讀取整個檔案
+"""
+import hashlib
+import os
+import threading
+
+ETAG_SUFFIX = '.sha256'
+
+
+def etag_path(file_path):
+    """
+    取得檔案的雜湊記錄路徑
+
+    Args:
+        file_path (str): 輸出檔案路徑
+
+    Returns:
+        str: 雜湊記錄路徑
+    """
+    directory, filename = os.path.split(file_path)
+    return os.path.join(directory, f".{filename}{ETAG_SUFFIX}")
+
+
+def write_etag(file_path, digest):
+    """
+    記錄檔案的內容雜湊（先寫入暫存檔再改名）
+
+    Args:
+        file_path (str): 輸出檔案路徑
+        digest (str): SHA-256 十六進位字串
+    """
+    path = etag_path(file_path)
+    temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(temp_path, 'w', encoding='ascii') as f:
+        f.write(digest)
+    os.replace(temp_path, path)
+
+
+def record_file_etag(file_path, chunk_size=1024 * 1024):
+    """
+    計算已寫入檔案（例如 LibreOffice 產生的 PDF）的內容雜湊並記錄
+
+    Returns:
+        str: 內容雜湊
+    """
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    etag = digest.hexdigest()
+    write_etag(file_path, etag)
+    return etag
+
+
+def read_etag(file_path):
+    """
+    讀取寫入時記錄的內容雜湊
+
+    Returns:
+        str | None: 內容雜湊，未記錄時回傳 None
+    """
+    try:
+        with open(etag_path(file_path), 'r', encoding='ascii') as f:
+            return f.read().strip() or None
+    except OSError:
+        return None
@@ -3,22 +3,309 @@
 處理臨時檔案的建立、清理和監控
 """
 import os
+import hashlib
+import json
 import shutil
+import sqlite3
 import time
 import threading
+import uuid
 from datetime import datetime, timedelta
 
+from .etags import read_etag
+from .state_store import StateStore
+from .upload_stream import RECORD_INTERVAL_BYTES, UploadRejected
+
+
+_FILE_MANAGER_SCHEMA = """
+CREATE TABLE IF NOT EXISTS cleanup_schedule (
+    folder_path TEXT PRIMARY KEY,
+    expires_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS cleanup_schedule_expires_at ON cleanup_schedule (expires_at);
+CREATE TABLE IF NOT EXISTS storage_items (
+    item_path TEXT PRIMARY KEY,
+    size_bytes INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS storage_total (
+    id INTEGER PRIMARY KEY CHECK (id = 0),
+    size_bytes INTEGER NOT NULL
+);
+CREATE TRIGGER IF NOT EXISTS storage_items_insert AFTER INSERT ON storage_items BEGIN
+    UPDATE storage_total SET size_bytes = size_bytes + NEW.size_bytes WHERE id = 0;
+END;
+CREATE TRIGGER IF NOT EXISTS storage_items_update AFTER UPDATE OF size_bytes ON storage_items BEGIN
+    UPDATE storage_total SET size_bytes = size_bytes - OLD.size_bytes + NEW.size_bytes WHERE id = 0;
+END;
+CREATE TRIGGER IF NOT EXISTS storage_items_delete AFTER DELETE ON storage_items BEGIN
+    UPDATE storage_total SET size_bytes = size_bytes - OLD.size_bytes WHERE id = 0;
+END;
+INSERT OR IGNORE INTO storage_total (id, size_bytes)
+    SELECT 0, COALESCE(SUM(size_bytes), 0) FROM storage_items;
+"""
+
+
+class CleanupScheduler:
+    """
+    清理排程保存在共用資料庫中，服務重新啟動後繼續原本的清理時間
+    每個程序各有一個背景執行緒，到期項目以交易領取，同一個資料夾只會被一個程序清理
+    """
+    
+    def __init__(self, cleanup_callback, store, poll_interval=5.0, legacy_index_path=None):
+        self.cleanup_callback = cleanup_callback
+        self.store = store
+        # 其他程序新增的排程最晚在此秒數後被看見
+        self.poll_interval = poll_interval
+        self._condition = threading.Condition()
+        self._thread = None
+        if legacy_index_path:
+            self._import_legacy_index(legacy_index_path)
+    
+    def _import_legacy_index(self, index_path):
+        """匯入舊版 JSON 索引檔中尚未執行的清理排程"""
+        if not os.path.exists(index_path):
+            return
+        try:
+            with open(index_path, 'r', encoding='utf-8') as f:
+                entries = json.load(f)
+            with self.store.transaction() as connection:
+                connection.executemany(
+                    'INSERT OR IGNORE INTO cleanup_schedule (folder_path, expires_at) VALUES (?, ?)',
+                    list(entries.items())
+                )
+            os.remove(index_path)
+        except (OSError, ValueError) as e:
+            print(f"匯入清理排程索引失敗: {e}")
+    
+    def start(self):
+        """啟動背景執行緒"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='cleanup-scheduler', daemon=True)
+            self._thread.start()
+    
+    def schedule(self, folder_path, expires_at):
+        """
+        安排或重新安排清理時間
+        
+        Args:
+            folder_path (str): 資料夾路徑
+            expires_at (float): 到期時間（Unix timestamp）
+        """
+        self.store.execute(
+            'INSERT INTO cleanup_schedule (folder_path, expires_at) VALUES (?, ?) '
+            'ON CONFLICT (folder_path) DO UPDATE SET expires_at = excluded.expires_at',
+            (folder_path, expires_at)
+        )
+        with self._condition:
+            self._condition.notify()
+    
+    def cancel(self, folder_path):
+        """
+        取消清理排程
+        
+        Returns:
+            bool: 是否有被取消的排程
+        """
+        return self.store.execute('DELETE FROM cleanup_schedule WHERE folder_path = ?', (folder_path,)) > 0
+    
+    def snapshot(self):
+        """取得排程內容的副本"""
+        rows = self.store.query('SELECT folder_path, expires_at FROM cleanup_schedule')
+        return {row['folder_path']: row['expires_at'] for row in rows}
+    
+    def contains(self, folder_path):
+        """檢查資料夾是否已排程"""
+        return self.store.query_one(
+            'SELECT 1 FROM cleanup_schedule WHERE folder_path = ?', (folder_path,)
+        ) is not None
+    
+    def count(self):
+        """取得已排程的資料夾數量"""
+        return self.store.query_one('SELECT COUNT(*) AS count FROM cleanup_schedule')['count']
+    
+    def clear(self):
+        """取消所有排程"""
+        self.store.execute('DELETE FROM cleanup_schedule')
+    
+    def _claim_due(self, now):
+        """領取已到期的項目，領取後即從排程移除，其他程序不會重複清理"""
+        with self.store.transaction() as connection:
+            due = [
+                row['folder_path'] for row in connection.execute(
+                    'SELECT folder_path FROM cleanup_schedule WHERE expires_at <= ?', (now,)
+                )
+            ]
+            if due:
+                connection.execute('DELETE FROM cleanup_schedule WHERE expires_at <= ?', (now,))
+        return due
+    
+    def _next_expiry(self):
+        return self.store.query_one('SELECT MIN(expires_at) AS expires_at FROM cleanup_schedule')['expires_at']
+    
+    def _run(self):
+        while True:
+            try:
+                due = self._claim_due(time.time())
+                for folder_path in due:
+                    try:
+                        self.cleanup_callback(folder_path)
+                    except Exception as e:
+                        print(f"排程清理失敗 {folder_path}: {e}")
+                if due:
+                    continue
+                
+                next_expiry = self._next_expiry()
+                timeout = self.poll_interval
+                if next_expiry is not None:
+                    timeout = min(timeout, max(0.0, next_expiry - time.time()))
+            except sqlite3.Error as e:
+                print(f"讀取清理排程失敗: {e}")
+                timeout = self.poll_interval
+            
+            with self._condition:
+                self._condition.wait(timeout)
+
 
 class FileManager:
-    def __init__(self, temp_base_dir='temp', upload_dir='uploads', max_size_gb=10):
+    def __init__(self, temp_base_dir='temp', upload_dir='uploads', max_size_gb=10,
+                 reconcile_interval_seconds=300, store=None, background_tasks=True):
+        """
+        store 為多個服務程序共用的 StateStore，未提供時使用臨時資料夾中的 _state.db；
+        background_tasks 為 False 時不啟動清理與校正執行緒（例如只在主程序執行啟動清理）
+        """
         self.temp_base_dir = temp_base_dir
         self.upload_dir = upload_dir
         self.max_size_bytes = max_size_gb * 1024 * 1024 * 1024  # 轉換為 bytes
-        self.cleanup_tasks = {}
+        self.reconcile_interval_seconds = reconcile_interval_seconds
         
         # 確保目錄存在
         os.makedirs(self.temp_base_dir, exist_ok=True)
         os.makedirs(self.upload_dir, exist_ok=True)
+        
+        self.store = store or StateStore(os.path.join(self.temp_base_dir, '_state.db'))
+        self.store.ensure_schema(_FILE_MANAGER_SCHEMA)
+        
+        # 儲存用量以增量方式記錄各項目大小，定期以完整掃描校正
+        # 多個程序同時啟動時只有一個執行完整掃描
+        self.last_reconcile_time = None
+        if self.store.claim_interval('storage_reconcile', min(60, self.reconcile_interval_seconds)):
+            self.reconcile_storage()
+        
+        # 所有清理排程由背景執行緒處理
+        self.scheduler = CleanupScheduler(
+            self.cleanup_folder,
+            self.store,
+            legacy_index_path=os.path.join(self.temp_base_dir, '_cleanup_index.json')
+        )
+        if background_tasks:
+            self.scheduler.start()
+        
+        if background_tasks and self.reconcile_interval_seconds > 0:
+            reconcile_thread = threading.Thread(target=self._reconcile_loop, name='storage-reconcile', daemon=True)
+            reconcile_thread.start()
+    
+    @property
+    def cleanup_tasks(self):
+        """目前已排程清理的資料夾與到期時間（快照）"""
+        return self.scheduler.snapshot()
+    
+    def is_cleanup_scheduled(self, folder_path):
+        """檢查資料夾是否已排程清理"""
+        return self.scheduler.contains(folder_path)
+    
+    def scheduled_cleanup_count(self):
+        """取得已排程清理的資料夾數量"""
+        return self.scheduler.count()
+    
+    @staticmethod
+    def _measure_item(path):
+        """
+        計算單一項目的用量，硬連結的檔案依連結數分攤，避免快取與臨時資料夾重複計算
+        """
+        try:
+            if not os.path.isdir(path):
+                stat = os.stat(path)
+                return stat.st_size // max(1, stat.st_nlink)
+        except OSError:
+            return 0
+        
+        total_size = 0
+        for dirpath, dirnames, filenames in os.walk(path):
+            for filename in filenames:
+                try:
+                    stat = os.stat(os.path.join(dirpath, filename))
+                except OSError:
+                    continue
+                total_size += stat.st_size // max(1, stat.st_nlink)
+        return total_size
+    
+    def _set_item_size(self, item_path, size_bytes):
+        self.store.execute(
+            'INSERT INTO storage_items (item_path, size_bytes) VALUES (?, ?) '
+            'ON CONFLICT (item_path) DO UPDATE SET size_bytes = excluded.size_bytes',
+            (item_path, size_bytes)
+        )
+    
+    def record_bytes(self, folder_path, size_bytes):
+        """
+        記錄寫入資料夾的檔案大小
+        
+        Args:
+            folder_path (str): 臨時資料夾路徑
+            size_bytes (int): 新增的大小（bytes）
+        """
+        self.store.execute(
+            'INSERT INTO storage_items (item_path, size_bytes) VALUES (?, ?) '
+            'ON CONFLICT (item_path) DO UPDATE SET size_bytes = size_bytes + excluded.size_bytes',
+            (folder_path, size_bytes)
+        )
+    
+    def update_folder_size(self, folder_path):
+        """
+        重新計算單一資料夾的大小（只掃描該資料夾）
+        
+        Args:
+            folder_path (str): 資料夾路徑
+            
+        Returns:
+            int: 資料夾大小（bytes）
+        """
+        size_bytes = self._measure_item(folder_path)
+        self._set_item_size(folder_path, size_bytes)
+        return size_bytes
+    
+    def reconcile_storage(self):
+        """
+        完整掃描臨時資料夾，校正增量記錄的用量
+        
+        Returns:
+            int: 校正後的總用量（bytes）
+        """
+        item_sizes = {}
+        try:
+            for item in os.listdir(self.temp_base_dir):
+                item_path = os.path.join(self.temp_base_dir, item)
+                item_sizes[item_path] = self._measure_item(item_path)
+        except OSError:
+            pass
+        
+        with self.store.transaction() as connection:
+            connection.execute('DELETE FROM storage_items')
+            connection.executemany(
+                'INSERT INTO storage_items (item_path, size_bytes) VALUES (?, ?)', list(item_sizes.items())
+            )
+        self.last_reconcile_time = time.time()
+        return sum(item_sizes.values())
+    
+    def _reconcile_loop(self):
+        while True:
+            time.sleep(self.reconcile_interval_seconds)
+            try:
+                # 多個程序時由最先到期的程序執行，其他程序略過本輪
+                if self.store.claim_interval('storage_reconcile', self.reconcile_interval_seconds):
+                    self.reconcile_storage()
+            except Exception as e:
+                print(f"儲存用量校正失敗: {e}")
     
     def get_directory_size(self, directory):
         """
@@ -31,16 +318,41 @@ class FileManager:
             int: 目錄大小（bytes）
         """
         total_size = 0
+        seen_inodes = set()
         try:
             for dirpath, dirnames, filenames in os.walk(directory):
                 for filename in filenames:
                     filepath = os.path.join(dirpath, filename)
                     if os.path.exists(filepath):
-                        total_size += os.path.getsize(filepath)
+                        stat = os.stat(filepath)
+                        # 快取與臨時資料夾共用硬連結，同一個檔案只計算一次
+                        if stat.st_nlink > 1:
+                            inode = (stat.st_dev, stat.st_ino)
+                            if inode in seen_inodes:
+                                continue
+                            seen_inodes.add(inode)
+                        total_size += stat.st_size
         except (OSError, IOError):
             pass
         return total_size
     
+    def get_file_etag(self, file_path):
+        """
+        取得下載用的強 ETag：寫入時記錄的內容 SHA-256，下載時不讀取檔案內容
+        沒有記錄的檔案（例如舊版本產生的資料夾）改用大小與修改時間
+        
+        Args:
+            file_path (str): 檔案路徑
+            
+        Returns:
+            str: ETag
+        """
+        etag = read_etag(file_path)
+        if etag is not None:
+            return etag
+        stat = os.stat(file_path)
+        return f"{stat.st_size:x}-{stat.st_mtime_ns:x}"
+    
     def get_total_temp_size(self):
         """
         取得所有臨時檔案的總大小
@@ -48,7 +360,8 @@ class FileManager:
         Returns:
             tuple: (size_bytes: int, size_gb: float)
         """
-        size_bytes = self.get_directory_size(self.temp_base_dir)
+        # 總用量由觸發器在修改 storage_items 的同一個交易中更新，不需加總所有項目
+        size_bytes = self.store.query_one('SELECT size_bytes FROM storage_total WHERE id = 0')['size_bytes']
         size_gb = size_bytes / (1024 * 1024 * 1024)
         return size_bytes, size_gb
     
@@ -71,11 +384,69 @@ class FileManager:
             tuple: (folder_name: str, folder_path: str)
         """
         timestamp = int(time.time() * 1000)
-        folder_name = f"temp_{timestamp}"
+        # 加上隨機後綴，避免同一毫秒內的並行請求共用資料夾
+        folder_name = f"temp_{timestamp}_{uuid.uuid4().hex[:8]}"
         folder_path = os.path.join(self.temp_base_dir, folder_name)
-        os.makedirs(folder_path, exist_ok=True)
+        os.makedirs(folder_path)
+        self._set_item_size(folder_path, 0)
         return folder_name, folder_path
     
+    def save_upload(self, file_storage, destination, chunk_size=1024 * 1024):
+        """
+        分段寫入上傳檔案，同時計算 SHA-256
+
+        Args:
+            file_storage: Werkzeug FileStorage 物件
+            destination (str): 目標檔案路徑
+            chunk_size (int): 每次讀取的大小（bytes）
+
+        Returns:
+            tuple: (size_bytes: int, sha256: str)
+        """
+        return self.save_stream(file_storage.stream, destination, chunk_size)
+    
+    def save_stream(self, stream, destination, chunk_size=1024 * 1024, max_bytes=None):
+        """
+        分段寫入檔案串流（例如 ZIP 中的項目），同時計算 SHA-256
+        依實際寫入的 bytes 檢查上限，不信任 ZIP 標頭中宣告的大小
+
+        Args:
+            stream: 可分段讀取的串流
+            destination (str): 目標檔案路徑
+            chunk_size (int): 每次讀取的大小（bytes）
+            max_bytes (int | None): 單一檔案的大小上限，None 表示不限制
+
+        Returns:
+            tuple: (size_bytes: int, sha256: str)
+
+        Raises:
+            UploadRejected: 超過 max_bytes（413）或儲存空間不足（507）
+        """
+        folder_path = os.path.dirname(destination)
+        digest = hashlib.sha256()
+        size_bytes = 0
+        unrecorded_bytes = 0
+        with open(destination, 'wb') as output:
+            while True:
+                chunk = stream.read(chunk_size)
+                if not chunk:
+                    break
+                size_bytes += len(chunk)
+                if max_bytes is not None and size_bytes > max_bytes:
+                    raise UploadRejected(413, f'檔案超過大小限制 {max_bytes / (1024 * 1024):.1f}MB')
+                digest.update(chunk)
+                output.write(chunk)
+                unrecorded_bytes += len(chunk)
+                
+                if unrecorded_bytes >= RECORD_INTERVAL_BYTES:
+                    self.record_bytes(folder_path, unrecorded_bytes)
+                    unrecorded_bytes = 0
+                    available, current_size_gb, max_size_gb = self.is_storage_available()
+                    if not available:
+                        raise UploadRejected(507, f'儲存空間不足，目前使用 {current_size_gb:.2f}GB，超過限制 {max_size_gb:.2f}GB')
+        self.record_bytes(folder_path, unrecorded_bytes)
+        return size_bytes, digest.hexdigest()
+    
     def cleanup_folder(self, folder_path):
         """
         清理指定的資料夾
@@ -90,15 +461,14 @@ class FileManager:
             if os.path.exists(folder_path):
                 shutil.rmtree(folder_path)
                 print(f"已清理資料夾: {folder_path}")
-                
-                # 從清理任務列表中移除
-                if folder_path in self.cleanup_tasks:
-                    del self.cleanup_tasks[folder_path]
-                
                 return True
         except Exception as e:
             print(f"清理資料夾失敗 {folder_path}: {e}")
             return False
+        finally:
+            # 從清理排程與儲存用量中移除（資料夾已被移走時也一樣）
+            self.store.execute('DELETE FROM storage_items WHERE item_path = ?', (folder_path,))
+            self.scheduler.cancel(folder_path)
         
         return False
     
@@ -110,21 +480,57 @@ class FileManager:
             folder_path (str): 要清理的資料夾路徑
             delay_minutes (int): 延遲清理時間（分鐘）
         """
-        def cleanup_task():
-            time.sleep(delay_minutes * 60)
-            self.cleanup_folder(folder_path)
+        self.scheduler.schedule(folder_path, time.time() + delay_minutes * 60)
+        print(f"已安排 {delay_minutes} 分鐘後清理: {folder_path}")
+    
+    def cancel_cleanup(self, folder_path):
+        """
+        取消資料夾的清理排程
         
-        # 取消現有的清理任務（如果有）
-        if folder_path in self.cleanup_tasks:
-            self.cleanup_tasks[folder_path].cancel()
+        Args:
+            folder_path (str): 資料夾路徑
+            
+        Returns:
+            bool: 是否有被取消的排程
+        """
+        return self.scheduler.cancel(folder_path)
+    
+    def cleanup_unscheduled_folders(self):
+        """
+        清理沒有清理排程的臨時資料夾（服務中斷時遺留的資料夾）
+        已排程的資料夾保留至原本的到期時間，已到期者由排程執行緒立即清理
         
-        # 建立新的清理任務
-        cleanup_thread = threading.Timer(delay_minutes * 60, cleanup_task)
-        cleanup_thread.daemon = True
-        cleanup_thread.start()
+        Returns:
+            dict: 清理結果，格式與 cleanup_all_temp_files 相同
+        """
+        result = {
+            'success': False,
+            'cleaned_folders': [],
+            'failed_folders': [],
+            'total_freed_bytes': 0,
+            'error': None
+        }
         
-        self.cleanup_tasks[folder_path] = cleanup_thread
-        print(f"已安排 {delay_minutes} 分鐘後清理: {folder_path}")
+        try:
+            scheduled = set(self.cleanup_tasks)
+            if os.path.exists(self.temp_base_dir):
+                for item in os.listdir(self.temp_base_dir):
+                    item_path = os.path.join(self.temp_base_dir, item)
+                    if item.startswith('_') or item_path in scheduled:
+                        continue
+                    if os.path.isdir(item_path):
+                        folder_size = self.get_directory_size(item_path)
+                        if self.cleanup_folder(item_path):
+                            result['cleaned_folders'].append(item)
+                            result['total_freed_bytes'] += folder_size
+                        else:
+                            result['failed_folders'].append(item)
+            result['success'] = True
+            
+        except Exception as e:
+            result['error'] = str(e)
+        
+        return result
     
     def cleanup_all_temp_files(self):
         """
@@ -142,19 +548,19 @@ class FileManager:
         }
         
         try:
-            # 取消所有清理任務
-            for task in self.cleanup_tasks.values():
-                if hasattr(task, 'cancel'):
-                    task.cancel()
-            self.cleanup_tasks.clear()
+            # 取消所有清理排程
+            self.scheduler.clear()
             
             # 記錄清理前的大小
-            before_size = self.get_directory_size(self.temp_base_dir)
+            before_size = self.reconcile_storage()
             
             # 清理所有臨時資料夾
             if os.path.exists(self.temp_base_dir):
                 for item in os.listdir(self.temp_base_dir):
                     item_path = os.path.join(self.temp_base_dir, item)
+                    # 底線開頭的資料夾（例如轉換快取）由各自的模組管理
+                    if item.startswith('_'):
+                        continue
                     if os.path.isdir(item_path):
                         if self.cleanup_folder(item_path):
                             result['cleaned_folders'].append(item)
@@ -162,7 +568,7 @@ class FileManager:
                             result['failed_folders'].append(item)
             
             # 計算釋放的空間
-            after_size = self.get_directory_size(self.temp_base_dir)
+            after_size = self.reconcile_storage()
             result['total_freed_bytes'] = before_size - after_size
             result['success'] = True
             
@@ -193,6 +599,8 @@ class FileManager:
             if os.path.exists(self.temp_base_dir):
                 for item in os.listdir(self.temp_base_dir):
                     item_path = os.path.join(self.temp_base_dir, item)
+                    if item.startswith('_'):
+                        continue
                     if os.path.isdir(item_path):
                         # 檢查資料夾建立時間
                         folder_time = datetime.fromtimestamp(os.path.getctime(item_path))
@@ -218,8 +626,8 @@ class FileManager:
         available, current_size, max_size = self.is_storage_available()
         
         return {
-            'temp_folders_count': len(self.cleanup_tasks),
-            'scheduled_cleanups': len(self.cleanup_tasks),
+            'temp_folders_count': self.scheduled_cleanup_count(),
+            'scheduled_cleanups': self.scheduled_cleanup_count(),
             'total_size_bytes': size_bytes,
             'total_size_gb': round(size_gb, 2),
             'max_size_gb': round(max_size, 2),
@@ -0,0 +1,110 @@
+"""
+簡報檢查模組
+在轉換前快速取得投影片數量、隱藏投影片、頁面尺寸與媒體大小，結果以檔案 SHA-256 快取
+快取存放在共用資料庫中，任一服務程序檢查過的檔案其他程序都能直接取得
+"""
+import json
+import threading
+import time
+
+from .pptx_package import read_manifest
+from .state_store import StateStore
+
+_INSPECT_SCHEMA = """
+CREATE TABLE IF NOT EXISTS inspect_results (
+    file_hash TEXT PRIMARY KEY,
+    manifest TEXT NOT NULL,
+    last_access REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS inspect_results_last_access ON inspect_results (last_access);
+"""
+
+
+class PresentationInspector:
+    def __init__(self, max_entries=1024, store=None):
+        """
+        store 為多個服務程序共用的 StateStore，未提供時使用只屬於本程序的記憶體資料庫；
+        命中次數為本程序的統計
+        """
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self.store = store or StateStore(':memory:')
+        self.store.ensure_schema(_INSPECT_SCHEMA)
+
+    def get(self, file_hash):
+        """
+        查詢已快取的檢查結果
+
+        Args:
+            file_hash (str): 檔案 SHA-256
+
+        Returns:
+            dict | None: 檢查結果，未快取時回傳 None
+        """
+        row = self.store.query_one('SELECT manifest FROM inspect_results WHERE file_hash = ?', (file_hash,))
+        with self._lock:
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        self.store.execute(
+            'UPDATE inspect_results SET last_access = ? WHERE file_hash = ?', (time.time(), file_hash)
+        )
+        return json.loads(row['manifest'])
+
+    def inspect(self, source, file_hash):
+        """
+        檢查簡報，相同檔案直接回傳快取結果
+
+        Args:
+            source (str | file): PPTX 路徑或可 seek 的檔案物件
+            file_hash (str): 檔案 SHA-256
+
+        Returns:
+            tuple: (manifest: dict, cache_hit: bool)
+
+        Raises:
+            zipfile.BadZipFile: 檔案不是有效的 PPTX
+            KeyError: 缺少必要的部件
+            ValueError: XML 內容無法解析
+        """
+        manifest = self.get(file_hash)
+        if manifest is not None:
+            return manifest, True
+
+        start = time.time()
+        manifest = read_manifest(source)
+        manifest['file_sha256'] = file_hash
+        manifest['inspect_ms'] = round((time.time() - start) * 1000, 2)
+
+        with self.store.transaction() as connection:
+            connection.execute(
+                'INSERT INTO inspect_results (file_hash, manifest, last_access) VALUES (?, ?, ?) '
+                'ON CONFLICT (file_hash) DO UPDATE SET manifest = excluded.manifest, last_access = excluded.last_access',
+                (file_hash, json.dumps(manifest), time.time())
+            )
+            # 超過上限時移除最久未使用的結果
+            connection.execute(
+                'DELETE FROM inspect_results WHERE file_hash IN ('
+                'SELECT file_hash FROM inspect_results ORDER BY last_access DESC LIMIT -1 OFFSET ?)',
+                (self.max_entries,)
+            )
+        return manifest, False
+
+    def get_stats(self):
+        """
+        取得快取統計
+
+        Returns:
+            dict: 統計資訊
+        """
+        entries = self.store.query_one('SELECT COUNT(*) AS count FROM inspect_results')['count']
+        with self._lock:
+            return {
+                'entries': entries,
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses
+            }
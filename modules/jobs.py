@@ -0,0 +1,267 @@
+"""
+非同步轉換工作模組
+以有限數量的工作執行緒執行轉換，提供工作狀態查詢與等待完成
+工作狀態與進度事件保存在共用資料庫中，任一服務程序都能查詢其他程序執行的工作
+"""
+import json
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from .state_store import StateStore, is_process_alive
+
+_JOBS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    owner_pid INTEGER,
+    timings TEXT NOT NULL DEFAULT '{}',
+    result TEXT,
+    error TEXT,
+    metadata TEXT NOT NULL DEFAULT '{}'
+);
+CREATE INDEX IF NOT EXISTS jobs_finished_at ON jobs (finished_at);
+CREATE TABLE IF NOT EXISTS job_events (
+    job_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    event TEXT NOT NULL,
+    PRIMARY KEY (job_id, seq)
+);
+"""
+
+
+class JobManager:
+    STATUS_QUEUED = 'queued'
+    STATUS_RUNNING = 'running'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+
+    def __init__(self, max_workers=2, retention_minutes=20, store=None, poll_interval=0.25):
+        """
+        store 為多個服務程序共用的 StateStore，未提供時使用只屬於本程序的記憶體資料庫；
+        poll_interval 為等待其他程序執行的工作時查詢資料庫的間隔
+        """
+        self.max_workers = max_workers
+        self.retention_seconds = retention_minutes * 60
+        self.poll_interval = poll_interval
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='conversion-job')
+        self.store = store or StateStore(':memory:')
+        self.store.ensure_schema(_JOBS_SCHEMA)
+        # 本程序內的狀態變更直接喚醒等待者，其他程序的變更以輪詢發現
+        self._condition = threading.Condition()
+        self._recover_orphaned_jobs()
+
+    @staticmethod
+    def _append_event(connection, job_id, event):
+        connection.execute(
+            'INSERT INTO job_events (job_id, seq, event) '
+            'SELECT ?, COALESCE(MAX(seq) + 1, 0), ? FROM job_events WHERE job_id = ?',
+            (job_id, json.dumps(event), job_id)
+        )
+
+    def _notify(self):
+        with self._condition:
+            self._condition.notify_all()
+
+    def _recover_orphaned_jobs(self):
+        """將執行中程序已結束的未完成工作標記為失敗，等待中的客戶端不會無限等待"""
+        rows = self.store.query(
+            'SELECT id, owner_pid FROM jobs WHERE status IN (?, ?)', (self.STATUS_QUEUED, self.STATUS_RUNNING)
+        )
+        for row in rows:
+            if is_process_alive(row['owner_pid']):
+                continue
+            self._finish(row['id'], None, self.STATUS_FAILED, '處理此工作的服務程序已結束')
+
+    def _prune(self):
+        """移除超過保留時間的已完成工作（結果檔案此時也已被清理）"""
+        cutoff = time.time() - self.retention_seconds
+        with self.store.transaction() as connection:
+            connection.execute(
+                'DELETE FROM job_events WHERE job_id IN (SELECT id FROM jobs WHERE finished_at < ?)', (cutoff,)
+            )
+            connection.execute('DELETE FROM jobs WHERE finished_at < ?', (cutoff,))
+
+    def submit(self, task, **metadata):
+        """
+        提交轉換工作
+
+        Args:
+            task (callable): 接收工作字典並回傳結果字典的函數，失敗時拋出例外
+            **metadata: 附加在工作狀態中的資訊（例如 temp_folder），需可轉為 JSON
+
+        Returns:
+            str: 工作 ID
+        """
+        job_id = uuid.uuid4().hex
+        self._prune()
+        with self.store.transaction() as connection:
+            connection.execute(
+                'INSERT INTO jobs (id, status, created_at, owner_pid, metadata) VALUES (?, ?, ?, ?, ?)',
+                (job_id, self.STATUS_QUEUED, time.time(), os.getpid(), json.dumps(metadata))
+            )
+            self._append_event(connection, job_id, {'type': 'status', 'status': self.STATUS_QUEUED})
+        self.executor.submit(self._run, job_id, task)
+        return job_id
+
+    def _run(self, job_id, task):
+        started_at = time.time()
+        with self.store.transaction() as connection:
+            row = connection.execute('SELECT created_at FROM jobs WHERE id = ?', (job_id,)).fetchone()
+            timings = {'queue_wait': round(started_at - row['created_at'], 3)}
+            connection.execute(
+                'UPDATE jobs SET status = ?, started_at = ?, timings = ? WHERE id = ?',
+                (self.STATUS_RUNNING, started_at, json.dumps(timings), job_id)
+            )
+            self._append_event(connection, job_id, {'type': 'status', 'status': self.STATUS_RUNNING})
+        self._notify()
+
+        try:
+            result = task(self.get(job_id))
+            status, error = self.STATUS_DONE, None
+        except Exception as e:
+            result, status, error = None, self.STATUS_FAILED, str(e)
+
+        self._finish(job_id, result, status, error)
+
+    def _finish(self, job_id, result, status, error):
+        finished_at = time.time()
+        with self.store.transaction() as connection:
+            row = connection.execute('SELECT created_at, timings FROM jobs WHERE id = ?', (job_id,)).fetchone()
+            if row is None:
+                return
+            timings = json.loads(row['timings'])
+            if result and isinstance(result.get('timings'), dict):
+                timings.update(result['timings'])
+            timings['total'] = round(finished_at - row['created_at'], 3)
+            connection.execute(
+                'UPDATE jobs SET status = ?, finished_at = ?, timings = ?, result = ?, error = ? WHERE id = ?',
+                (status, finished_at, json.dumps(timings), json.dumps(result), error, job_id)
+            )
+            self._append_event(connection, job_id, {
+                'type': 'status',
+                'status': status,
+                'timings': timings,
+                'result': result,
+                'error': error
+            })
+        self._notify()
+
+    def publish(self, job_id, event):
+        """
+        記錄工作進度事件並通知等待中的訂閱者
+
+        Args:
+            job_id (str): 工作 ID
+            event (dict): 事件內容，需包含 type
+        """
+        with self.store.transaction() as connection:
+            if connection.execute('SELECT 1 FROM jobs WHERE id = ?', (job_id,)).fetchone() is None:
+                return
+            self._append_event(connection, job_id, event)
+        self._notify()
+
+    def _wait_for_change(self, deadline):
+        """等待本程序的通知或下一次輪詢，已逾時回傳 False"""
+        remaining = deadline - time.time()
+        if remaining <= 0:
+            return False
+        with self._condition:
+            self._condition.wait(min(remaining, self.poll_interval))
+        return True
+
+    def wait_events(self, job_id, cursor, timeout):
+        """
+        等待新的進度事件
+
+        Args:
+            job_id (str): 工作 ID
+            cursor (int): 已接收的事件數量
+            timeout (float): 沒有新事件時最長等待秒數
+
+        Returns:
+            tuple | None: (新事件清單, 工作是否已結束)，工作不存在時回傳 None
+        """
+        deadline = time.time() + timeout
+        while True:
+            job = self.store.query_one('SELECT status FROM jobs WHERE id = ?', (job_id,))
+            if job is None:
+                return None
+            # 先讀取狀態再讀取事件，結束事件與狀態在同一個交易中寫入
+            finished = job['status'] in (self.STATUS_DONE, self.STATUS_FAILED)
+            events = [
+                json.loads(row['event']) for row in self.store.query(
+                    'SELECT event FROM job_events WHERE job_id = ? AND seq >= ? ORDER BY seq', (job_id, cursor)
+                )
+            ]
+            if events or finished:
+                return events, finished
+            if not self._wait_for_change(deadline):
+                return [], False
+
+    def get(self, job_id):
+        """
+        取得工作狀態
+
+        Args:
+            job_id (str): 工作 ID
+
+        Returns:
+            dict | None: 工作狀態副本，不存在時回傳 None
+        """
+        row = self.store.query_one('SELECT * FROM jobs WHERE id = ?', (job_id,))
+        if row is None:
+            return None
+        return {
+            'id': row['id'],
+            'status': row['status'],
+            'created_at': row['created_at'],
+            'started_at': row['started_at'],
+            'finished_at': row['finished_at'],
+            'timings': json.loads(row['timings']),
+            'result': json.loads(row['result']) if row['result'] is not None else None,
+            'error': row['error'],
+            **json.loads(row['metadata'])
+        }
+
+    def wait(self, job_id, timeout):
+        """
+        等待工作完成或逾時
+
+        Args:
+            job_id (str): 工作 ID
+            timeout (float): 最長等待秒數
+
+        Returns:
+            dict | None: 工作狀態副本
+        """
+        deadline = time.time() + timeout
+        while True:
+            job = self.store.query_one('SELECT status FROM jobs WHERE id = ?', (job_id,))
+            if job is None or job['status'] in (self.STATUS_DONE, self.STATUS_FAILED):
+                break
+            if not self._wait_for_change(deadline):
+                break
+        return self.get(job_id)
+
+    def get_status(self):
+        """
+        取得工作池狀態
+
+        Returns:
+            dict: 各狀態的工作數量（所有程序），max_workers 為本程序的工作執行緒數
+        """
+        counts = {
+            self.STATUS_QUEUED: 0,
+            self.STATUS_RUNNING: 0,
+            self.STATUS_DONE: 0,
+            self.STATUS_FAILED: 0
+        }
+        for row in self.store.query('SELECT status, COUNT(*) AS count FROM jobs GROUP BY status'):
+            counts[row['status']] = row['count']
+        return {'max_workers': self.max_workers, **counts}
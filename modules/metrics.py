@@ -0,0 +1,390 @@
+"""
+監控指標模組
+以 Prometheus 文字格式提供計數器、量測值與直方圖，不依賴額外套件
+多程序部署時計數器與直方圖定期寫入共用資料庫，任一程序回應的都是所有程序的合計
+"""
+import bisect
+import json
+import os
+import threading
+import time
+
+from .state_store import is_process_alive
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# 轉換各階段的秒數分布：從數十毫秒的快取命中到數分鐘的大型簡報
+DURATION_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+# 上傳與輸出大小的分布（bytes）
+SIZE_BUCKETS = (
+    64 * 1024, 256 * 1024, 1024 * 1024, 4 * 1024 * 1024, 16 * 1024 * 1024,
+    64 * 1024 * 1024, 256 * 1024 * 1024
+)
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+def _escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names, values, extra=None):
+    pairs = list(zip(names, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape_label(value)}"' for name, value in pairs) + '}'
+
+
+_METRICS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS metric_values (
+    name TEXT NOT NULL,
+    labels TEXT NOT NULL,
+    field TEXT NOT NULL,
+    value REAL NOT NULL,
+    PRIMARY KEY (name, labels, field)
+);
+CREATE TABLE IF NOT EXISTS metric_gauges (
+    pid INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    labels TEXT NOT NULL,
+    value REAL NOT NULL,
+    PRIMARY KEY (pid, name, labels)
+);
+"""
+
+
+class _Metric:
+    kind = 'untyped'
+
+    def __init__(self, name, description, label_names=()):
+        self.name = name
+        self.description = description
+        self.label_names = tuple(label_names)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        if set(labels) != set(self.label_names):
+            raise ValueError(f"{self.name} 的標籤必須是 {self.label_names}: {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.label_names)
+
+    def _snapshot(self):
+        with self._lock:
+            return dict(self._values)
+
+    def _drain(self):
+        """取出並清空本程序累積的數值（寫入共用資料庫前）"""
+        with self._lock:
+            values, self._values = self._values, {}
+        return values
+
+    def _restore(self, values):
+        """寫入共用資料庫失敗時放回取出的數值"""
+        for key, value in values.items():
+            fields = self._to_fields(value)
+            with self._lock:
+                current = self._values.get(key)
+                if current is not None:
+                    for field, amount in self._to_fields(current).items():
+                        fields[field] = fields.get(field, 0) + amount
+                self._values[key] = self._from_fields(fields)
+
+    def _to_fields(self, value):
+        return {'value': value}
+
+    def _from_fields(self, fields):
+        return fields.get('value', 0)
+
+    def _samples(self, values):
+        """回傳 (名稱後綴, 標籤值, 額外標籤, 數值) 的清單"""
+        return [('', key, None, value) for key, value in values.items()]
+
+    def render(self, values=None, label_names=None):
+        """
+        輸出這個指標的文字格式
+
+        Args:
+            values (dict): 要輸出的數值，未提供時使用本程序的數值
+            label_names (tuple): 標籤名稱，未提供時使用指標的標籤
+        """
+        if values is None:
+            values = self._snapshot()
+        label_names = label_names or self.label_names
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} {self.kind}"]
+        for suffix, key, extra, value in self._samples(values):
+            lines.append(
+                f"{self.name}{suffix}{_format_labels(label_names, key, extra)} {_format_value(value)}"
+            )
+        return lines
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        """
+        增加計數
+
+        Args:
+            amount (float): 增加量，不可為負數
+            **labels: 標籤值
+        """
+        if amount < 0:
+            raise ValueError(f"{self.name} 只能增加")
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    kind = 'gauge'
+
+    def __init__(self, name, description, label_names=(), per_process=False):
+        """
+        per_process 為 True 時數值只描述本程序（例如轉換佇列），多程序部署時以 pid 標籤輸出每個程序的數值；
+        否則由抓取時的收集函數從共用狀態讀取，任一程序的數值都相同
+        """
+        super().__init__(name, description, label_names)
+        self.per_process = per_process
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, description, label_names=(), buckets=DURATION_BUCKETS):
+        super().__init__(name, description, label_names)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        """
+        記錄一筆觀測值
+
+        Args:
+            value (float): 觀測值（秒數或 bytes）
+            **labels: 標籤值
+        """
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = {'counts': [0] * (len(self.buckets) + 1), 'sum': 0.0, 'count': 0}
+            entry['counts'][index] += 1
+            entry['sum'] += value
+            entry['count'] += 1
+
+    def _snapshot(self):
+        with self._lock:
+            return {
+                key: {'counts': list(entry['counts']), 'sum': entry['sum'], 'count': entry['count']}
+                for key, entry in self._values.items()
+            }
+
+    def _to_fields(self, value):
+        fields = {f'bucket:{index}': count for index, count in enumerate(value['counts'])}
+        fields['sum'] = value['sum']
+        fields['count'] = value['count']
+        return fields
+
+    def _from_fields(self, fields):
+        return {
+            'counts': [int(fields.get(f'bucket:{index}', 0)) for index in range(len(self.buckets) + 1)],
+            'sum': fields.get('sum', 0.0),
+            'count': int(fields.get('count', 0))
+        }
+
+    def _samples(self, values):
+        samples = []
+        for key, entry in values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), entry['counts']):
+                cumulative += count
+                samples.append(('_bucket', key, ('le', _format_value(float(bound))), cumulative))
+            samples.append(('_sum', key, None, entry['sum']))
+            samples.append(('_count', key, None, entry['count']))
+        return samples
+
+
+class MetricsRegistry:
+    def __init__(self, namespace='pptx', store=None, flush_interval=5.0):
+        """
+        store 為多個服務程序共用的 StateStore：計數器與直方圖先累積在記憶體中，
+        每 flush_interval 秒與每次抓取時寫入資料庫，輸出所有程序的合計；未提供時只輸出本程序的數值
+        """
+        self.namespace = namespace
+        self.metrics = {}
+        self.collectors = []
+        self.store = store
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        if store is not None:
+            store.ensure_schema(_METRICS_SCHEMA)
+            threading.Thread(target=self._flush_loop, name='metrics-flush', daemon=True).start()
+
+    def _register(self, metric_class, name, description, label_names=(), **kwargs):
+        full_name = f"{self.namespace}_{name}"
+        with self._lock:
+            metric = self.metrics.get(full_name)
+            if metric is None:
+                metric = self.metrics[full_name] = metric_class(full_name, description, label_names, **kwargs)
+            elif not isinstance(metric, metric_class):
+                raise ValueError(f"指標名稱已被其他類型使用: {full_name}")
+            return metric
+
+    def counter(self, name, description, label_names=()):
+        """取得或建立計數器"""
+        return self._register(Counter, name, description, label_names)
+
+    def gauge(self, name, description, label_names=(), per_process=False):
+        """取得或建立量測值"""
+        return self._register(Gauge, name, description, label_names, per_process=per_process)
+
+    def histogram(self, name, description, label_names=(), buckets=DURATION_BUCKETS):
+        """取得或建立直方圖"""
+        return self._register(Histogram, name, description, label_names, buckets=buckets)
+
+    def add_collector(self, collector):
+        """
+        加入抓取時執行的函數，用於從其他組件讀取目前狀態（例如佇列長度、快取命中數）
+
+        Args:
+            collector (callable): 接收 MetricsRegistry 的函數
+        """
+        self.collectors.append(collector)
+
+    def _collect(self):
+        for collector in self.collectors:
+            try:
+                collector(self)
+            except Exception as e:
+                print(f"收集監控指標失敗: {e}")
+
+    def flush(self, collect=True):
+        """
+        將本程序累積的計數器、直方圖與程序層級的量測值寫入共用資料庫
+        未設定 store 時不做任何事
+
+        Args:
+            collect (bool): 是否先執行收集函數更新量測值
+        """
+        if self.store is None:
+            return
+        if collect:
+            self._collect()
+        with self._lock:
+            metrics = list(self.metrics.values())
+        drained = [(metric, metric._drain()) for metric in metrics if not isinstance(metric, Gauge)]
+        gauges = [
+            (metric, metric._snapshot()) for metric in metrics if isinstance(metric, Gauge) and metric.per_process
+        ]
+        pid = os.getpid()
+        try:
+            with self.store.transaction() as connection:
+                for metric, values in drained:
+                    for key, value in values.items():
+                        labels = json.dumps(key)
+                        for field, amount in metric._to_fields(value).items():
+                            if not amount:
+                                continue
+                            connection.execute(
+                                'INSERT INTO metric_values (name, labels, field, value) VALUES (?, ?, ?, ?) '
+                                'ON CONFLICT (name, labels, field) DO UPDATE SET value = value + excluded.value',
+                                (metric.name, labels, field, amount)
+                            )
+                for metric, values in gauges:
+                    for key, value in values.items():
+                        connection.execute(
+                            'INSERT INTO metric_gauges (pid, name, labels, value) VALUES (?, ?, ?, ?) '
+                            'ON CONFLICT (pid, name, labels) DO UPDATE SET value = excluded.value',
+                            (pid, metric.name, json.dumps(key), value)
+                        )
+        except Exception:
+            for metric, values in drained:
+                metric._restore(values)
+            raise
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"寫入監控指標失敗: {e}")
+
+    def _load_shared(self):
+        """讀取所有程序的合計，回傳 {指標名稱: 數值} 與 {指標名稱: 各程序的量測值}"""
+        fields = {}
+        for row in self.store.query('SELECT name, labels, field, value FROM metric_values'):
+            key = tuple(json.loads(row['labels']))
+            fields.setdefault(row['name'], {}).setdefault(key, {})[row['field']] = row['value']
+
+        # 已結束的程序不再輸出量測值
+        for row in self.store.query('SELECT DISTINCT pid FROM metric_gauges'):
+            if not is_process_alive(row['pid']):
+                self.store.execute('DELETE FROM metric_gauges WHERE pid = ?', (row['pid'],))
+        gauges = {}
+        for row in self.store.query('SELECT pid, name, labels, value FROM metric_gauges'):
+            key = tuple(json.loads(row['labels'])) + (str(row['pid']),)
+            gauges.setdefault(row['name'], {})[key] = row['value']
+        return fields, gauges
+
+    def render(self):
+        """
+        輸出 Prometheus 文字格式
+
+        Returns:
+            str: 所有指標
+        """
+        self._collect()
+        shared_fields, shared_gauges = {}, {}
+        if self.store is not None:
+            self.flush(collect=False)
+            shared_fields, shared_gauges = self._load_shared()
+
+        with self._lock:
+            metrics = sorted(self.metrics.values(), key=lambda metric: metric.name)
+        lines = []
+        for metric in metrics:
+            if self.store is None:
+                lines.extend(metric.render())
+            elif isinstance(metric, Gauge):
+                if metric.per_process:
+                    lines.extend(metric.render(
+                        shared_gauges.get(metric.name, {}), label_names=metric.label_names + ('pid',)
+                    ))
+                else:
+                    lines.extend(metric.render())
+            else:
+                values = {
+                    key: metric._from_fields(fields)
+                    for key, fields in shared_fields.get(metric.name, {}).items()
+                }
+                lines.extend(metric.render(values))
+        return '\n'.join(lines) + '\n'
+
+
+
+def reset_shared_metrics(store):
+    """
+    清除共用資料庫中的監控數值，服務重新啟動時計數從零開始
+
+    Args:
+        store: StateStore 實例
+    """
+    store.ensure_schema(_METRICS_SCHEMA)
+    with store.transaction() as connection:
+        connection.execute('DELETE FROM metric_values')
+        connection.execute('DELETE FROM metric_gauges')
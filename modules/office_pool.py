@@ -0,0 +1,493 @@
+"""
+LibreOffice 常駐程序池模組
+維護多個長時間運行的無頭 LibreOffice 實例，透過 UNO 管道接收轉換請求
+"""
+import os
+import queue
+import shutil
+import subprocess
+import threading
+import time
+
+from .state_store import is_process_alive
+
+try:
+    import uno
+    from com.sun.star.beans import PropertyValue
+    UNO_AVAILABLE = True
+except ImportError:
+    UNO_AVAILABLE = False
+
+
+def _make_properties(**kwargs):
+    """建立 UNO PropertyValue 序列"""
+    properties = []
+    for name, value in kwargs.items():
+        prop = PropertyValue()
+        prop.Name = name
+        prop.Value = value
+        properties.append(prop)
+    return tuple(properties)
+
+
+def profile_url(profile_dir):
+    """
+    將設定檔目錄轉換為 -env:UserInstallation 使用的 file URL
+
+    Args:
+        profile_dir (str): 設定檔目錄路徑
+
+    Returns:
+        str: file URL
+    """
+    path = os.path.abspath(profile_dir).replace('\\', '/')
+    if not path.startswith('/'):
+        path = '/' + path
+    return f"file://{path}"
+
+
+class ProfilePool:
+    """
+    預先初始化的 LibreOffice 使用者設定檔池
+    每次單次執行的轉換借用一個獨立設定檔，避免共用預設設定檔時互相鎖定
+    """
+
+    def __init__(self, libreoffice_exec, profile_root, size):
+        self.libreoffice_exec = libreoffice_exec
+        self.profile_root = profile_root
+        self.size = max(1, size)
+        self.available = queue.Queue()
+        self._initialized = set()
+        self._init_lock = threading.Lock()
+
+        for index in range(self.size):
+            self.available.put(os.path.join(self.profile_root, f"oneshot_{index}"))
+
+    def _is_initialized(self, profile_dir):
+        return os.path.exists(os.path.join(profile_dir, 'user', 'registrymodifications.xcu'))
+
+    def _initialize_profile(self, profile_dir):
+        """以 --terminate_after_init 建立設定檔內容，之後的轉換可直接沿用"""
+        if profile_dir in self._initialized:
+            return
+        if not self._is_initialized(profile_dir):
+            os.makedirs(profile_dir, exist_ok=True)
+            try:
+                subprocess.run(
+                    [
+                        self.libreoffice_exec,
+                        "--headless",
+                        "--invisible",
+                        "--norestore",
+                        "--terminate_after_init",
+                        f"-env:UserInstallation={profile_url(profile_dir)}"
+                    ],
+                    stdin=subprocess.DEVNULL,
+                    stdout=subprocess.DEVNULL,
+                    stderr=subprocess.DEVNULL,
+                    timeout=120
+                )
+            except Exception as e:
+                print(f"LibreOffice 設定檔初始化失敗 {profile_dir}: {e}")
+                return
+        with self._init_lock:
+            self._initialized.add(profile_dir)
+
+    def initialize(self):
+        """平行初始化所有設定檔"""
+        os.makedirs(self.profile_root, exist_ok=True)
+        profiles = [os.path.join(self.profile_root, f"oneshot_{index}") for index in range(self.size)]
+        threads = [threading.Thread(target=self._initialize_profile, args=(path,)) for path in profiles]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    def acquire(self, timeout=None):
+        """
+        借用一個設定檔，所有設定檔都在使用中時等待
+
+        Args:
+            timeout (float): 最長等待秒數
+
+        Returns:
+            str | None: 設定檔目錄，逾時回傳 None
+        """
+        try:
+            profile_dir = self.available.get(timeout=timeout)
+        except queue.Empty:
+            return None
+        self._initialize_profile(profile_dir)
+        return profile_dir
+
+    def release(self, profile_dir, failed=False):
+        """
+        歸還設定檔
+
+        Args:
+            profile_dir (str): 設定檔目錄
+            failed (bool): 轉換失敗時清除殘留的鎖定檔
+        """
+        if failed:
+            lock_file = os.path.join(profile_dir, '.lock')
+            if os.path.exists(lock_file):
+                try:
+                    os.remove(lock_file)
+                except OSError:
+                    pass
+        self.available.put(profile_dir)
+
+    def get_status(self):
+        return {
+            'size': self.size,
+            'available': self.available.qsize(),
+            'initialized': len(self._initialized)
+        }
+
+
+class OfficeWorker:
+    """單一常駐 LibreOffice 實例，擁有獨立的使用者設定檔"""
+
+    def __init__(self, worker_id, libreoffice_exec, profile_dir, startup_timeout=60):
+        self.worker_id = worker_id
+        self.libreoffice_exec = libreoffice_exec
+        self.profile_dir = profile_dir
+        self.startup_timeout = startup_timeout
+        self.pipe_name = f"pptx_office_{os.getpid()}_{worker_id}"
+        self.process = None
+        self.desktop = None
+        self.conversions = 0
+        self.restarts = 0
+        self.started_at = None
+
+    def start(self):
+        """
+        啟動 LibreOffice 並建立 UNO 連線
+
+        Returns:
+            bool: 是否成功啟動
+        """
+        os.makedirs(self.profile_dir, exist_ok=True)
+        cmd = [
+            self.libreoffice_exec,
+            "--headless",
+            "--invisible",
+            "--nologo",
+            "--nodefault",
+            "--norestore",
+            "--nolockcheck",
+            f"-env:UserInstallation={profile_url(self.profile_dir)}",
+            f"--accept=pipe,name={self.pipe_name};urp;StarOffice.ComponentContext"
+        ]
+        self.process = subprocess.Popen(
+            cmd,
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL
+        )
+
+        local_context = uno.getComponentContext()
+        resolver = local_context.ServiceManager.createInstanceWithContext(
+            "com.sun.star.bridge.UnoUrlResolver", local_context
+        )
+        deadline = time.time() + self.startup_timeout
+        while time.time() < deadline:
+            if self.process.poll() is not None:
+                break
+            try:
+                context = resolver.resolve(
+                    f"uno:pipe,name={self.pipe_name};urp;StarOffice.ComponentContext"
+                )
+                self.desktop = context.ServiceManager.createInstanceWithContext(
+                    "com.sun.star.frame.Desktop", context
+                )
+                self.conversions = 0
+                self.started_at = time.time()
+                return True
+            except Exception:
+                time.sleep(0.25)
+
+        self.stop()
+        return False
+
+    def is_healthy(self):
+        """檢查程序是否存活且 UNO 連線可用"""
+        if self.process is None or self.process.poll() is not None or self.desktop is None:
+            return False
+        try:
+            self.desktop.getFrames()
+            return True
+        except Exception:
+            return False
+
+    def kill(self):
+        """強制終止程序（用於卡住的轉換）"""
+        if self.process is not None and self.process.poll() is None:
+            try:
+                self.process.kill()
+            except Exception:
+                pass
+
+    def stop(self):
+        """關閉 LibreOffice 實例"""
+        if self.desktop is not None:
+            try:
+                self.desktop.terminate()
+            except Exception:
+                pass
+            self.desktop = None
+
+        if self.process is not None:
+            try:
+                self.process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                self.kill()
+                try:
+                    self.process.wait(timeout=5)
+                except Exception:
+                    pass
+            self.process = None
+
+    def restart(self):
+        """重新啟動實例"""
+        self.stop()
+        self.restarts += 1
+        return self.start()
+
+    def convert(self, input_path, output_path, timeout):
+        """
+        使用此實例將簡報轉換為 PDF
+
+        Args:
+            input_path (str): 輸入 PPTX 路徑
+            output_path (str): 輸出 PDF 路徑
+            timeout (int): 逾時秒數，超過時強制終止程序
+
+        Returns:
+            tuple: (success: bool, result: str)
+        """
+        timed_out = threading.Event()
+
+        def on_timeout():
+            timed_out.set()
+            self.kill()
+
+        watchdog = threading.Timer(timeout, on_timeout)
+        watchdog.daemon = True
+        watchdog.start()
+        document = None
+        try:
+            document = self.desktop.loadComponentFromURL(
+                uno.systemPathToFileUrl(os.path.abspath(input_path)),
+                "_blank",
+                0,
+                _make_properties(Hidden=True, ReadOnly=True)
+            )
+            if document is None:
+                return False, "LibreOffice 無法開啟檔案"
+            document.storeToURL(
+                uno.systemPathToFileUrl(os.path.abspath(output_path)),
+                _make_properties(FilterName="impress_pdf_Export")
+            )
+            return True, output_path
+        except Exception as e:
+            if timed_out.is_set():
+                return False, f"轉換超時（{timeout} 秒）"
+            return False, f"PDF 轉換失敗: {str(e)}"
+        finally:
+            watchdog.cancel()
+            if document is not None and not timed_out.is_set():
+                try:
+                    document.close(True)
+                except Exception:
+                    pass
+            self.conversions += 1
+
+
+class OfficePool:
+    """常駐 LibreOffice 實例池，負責分派、健康檢查與定期回收"""
+
+    def __init__(self, libreoffice_exec, profile_root, size=2, max_conversions=50,
+                 conversion_timeout=300, startup_timeout=60, health_check_seconds=30):
+        self.libreoffice_exec = libreoffice_exec
+        self.profile_root = profile_root
+        self.size = size
+        self.max_conversions = max_conversions
+        self.conversion_timeout = conversion_timeout
+        self.startup_timeout = startup_timeout
+        self.health_check_seconds = health_check_seconds
+        self.workers = []
+        self.idle_workers = queue.Queue()
+        self.running = False
+        self._stop_event = threading.Event()
+        self._monitor_thread = None
+        self.stats = {
+            'conversions': 0,
+            'failures': 0,
+            'restarts': 0,
+            'recycled': 0
+        }
+        self._stats_lock = threading.Lock()
+
+    def start(self):
+        """
+        啟動所有實例與健康檢查執行緒
+
+        Returns:
+            bool: 是否至少有一個實例成功啟動
+        """
+        if not UNO_AVAILABLE:
+            return False
+
+        os.makedirs(self.profile_root, exist_ok=True)
+        for worker_id in range(self.size):
+            worker = OfficeWorker(
+                worker_id,
+                self.libreoffice_exec,
+                os.path.join(self.profile_root, f"worker_{worker_id}"),
+                self.startup_timeout
+            )
+            if worker.start():
+                self.workers.append(worker)
+                self.idle_workers.put(worker)
+            else:
+                print(f"LibreOffice 常駐實例 {worker_id} 啟動失敗")
+
+        self.running = bool(self.workers)
+        if self.running:
+            self._monitor_thread = threading.Thread(target=self._monitor_loop, daemon=True)
+            self._monitor_thread.start()
+        return self.running
+
+    def _record(self, key):
+        with self._stats_lock:
+            self.stats[key] += 1
+
+    def _monitor_loop(self):
+        """定期檢查閒置實例，重新啟動已當機的實例"""
+        while not self._stop_event.wait(self.health_check_seconds):
+            checked = []
+            while True:
+                try:
+                    worker = self.idle_workers.get_nowait()
+                except queue.Empty:
+                    break
+                if not worker.is_healthy():
+                    print(f"LibreOffice 常駐實例 {worker.worker_id} 無回應，重新啟動")
+                    worker.restart()
+                    self._record('restarts')
+                checked.append(worker)
+            for worker in checked:
+                self.idle_workers.put(worker)
+
+    def convert(self, input_path, output_path):
+        """
+        取得閒置實例並執行轉換
+
+        Args:
+            input_path (str): 輸入 PPTX 路徑
+            output_path (str): 輸出 PDF 路徑
+
+        Returns:
+            tuple: (success: bool, result: str)
+        """
+        try:
+            worker = self.idle_workers.get(timeout=self.conversion_timeout)
+        except queue.Empty:
+            return False, "沒有可用的 LibreOffice 實例"
+
+        try:
+            if not worker.is_healthy():
+                self._record('restarts')
+                if not worker.restart():
+                    self._record('failures')
+                    return False, "LibreOffice 實例重新啟動失敗"
+
+            success, result = worker.convert(input_path, output_path, self.conversion_timeout)
+            if success:
+                self._record('conversions')
+            else:
+                self._record('failures')
+
+            if not worker.is_healthy():
+                self._record('restarts')
+                worker.restart()
+            elif worker.conversions >= self.max_conversions:
+                self._record('recycled')
+                worker.restart()
+
+            return success, result
+        finally:
+            self.idle_workers.put(worker)
+
+    def shutdown(self):
+        """關閉所有實例"""
+        self._stop_event.set()
+        self.running = False
+        for worker in self.workers:
+            worker.stop()
+
+    def get_status(self):
+        """
+        取得實例池狀態
+
+        Returns:
+            dict: 狀態資訊
+        """
+        with self._stats_lock:
+            stats = dict(self.stats)
+        return {
+            'enabled': self.running,
+            'size': len(self.workers),
+            'idle': self.idle_workers.qsize(),
+            'max_conversions_per_worker': self.max_conversions,
+            **stats
+        }
+
+
+def process_profile_root(profile_root):
+    """
+    多個服務程序時每個程序使用獨立的設定檔目錄（同一個設定檔不能同時被兩個 LibreOffice 實例使用），
+    並移除已結束程序遺留的目錄
+
+    Args:
+        profile_root (str): 設定檔根目錄
+
+    Returns:
+        str: 本程序的設定檔目錄
+    """
+    os.makedirs(profile_root, exist_ok=True)
+    for name in os.listdir(profile_root):
+        if name.startswith('pid_') and name[4:].isdigit() and not is_process_alive(int(name[4:])):
+            shutil.rmtree(os.path.join(profile_root, name), ignore_errors=True)
+    return os.path.join(profile_root, f"pid_{os.getpid()}")
+
+
+def create_office_pool(libreoffice_path, profile_root, size, max_conversions,
+                       conversion_timeout, startup_timeout, health_check_seconds):
+    """
+    建立並啟動常駐實例池，無法使用時回傳 None
+
+    Returns:
+        OfficePool | None: 實例池
+    """
+    if size <= 0:
+        return None
+    if not UNO_AVAILABLE:
+        print("未安裝 UNO（python3-uno），LibreOffice 常駐實例池停用")
+        return None
+
+    libreoffice_exec = shutil.which(libreoffice_path) or libreoffice_path
+    pool = OfficePool(
+        libreoffice_exec,
+        profile_root,
+        size=size,
+        max_conversions=max_conversions,
+        conversion_timeout=conversion_timeout,
+        startup_timeout=startup_timeout,
+        health_check_seconds=health_check_seconds
+    )
+    if not pool.start():
+        print("LibreOffice 常駐實例池啟動失敗，改用單次執行模式")
+        return None
+    return pool
@@ -0,0 +1,253 @@
+"""
+PPTX 套件（ZIP）處理模組
+在不解壓整份簡報的情況下讀取與改寫個別部件
+"""
+import copy
+import posixpath
+import re
+import struct
+import zipfile
+import xml.etree.ElementTree as ET
+
+PRESENTATION_PART = 'ppt/presentation.xml'
+SLIDE_PART_PATTERN = re.compile(r'^ppt/slides/slide\d+\.xml$')
+
+# 只比對投影片參照與投影片根節點的開始標籤，其他內容保持原樣
+_HIDDEN_SLIDE_ID = re.compile(rb'(<(?:\w+:)?sldId\b[^>]*?\bshow=)(["\'])(?:0|false)\2')
+_HIDDEN_SLIDE_ROOT = re.compile(rb'(<(?:\w+:)?sld\b[^>]*?\bshow=)(["\'])(?:0|false)\2')
+
+_ZIP64_EXTRA_ID = 0x0001
+_DATA_DESCRIPTOR_FLAG = 0x08
+
+
+def is_slide_part(name):
+    """檢查部件名稱是否為投影片 XML"""
+    return SLIDE_PART_PATTERN.match(name) is not None
+
+
+def unhide_presentation_xml(data):
+    """
+    將 presentation.xml 中標記為隱藏的投影片參照改為顯示
+
+    Args:
+        data (bytes): 原始 XML
+
+    Returns:
+        bytes | None: 修改後的 XML，沒有隱藏投影片時回傳 None
+    """
+    patched, count = _HIDDEN_SLIDE_ID.subn(rb'\g<1>\g<2>1\g<2>', data)
+    return patched if count else None
+
+
+def unhide_slide_xml(data):
+    """
+    將投影片根節點的 show="0" 改為 show="1"
+
+    Args:
+        data (bytes): 原始投影片 XML
+
+    Returns:
+        bytes | None: 修改後的 XML，投影片未隱藏時回傳 None
+    """
+    patched, count = _HIDDEN_SLIDE_ROOT.subn(rb'\g<1>\g<2>1\g<2>', data, count=1)
+    return patched if count else None
+
+
+def is_hidden_slide_xml(data):
+    """檢查投影片 XML 的根節點是否標記為隱藏"""
+    return _HIDDEN_SLIDE_ROOT.search(data) is not None
+
+
+def _strip_zip64_extra(extra):
+    """移除 ZIP64 額外欄位，寫入時會依實際大小重新產生"""
+    result = b''
+    offset = 0
+    while offset + 4 <= len(extra):
+        header_id, size = struct.unpack('<HH', extra[offset:offset + 4])
+        if header_id != _ZIP64_EXTRA_ID:
+            result += extra[offset:offset + 4 + size]
+        offset += 4 + size
+    return result
+
+
+def copy_entry_raw(source_zip, target_zip, info, chunk_size=1024 * 1024):
+    """
+    不解壓縮、不重新壓縮，直接複製 ZIP 項目的壓縮資料
+
+    Args:
+        source_zip (zipfile.ZipFile): 來源（讀取模式）
+        target_zip (zipfile.ZipFile): 目標（寫入模式）
+        info (zipfile.ZipInfo): 來源項目
+        chunk_size (int): 每次複製的大小（bytes）
+    """
+    source = source_zip.fp
+    source.seek(info.header_offset)
+    header = struct.unpack(zipfile.structFileHeader, source.read(zipfile.sizeFileHeader))
+    data_offset = (
+        info.header_offset
+        + zipfile.sizeFileHeader
+        + header[zipfile._FH_FILENAME_LENGTH]
+        + header[zipfile._FH_EXTRA_FIELD_LENGTH]
+    )
+
+    target_info = copy.copy(info)
+    # CRC 與大小已知，直接寫在本地標頭，不需要資料描述區
+    target_info.flag_bits &= ~_DATA_DESCRIPTOR_FLAG
+    target_info.extra = _strip_zip64_extra(info.extra)
+    target_info.header_offset = target_zip.fp.tell()
+    target_zip.fp.write(target_info.FileHeader())
+
+    source.seek(data_offset)
+    remaining = info.compress_size
+    while remaining > 0:
+        chunk = source.read(min(chunk_size, remaining))
+        if not chunk:
+            raise zipfile.BadZipFile(f"項目資料不完整: {info.filename}")
+        target_zip.fp.write(chunk)
+        remaining -= len(chunk)
+
+    target_zip.filelist.append(target_info)
+    target_zip.NameToInfo[target_info.filename] = target_info
+    target_zip.start_dir = target_zip.fp.tell()
+
+
+def write_entry(target_zip, info, data):
+    """
+    以 DEFLATE 壓縮寫入修改過的項目，保留原本的名稱、時間與屬性
+
+    Args:
+        target_zip (zipfile.ZipFile): 目標（寫入模式）
+        info (zipfile.ZipInfo): 原始項目
+        data (bytes): 新內容
+    """
+    target_info = zipfile.ZipInfo(info.filename, date_time=info.date_time)
+    target_info.compress_type = zipfile.ZIP_DEFLATED
+    target_info.external_attr = info.external_attr
+    target_zip.writestr(target_info, data)
+
+
+_NS = {
+    'p': 'http://schemas.openxmlformats.org/presentationml/2006/main',
+    'r': 'http://schemas.openxmlformats.org/officeDocument/2006/relationships',
+    'rel': 'http://schemas.openxmlformats.org/package/2006/relationships'
+}
+_SLIDE_ROOT_TAG = re.compile(rb'<(?:\w+:)?sld\b[^>]*>')
+_EMU_PER_INCH = 914400
+
+
+def _rels_part_name(part_name):
+    """取得部件對應的關聯檔名稱，例如 ppt/slides/slide1.xml -> ppt/slides/_rels/slide1.xml.rels"""
+    directory, filename = posixpath.split(part_name)
+    return posixpath.join(directory, '_rels', f"{filename}.rels")
+
+
+def _read_relationships(source_zip, part_name):
+    """
+    讀取部件的關聯檔
+
+    Returns:
+        dict: {關聯 ID: 目標部件名稱}，外部連結不列入
+    """
+    rels_name = _rels_part_name(part_name)
+    if rels_name not in source_zip.NameToInfo:
+        return {}
+    root = ET.fromstring(source_zip.read(rels_name))
+    base_dir = posixpath.dirname(part_name)
+    relationships = {}
+    for rel in root.findall('rel:Relationship', _NS):
+        if rel.get('TargetMode') == 'External':
+            continue
+        target = rel.get('Target', '')
+        if target.startswith('/'):
+            target = target.lstrip('/')
+        else:
+            target = posixpath.normpath(posixpath.join(base_dir, target))
+        relationships[rel.get('Id')] = target
+    return relationships
+
+
+def _read_slide_root_tag(source_zip, part_name, chunk_size=4096):
+    """只解壓到投影片根節點的開始標籤為止"""
+    head = b''
+    with source_zip.open(part_name) as f:
+        while True:
+            chunk = f.read(chunk_size)
+            head += chunk
+            match = _SLIDE_ROOT_TAG.search(head)
+            if match:
+                return match.group(0)
+            if not chunk:
+                return head
+
+
+def read_manifest(source):
+    """
+    讀取簡報摘要，不解壓投影片內容也不啟動 LibreOffice
+
+    只解析 presentation.xml 與關聯檔，隱藏狀態僅讀取投影片根節點，
+    媒體大小取自 ZIP 中央目錄
+
+    Args:
+        source (str | file): PPTX 路徑或可 seek 的檔案物件
+
+    Returns:
+        dict: 投影片數量、隱藏投影片、頁面尺寸與媒體大小
+
+    Raises:
+        zipfile.BadZipFile: 檔案不是有效的 ZIP
+        KeyError: 缺少 presentation.xml
+        ValueError: XML 內容無法解析
+    """
+    try:
+        with zipfile.ZipFile(source, 'r') as zin:
+            presentation = ET.fromstring(zin.read(PRESENTATION_PART))
+            relationships = _read_relationships(zin, PRESENTATION_PART)
+
+            size = presentation.find('p:sldSz', _NS)
+            width_emu = int(size.get('cx')) if size is not None else 0
+            height_emu = int(size.get('cy')) if size is not None else 0
+
+            slides = []
+            slide_ids = presentation.findall('p:sldIdLst/p:sldId', _NS)
+            for index, slide_id in enumerate(slide_ids, start=1):
+                part_name = relationships.get(slide_id.get(f"{{{_NS['r']}}}id"))
+                if part_name is None or part_name not in zin.NameToInfo:
+                    continue
+
+                hidden = slide_id.get('show') in ('0', 'false')
+                if not hidden:
+                    hidden = is_hidden_slide_xml(_read_slide_root_tag(zin, part_name))
+
+                media_parts = {
+                    target for target in _read_relationships(zin, part_name).values()
+                    if target.startswith('ppt/media/') and target in zin.NameToInfo
+                }
+                slides.append({
+                    'index': index,
+                    'part': part_name,
+                    'hidden': hidden,
+                    'media_count': len(media_parts),
+                    'media_bytes': sum(zin.getinfo(name).file_size for name in media_parts)
+                })
+
+            media_infos = [info for info in zin.infolist() if info.filename.startswith('ppt/media/')]
+    except ET.ParseError as e:
+        raise ValueError(f"XML 格式錯誤: {e}")
+
+    return {
+        'slide_count': len(slides),
+        'visible_slide_count': sum(1 for slide in slides if not slide['hidden']),
+        'hidden_slides': [slide['index'] for slide in slides if slide['hidden']],
+        'slide_size': {
+            'width_emu': width_emu,
+            'height_emu': height_emu,
+            'width_inches': round(width_emu / _EMU_PER_INCH, 3),
+            'height_inches': round(height_emu / _EMU_PER_INCH, 3)
+        },
+        'media': {
+            'count': len(media_infos),
+            'total_bytes': sum(info.file_size for info in media_infos),
+            'compressed_bytes': sum(info.compress_size for info in media_infos)
+        },
+        'slides': slides
+    }
@@ -0,0 +1,365 @@
+"""
+PDF 點陣化模組
+以固定頁數的視窗分批渲染 PDF 頁面，每批存檔後立即釋放，記憶體用量不隨頁數增加
+"""
+import hashlib
+import io
+import math
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pdf2image import convert_from_path, pdfinfo_from_path
+from PIL import Image
+
+from .config import Config
+from .etags import write_etag
+
+Image.init()
+
+# 支援的輸出格式：{格式名稱: (副檔名, Pillow 格式, 預設品質)}
+IMAGE_FORMATS = {
+    'jpg': ('jpg', 'JPEG', 85),
+    'webp': ('webp', 'WEBP', 80),
+    'png': ('png', 'PNG', None),
+}
+# AVIF 需要較新的 Pillow（或 pillow-avif-plugin），不支援時不提供
+if 'AVIF' in Image.SAVE:
+    IMAGE_FORMATS['avif'] = ('avif', 'AVIF', 60)
+
+DEFAULT_ENCODING = {'format': 'jpg', 'quality': 85, 'progressive': False, 'optimize': False, 'quantize': False}
+
+_encoder = None
+_encoder_lock = threading.Lock()
+
+
+def get_page_count(pdf_path):
+    """
+    取得 PDF 總頁數
+
+    Args:
+        pdf_path (str): PDF 檔案路徑
+
+    Returns:
+        int: 總頁數
+    """
+    info = pdfinfo_from_path(pdf_path)
+    return int(info['Pages'])
+
+
+def page_filename(page_number, width=None, extension='jpg'):
+    """
+    取得頁面圖片檔名
+
+    Args:
+        page_number (int): 頁碼（從 1 開始）
+        width (int): 縮小版本的寬度（像素），None 表示原始解析度
+        extension (str): 副檔名
+
+    Returns:
+        str: 圖片檔名
+    """
+    if width:
+        return f"page_{page_number:03d}_w{width}.{extension}"
+    return f"page_{page_number:03d}.{extension}"
+
+
+_PAGE_FILENAME = re.compile(r'^page_(\d{3,})(?:_w(\d+))?\.(?:jpg|webp|png|avif)$')
+_PAGE_RANGE = re.compile(r'^(\d+)?\s*(-)?\s*(\d+)?$')
+
+
+def parse_page_filename(filename):
+    """
+    由圖片檔名取得頁碼（縮小版本的檔名也適用）
+
+    Args:
+        filename (str): 圖片檔名
+
+    Returns:
+        int | None: 頁碼，檔名不是頁面圖片時回傳 None
+    """
+    match = _PAGE_FILENAME.match(filename)
+    return int(match.group(1)) if match else None
+
+
+def parse_widths(spec):
+    """
+    解析縮小版本寬度清單，例如 "320,1024"
+
+    Args:
+        spec (str): 以逗號分隔的像素寬度
+
+    Returns:
+        list: 排序後不重複的寬度
+
+    Raises:
+        ValueError: 格式錯誤或寬度不是正整數
+    """
+    widths = set()
+    for part in spec.split(','):
+        part = part.strip()
+        if not part.isdigit() or int(part) <= 0:
+            raise ValueError(f"無效的圖片寬度: {part or spec}")
+        widths.add(int(part))
+    return sorted(widths)
+
+
+def parse_page_spec(spec):
+    """
+    解析頁碼範圍字串，例如 "1-3,7"、"5-"（第 5 頁到最後一頁）
+
+    Args:
+        spec (str): 頁碼範圍字串
+
+    Returns:
+        list: [(first_page, last_page | None), ...]
+
+    Raises:
+        ValueError: 格式錯誤
+    """
+    ranges = []
+    for part in spec.split(','):
+        part = part.strip()
+        match = _PAGE_RANGE.match(part)
+        if not part or not match or not (match.group(1) or match.group(3)):
+            raise ValueError(f"無效的頁碼範圍: {part or spec}")
+        first, dash, last = match.groups()
+        if not dash:
+            first = last = first or last
+        first_page = int(first) if first else 1
+        last_page = int(last) if last else None
+        if first_page < 1 or (last_page is not None and last_page < first_page):
+            raise ValueError(f"無效的頁碼範圍: {part}")
+        ranges.append((first_page, last_page))
+    return ranges
+
+
+def select_pages(page_ranges, total_pages):
+    """
+    依總頁數展開頁碼範圍，超出範圍的頁碼會被忽略
+
+    Args:
+        page_ranges (list | None): parse_page_spec 的結果，None 表示全部頁面
+        total_pages (int): 總頁數
+
+    Returns:
+        list: 排序後不重複的頁碼
+    """
+    if page_ranges is None:
+        return list(range(1, total_pages + 1))
+    pages = set()
+    for first_page, last_page in page_ranges:
+        last_page = total_pages if last_page is None else min(last_page, total_pages)
+        pages.update(range(first_page, last_page + 1))
+    return sorted(pages)
+
+
+def plan_page_chunks(pages, workers, window_size):
+    """
+    依頁碼與可用核心數切分連續的頁碼範圍，每段交給一個工作程序渲染
+
+    Args:
+        pages (list): 排序後的頁碼
+        workers (int): 可用的工作程序數
+        window_size (int): 單段最多頁數
+
+    Returns:
+        list: [(first_page, last_page), ...]，依頁碼排序
+    """
+    if not pages:
+        return []
+    workers = max(1, min(workers, len(pages)))
+    chunk_size = max(1, min(window_size, math.ceil(len(pages) / workers)))
+
+    chunks = []
+    for page in pages:
+        if chunks:
+            first_page, last_page = chunks[-1]
+            # 只合併相鄰頁碼，讓每段都能以 poppler 的 -f/-l 一次渲染
+            if page == last_page + 1 and last_page - first_page + 1 < chunk_size:
+                chunks[-1] = (first_page, page)
+                continue
+        chunks.append((page, page))
+    return chunks
+
+
+def build_encoding(image_format='jpg', quality=None, progressive=False, optimize=False, quantize=False):
+    """
+    建立並驗證圖片編碼設定
+
+    Args:
+        image_format (str): jpg、webp、png 或 avif（需 Pillow 支援）
+        quality (int): 1-100，None 使用格式預設值；PNG 為無損格式不使用
+        progressive (bool): JPEG 使用漸進式編碼
+        optimize (bool): JPEG / PNG 進行額外的壓縮最佳化（較慢、檔案較小）
+        quantize (bool): PNG 轉為 256 色調色盤
+
+    Returns:
+        dict: 編碼設定
+
+    Raises:
+        ValueError: 不支援的格式或品質超出範圍
+    """
+    image_format = 'jpg' if image_format == 'jpeg' else image_format
+    if image_format not in IMAGE_FORMATS:
+        raise ValueError(f"不支援的圖片格式: {image_format}（可用: {', '.join(IMAGE_FORMATS)}）")
+    default_quality = IMAGE_FORMATS[image_format][2]
+    if default_quality is None:
+        quality = None
+    elif quality is None:
+        quality = default_quality
+    elif not 1 <= quality <= 100:
+        raise ValueError(f"圖片品質必須介於 1 到 100: {quality}")
+    return {
+        'format': image_format,
+        'quality': quality,
+        'progressive': progressive and image_format == 'jpg',
+        'optimize': optimize and image_format in ('jpg', 'png'),
+        'quantize': quantize and image_format == 'png'
+    }
+
+
+def image_extension(encoding):
+    """取得編碼設定對應的副檔名"""
+    return IMAGE_FORMATS[encoding['format']][0]
+
+
+def _save_image(image, file_path, encoding):
+    """先寫入暫存檔再改名，下載端不會讀到寫到一半的圖片；同時記錄內容雜湊"""
+    _, pil_format, _ = IMAGE_FORMATS[encoding['format']]
+    options = {}
+    if encoding['quality'] is not None:
+        options['quality'] = encoding['quality']
+    if encoding['format'] == 'jpg':
+        options['progressive'] = encoding['progressive']
+        options['optimize'] = encoding['optimize']
+    elif encoding['format'] == 'png':
+        options['optimize'] = encoding['optimize']
+        if encoding['quantize']:
+            image = image.quantize(colors=256, method=Image.Quantize.FASTOCTREE)
+    elif encoding['format'] == 'webp':
+        options['method'] = 4
+
+    # 編碼到記憶體，同一份資料寫入檔案並計算下載用的 ETag
+    buffer = io.BytesIO()
+    image.save(buffer, pil_format, **options)
+    data = buffer.getbuffer()
+    temp_path = f"{file_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(temp_path, 'wb') as f:
+        f.write(data)
+    # 雜湊記錄先於圖片出現，看得到圖片就讀得到 ETag
+    write_etag(file_path, hashlib.sha256(data).hexdigest())
+    os.replace(temp_path, file_path)
+
+
+def _get_encoder():
+    """每個渲染程序各自的編碼執行緒池，Pillow 編碼時會釋放 GIL"""
+    global _encoder
+    with _encoder_lock:
+        if _encoder is None:
+            _encoder = ThreadPoolExecutor(max_workers=Config.ENCODE_THREADS, thread_name_prefix='image-encode')
+        return _encoder
+
+
+def _encode_page(page, output_dir, page_number, variant_widths, encoding):
+    """
+    編碼單一頁面的所有版本後釋放頁面
+
+    Returns:
+        tuple: (原始解析度圖片檔名, 編碼秒數, 寫入的 bytes)
+    """
+    extension = image_extension(encoding)
+    start = time.time()
+    written_bytes = 0
+    try:
+        # 縮小版本先寫入，原始圖片存在即代表此頁所有版本都已完成
+        for width in variant_widths:
+            # 不放大：寬度超過渲染結果時沿用原始尺寸
+            target_width = min(width, page.width)
+            target_height = max(1, round(page.height * target_width / page.width))
+            variant = page.resize((target_width, target_height), Image.LANCZOS)
+            variant_path = os.path.join(output_dir, page_filename(page_number, width, extension))
+            try:
+                _save_image(variant, variant_path, encoding)
+            finally:
+                variant.close()
+            written_bytes += os.path.getsize(variant_path)
+
+        filename = page_filename(page_number, extension=extension)
+        file_path = os.path.join(output_dir, filename)
+        _save_image(page, file_path, encoding)
+        written_bytes += os.path.getsize(file_path)
+        return filename, time.time() - start, written_bytes
+    finally:
+        page.close()
+
+
+def render_page_range(pdf_path, output_dir, dpi, first_page, last_page, window_size, variant_widths=(),
+                      encoding=None, on_page=None, stats=None):
+    """
+    以視窗分批渲染指定頁碼範圍並存檔
+
+    Args:
+        pdf_path (str): PDF 檔案路徑
+        output_dir (str): 輸出資料夾
+        dpi (int): 圖片解析度
+        first_page (int): 起始頁碼（含）
+        last_page (int): 結束頁碼（含）
+        window_size (int): 每批渲染的頁數
+        variant_widths (tuple): 縮小版本的寬度（像素），由同一次渲染的結果縮小產生
+        encoding (dict): build_encoding 的結果，None 使用 JPEG 品質 85
+        on_page (callable): 每頁存檔後以檔名呼叫（僅限同一程序內執行時）
+        stats (dict): 累加 pdftoppm_seconds（點陣化與解碼）、encode_seconds、bytes_written
+
+    Returns:
+        list: 產生的原始解析度圖片檔名（依頁碼排序）
+    """
+    window_size = max(1, window_size)
+    encoding = encoding or DEFAULT_ENCODING
+    stats = stats if stats is not None else {}
+    for key in ('pdftoppm_seconds', 'encode_seconds', 'bytes_written'):
+        stats.setdefault(key, 0)
+    encoder = _get_encoder()
+    image_files = []
+    pending = []
+
+    def collect(futures):
+        for future in futures:
+            image_file, encode_seconds, written_bytes = future.result()
+            stats['encode_seconds'] += encode_seconds
+            stats['bytes_written'] += written_bytes
+            image_files.append(image_file)
+            if on_page:
+                on_page(image_file)
+
+    for window_start in range(first_page, last_page + 1, window_size):
+        window_end = min(window_start + window_size - 1, last_page)
+        window_started = time.time()
+        pages = convert_from_path(pdf_path, dpi=dpi, first_page=window_start, last_page=window_end)
+        stats['pdftoppm_seconds'] += time.time() - window_started
+
+        # 上一批編碼與這一批點陣化同時進行；等上一批完成後再送出，記憶體中最多保留兩批頁面
+        collect(pending)
+        pending = [
+            encoder.submit(_encode_page, page, output_dir, window_start + offset, variant_widths, encoding)
+            for offset, page in enumerate(pages)
+        ]
+        del pages
+
+    collect(pending)
+    return image_files
+
+
+def render_chunk(pdf_path, output_dir, dpi, first_page, last_page, window_size, variant_widths=(), encoding=None):
+    """
+    供渲染程序池呼叫的 render_page_range，統計資料隨結果一起回傳
+
+    Returns:
+        tuple: (圖片檔名清單, 統計資料)
+    """
+    stats = {}
+    image_files = render_page_range(
+        pdf_path, output_dir, dpi, first_page, last_page, window_size, variant_widths, encoding, stats=stats
+    )
+    return image_files, stats
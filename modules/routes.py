@@ -2,13 +2,37 @@
 API 路由模組
 定義所有 API 端點
 """
-from flask import request, jsonify, send_file
+from flask import Response, request, jsonify, send_file, stream_with_context
 from datetime import datetime
+from contextlib import nullcontext
+from urllib.parse import quote
+from functools import partial
+import hashlib
+import json
+import mimetypes
 import os
+import shutil
 import time
+import zipfile
 
+from .config import Config
+from .converter import PAGE_NOT_FOUND
+from .metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, SIZE_BUCKETS, MetricsRegistry
+from .zip_stream import stream_zip
+from .upload_stream import ZIP_SIGNATURE, StreamedUpload, UploadRejected, create_request_class
+from .rasterizer import (
+    build_encoding,
+    image_extension,
+    page_filename,
+    parse_page_filename,
+    parse_page_spec,
+    parse_widths,
+    select_pages
+)
 
-def create_routes(app, converter, file_manager):
+
+def create_routes(app, converter, file_manager, conversion_cache=None, job_manager=None,
+                  conversion_queue=None, inspector=None, metrics=None, spool=None, batch_scheduler=None):
     """
     建立所有 API 路由
     
@@ -16,87 +40,1003 @@ def create_routes(app, converter, file_manager):
         app: Flask 應用程式實例
         converter: PPTXConverter 實例
         file_manager: FileManager 實例
+        conversion_cache: ConversionCache 實例（可選）
+        job_manager: JobManager 實例（可選，提供非同步工作端點）
+        conversion_queue: ConversionQueue 實例（可選，限制同時轉換數量）
+        inspector: PresentationInspector 實例（可選，提供 /inspect 端點）
+        metrics: MetricsRegistry 實例（可選，提供 /metrics 端點）
+        spool: Spool 實例（可選，/jobs 的工作經由共用目錄分派給工作節點）
+        batch_scheduler: BatchScheduler 實例（可選，提供 /convert/batch 端點）
     """
+    # 未提供時仍記錄到私有的登錄表，記錄端不需要判斷是否啟用
+    registry = metrics if metrics is not None else MetricsRegistry()
+    http_requests = registry.counter(
+        'http_requests_total', 'HTTP 請求數', ('method', 'endpoint', 'status')
+    )
+    http_duration = registry.histogram(
+        'http_request_duration_seconds', 'HTTP 請求處理秒數（串流回應只計算到開始傳送）', ('endpoint',)
+    )
+    stage_duration = registry.histogram(
+        'stage_duration_seconds', '轉換各階段秒數', ('stage',)
+    )
+    conversions = registry.counter('conversions_total', '轉換次數', ('outcome',))
+    rejections = registry.counter('rejected_requests_total', '被拒絕的轉換請求數', ('reason',))
+    cache_lookups = registry.counter('cache_lookups_total', '快取查詢次數', ('cache', 'result'))
+    upload_bytes = registry.counter('upload_bytes_total', '上傳的 PPTX 總大小（bytes）')
+    upload_size = registry.histogram('upload_size_bytes', '上傳檔案大小分布（bytes）', buckets=SIZE_BUCKETS)
+    output_bytes = registry.counter('output_bytes_total', '寫入的 PDF 與圖片總大小（bytes）', ('source',))
+    pages_rendered = registry.counter('pages_rendered_total', '渲染的頁數', ('mode',))
+    batch_export_failures = registry.counter(
+        'batch_group_export_failures_total', '批次中合併產生 PDF 失敗、改為個別轉換的次數'
+    )
     
-    @app.route('/convert', methods=['POST'])
-    def convert_pptx():
+    # 上傳的 PPTX 在解析 multipart 時直接寫入臨時資料夾
+    app.request_class = create_request_class(file_manager)
+    
+    @app.errorhandler(UploadRejected)
+    def upload_rejected(error):
+        rejections.inc(reason='invalid_upload' if error.code == 400 else 'storage_full')
+        return error.get_response()
+    
+    def observe_timings(timings):
+        for stage, seconds in timings.items():
+            if isinstance(seconds, (int, float)):
+                stage_duration.observe(seconds, stage=stage)
+    
+    @app.before_request
+    def start_request_timer():
+        request.environ['pptx.request_start'] = time.time()
+    
+    @app.after_request
+    def record_request(response):
+        # 以路由規則作為標籤，避免資料夾名稱與工作 ID 產生大量時間序列
+        endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+        http_requests.inc(method=request.method, endpoint=endpoint, status=response.status_code)
+        start = request.environ.get('pptx.request_start')
+        if start is not None:
+            http_duration.observe(time.time() - start, endpoint=endpoint)
+        return response
+    
+    
+    def admit_request():
         """
-        API 端點：轉換 PPTX 檔案
+        嘗試加入轉換佇列
+        
+        Returns:
+            tuple: (ticket: AdmissionTicket | None, error_response: tuple | None)
         """
-        request_time = datetime.now()
+        if conversion_queue is None:
+            return None, None
+        ticket = conversion_queue.admit()
+        if ticket is None:
+            rejections.inc(reason='queue_full')
+            retry_after = conversion_queue.retry_after()
+            response = jsonify({
+                'error': '轉換佇列已滿，請稍後再試',
+                'retry_after_seconds': retry_after,
+                'queue': conversion_queue.get_status()
+            })
+            response.headers['Retry-After'] = str(retry_after)
+            return None, (response, 429)
+        return ticket, None
+    
+    def check_storage():
+        """
+        檢查儲存空間，不足時先釋放轉換快取
         
-        # 檢查儲存空間
+        Returns:
+            tuple | None: 空間不足時回傳錯誤回應
+        """
         storage_available, current_size_gb, max_size_gb = file_manager.is_storage_available()
+        if not storage_available and conversion_cache:
+            overflow_bytes = int((current_size_gb - max_size_gb) * 1024 * 1024 * 1024) + 1
+            if conversion_cache.evict(overflow_bytes):
+                file_manager.reconcile_storage()
+                storage_available, current_size_gb, max_size_gb = file_manager.is_storage_available()
         if not storage_available:
+            rejections.inc(reason='storage_full')
             return jsonify({
                 'error': f'儲存空間不足，目前使用 {current_size_gb:.2f}GB，超過限制 {max_size_gb:.2f}GB',
                 'current_size_gb': current_size_gb,
                 'max_size_gb': max_size_gb,
                 'suggestion': '請使用 /cleanup/all 清理所有臨時檔案'
             }), 507  # Insufficient Storage
+        return None
+    
+    def receive_upload():
+        """
+        驗證上傳檔案並存入新的臨時資料夾
         
+        Returns:
+            tuple: (upload: dict | None, error_response: tuple | None)
+        """
         # 檢查是否有檔案上傳
         if 'file' not in request.files:
-            return jsonify({'error': '沒有檔案上傳'}), 400
+            return None, (jsonify({'error': '沒有檔案上傳'}), 400)
         
         file = request.files['file']
         if file.filename == '':
-            return jsonify({'error': '沒有選擇檔案'}), 400
+            return None, (jsonify({'error': '沒有選擇檔案'}), 400)
         
         if not file.filename or not file.filename.lower().endswith('.pptx'):
-            return jsonify({'error': '檔案必須是 PPTX 格式'}), 400
+            return None, (jsonify({'error': '檔案必須是 PPTX 格式'}), 400)
+        
+        return store_upload(file), None
+    
+    def store_upload(file):
+        """
+        取得上傳檔案所在的臨時資料夾，需要時才寫入新的臨時資料夾
         
+        Returns:
+            dict: 上傳資訊（temp_folder_name、temp_folder_path、pptx_path、size_bytes、sha256、upload_seconds）
+        """
+        if isinstance(file.stream, StreamedUpload):
+            # 解析 multipart 時已寫入最終位置並計算雜湊，不需要再複製
+            upload = file.stream.claim()
+            upload_bytes.inc(upload['size_bytes'])
+            upload_size.observe(upload['size_bytes'])
+            return upload
+        
+        # 建立臨時資料夾
+        temp_folder_name, temp_folder_path = file_manager.create_temp_folder()
         try:
-            # 建立臨時資料夾
-            temp_folder_name, temp_folder_path = file_manager.create_temp_folder()
-              # 儲存上傳的檔案
+            # 儲存上傳的檔案
             timestamp = int(time.time() * 1000)
             pptx_filename = f"input_{timestamp}.pptx"
             pptx_path = os.path.join(temp_folder_path, pptx_filename)
-            file.save(pptx_path)
-            
-            # 獲取轉換參數
-            include_hidden_slides = request.form.get('include_hidden_slides', 'true').lower() == 'true'
-            dpi = int(request.form.get('dpi', 200))
-            
-            conversion_result = converter.convert_pptx_to_all(
-                pptx_path, 
-                temp_folder_path,
-                dpi=dpi,
-                include_hidden_slides=include_hidden_slides
+            upload_start = time.time()
+            size_bytes, upload_hash = file_manager.save_upload(file, pptx_path)
+            upload_seconds = time.time() - upload_start
+        except Exception:
+            file_manager.cleanup_folder(temp_folder_path)
+            raise
+        
+        upload_bytes.inc(size_bytes)
+        upload_size.observe(size_bytes)
+        return {
+            'temp_folder_name': temp_folder_name,
+            'temp_folder_path': temp_folder_path,
+            'pptx_path': pptx_path,
+            'size_bytes': size_bytes,
+            'sha256': upload_hash,
+            'upload_seconds': upload_seconds
+        }
+    
+    def read_conversion_params():
+        """
+        讀取表單中的轉換參數
+        
+        Returns:
+            tuple: (params: dict | None, error_response: tuple | None)
+        """
+        try:
+            pages = request.form.get('pages', '').strip() or None
+            if pages:
+                parse_page_spec(pages)
+            # 縮小版本：widths 可指定多個寬度，thumb_width 為單一縮圖寬度的簡寫
+            width_specs = [request.form.get('widths', ''), request.form.get('thumb_width', '')]
+            width_spec = ','.join(spec.strip() for spec in width_specs if spec.strip())
+            widths = parse_widths(width_spec) if width_spec else []
+            quality = request.form.get('quality', '').strip()
+            encoding = build_encoding(
+                request.form.get('format', Config.DEFAULT_IMAGE_FORMAT).lower(),
+                quality=int(quality) if quality else None,
+                progressive=request.form.get('progressive', 'false').lower() == 'true',
+                optimize=request.form.get('optimize', 'false').lower() == 'true',
+                quantize=request.form.get('quantize', 'false').lower() == 'true'
             )
+            render_mode = request.form.get('render', Config.DEFAULT_RENDER_MODE).lower()
+            if render_mode not in ('eager', 'lazy'):
+                raise ValueError(f"render 必須是 eager 或 lazy: {render_mode}")
+            params = {
+                'include_hidden_slides': request.form.get('include_hidden_slides', 'true').lower() == 'true',
+                'dpi': int(request.form.get('dpi', 200)),
+                'pages': pages,
+                'widths': widths,
+                'render': render_mode,
+                'encoding': encoding
+            }
+        except ValueError as e:
+            return None, (jsonify({'error': f'參數錯誤: {str(e)}'}), 400)
+        return params, None
+    
+    def conversion_cache_key(upload, params):
+        """依檔案雜湊與轉換參數產生快取索引鍵"""
+        return conversion_cache.make_key(
+            upload['sha256'],
+            dpi=params['dpi'],
+            include_hidden_slides=params['include_hidden_slides'],
+            pages=params['pages'],
+            render=params['render'],
+            widths=params['widths'],
+            encoding=params['encoding']
+        )
+    
+    def run_conversion(upload, params, ticket=None, progress_callback=None, pdf_export=None):
+        """
+        執行轉換（優先使用快取）並安排清理
+        
+        Args:
+            upload (dict): receive_upload 的結果
+            params (dict): read_conversion_params 的結果
+            ticket (AdmissionTicket): 轉換佇列名額，命中快取時不佔用
+            progress_callback (callable): 接收進度事件的函數（可選）
+            pdf_export (tuple): 批次轉換時已產生的 (PDF 路徑, timings)，略過 PDF 轉換（可選）
             
-            if not conversion_result['success']:
-                file_manager.cleanup_folder(temp_folder_path)
-                return jsonify({'error': conversion_result['error']}), 500
+        Returns:
+            tuple: (result_data: dict | None, error: str | None)
+        """
+        conversion_start = time.time()
+        temp_folder_name = upload['temp_folder_name']
+        temp_folder_path = upload['temp_folder_path']
+        page_ranges = parse_page_spec(params['pages']) if params['pages'] else None
+        
+        def report(event):
+            if progress_callback is None:
+                return
+            if event.get('file'):
+                # 頁面完成時附上下載連結，客戶端可以先顯示已完成的頁面
+                event = {**event, 'url': f"/download/{temp_folder_name}/{event['file']}"}
+            progress_callback(event)
+        
+        conversion_result = None
+        if conversion_cache:
+            cache_key = conversion_cache_key(upload, params)
+            conversion_result = conversion_cache.get(cache_key, temp_folder_path)
+            cache_lookups.inc(cache='conversion', result='hit' if conversion_result is not None else 'miss')
+        cache_hit = conversion_result is not None
+        
+        slot_wait = 0.0
+        if cache_hit:
+            if ticket:
+                ticket.release()
+            report({'type': 'stage', 'stage': 'cache', 'status': 'hit'})
+        else:
+            report({'type': 'stage', 'stage': 'slot_wait', 'status': 'started'})
+            with (ticket.slot() if ticket else nullcontext(0.0)) as slot_wait:
+                report({'type': 'stage', 'stage': 'slot_wait', 'status': 'done', 'seconds': round(slot_wait, 3)})
+                conversion_result = converter.convert_pptx_to_all(
+                    upload['pptx_path'], 
+                    temp_folder_path,
+                    dpi=params['dpi'],
+                    include_hidden_slides=params['include_hidden_slides'],
+                    page_ranges=page_ranges,
+                    render_images=params['render'] == 'eager',
+                    variant_widths=params['widths'],
+                    encoding=params['encoding'],
+                    progress_callback=report if progress_callback else None,
+                    pdf_file=pdf_export[0] if pdf_export else None
+                )
+            conversion_result['timings']['slot_wait'] = round(slot_wait, 3)
+            if pdf_export:
+                conversion_result['timings'].update(pdf_export[1])
+            if conversion_cache and conversion_result['success'] and not conversion_result['error']:
+                conversion_cache.put(cache_key, temp_folder_path, conversion_result)
+        
+        timings = conversion_result['timings']
+        timings['upload'] = round(upload.get('upload_seconds', 0.0), 3)
+        timings['total'] = round(timings['upload'] + time.time() - conversion_start, 3)
+        observe_timings(timings)
+        
+        if not conversion_result['success']:
+            conversions.inc(outcome='failed')
+            file_manager.cleanup_folder(temp_folder_path)
+            return None, conversion_result['error']
+        
+        if cache_hit:
+            conversions.inc(outcome='cache_hit')
+        else:
+            conversions.inc(outcome='converted' if not conversion_result['error'] else 'pdf_only')
+            output_bytes.inc(conversion_result.get('bytes_written', 0), source='conversion')
+            pages_rendered.inc(len(conversion_result['image_files']), mode='eager')
+        
+        requested_pages = select_pages(page_ranges, conversion_result['total_pages'])
+        
+        # 記錄 PDF 與解析度，未渲染的頁面可在下載時按需產生
+        converter.write_render_manifest(
+            temp_folder_path, conversion_result['pdf_file'], conversion_result['total_pages'], params['dpi'],
+            params['widths'], params['encoding'], requested_pages
+        )
+        
+        # 只重新計算這個資料夾的大小，不掃描整個臨時目錄
+        file_manager.update_folder_size(temp_folder_path)
+        
+        file_manager.schedule_cleanup(temp_folder_path, 20)
+        
+        extension = image_extension(params['encoding'])
+        return {
+            'total_pages': conversion_result['total_pages'],
+            'pdf_download_url': f'/download/{temp_folder_name}/{conversion_result["pdf_file"]}',
+            'zip_download_url': f'/download/{temp_folder_name}.zip',
+            # lazy 模式下連結指向尚未產生的圖片，第一次下載時渲染
+            'image_download_urls': [
+                f'/download/{temp_folder_name}/{page_filename(page, extension=extension)}'
+                for page in requested_pages
+            ],
+            'variant_download_urls': {
+                str(width): [
+                    f'/download/{temp_folder_name}/{page_filename(page, width, extension)}'
+                    for page in requested_pages
+                ]
+                for width in params['widths']
+            },
+            'rendered_pages': [parse_page_filename(img) for img in conversion_result['image_files']],
+            'temp_folder': temp_folder_name,
+            'cleanup_scheduled': '20 minutes from request time',
+            'conversion_params': params,
+            'cache_hit': cache_hit,
+            'file_sha256': upload['sha256'],
+            'timings': timings
+        }, None
+    
+    @app.route('/convert', methods=['POST'])
+    def convert_pptx():
+        """
+        API 端點：轉換 PPTX 檔案
+        """
+        request_time = datetime.now()
+        
+        error_response = check_storage()
+        if error_response:
+            return error_response
+        
+        # 佇列已滿時在讀取上傳內容前拒絕，讀取表單參數就會解析整個 multipart 內容
+        ticket, error_response = admit_request()
+        if error_response:
+            return error_response
+        
+        params, error_response = read_conversion_params()
+        if error_response:
+            if ticket:
+                ticket.release()
+            return error_response
+        
+        upload = None
+        try:
+            upload, error_response = receive_upload()
+            if error_response:
+                return error_response
             
-            file_manager.schedule_cleanup(temp_folder_path, 20)
+            result_data, error = run_conversion(upload, params, ticket)
+            if error:
+                return jsonify({'error': error}), 500
             
             done_time = datetime.now()
             
             response_data = {
                 'request_time': request_time.isoformat(),
                 'done_time': done_time.isoformat(),
-                'total_pages': conversion_result['total_pages'],
-                'pdf_download_url': f'/download/{temp_folder_name}/{conversion_result["pdf_file"]}',
-                'image_download_urls': [
-                    f'/download/{temp_folder_name}/{img}' for img in conversion_result['image_files']
-                ],
-                'temp_folder': temp_folder_name,
-                'cleanup_scheduled': '20 minutes from request time',
-                'conversion_params': {
-                    'dpi': dpi,
-                    'include_hidden_slides': include_hidden_slides
-                },
+                **result_data,
                 'storage_info': file_manager.get_cleanup_status()
             }
             
             return jsonify(response_data), 200
             
         except Exception as e:
-            if 'temp_folder_path' in locals():
-                file_manager.cleanup_folder(temp_folder_path)
+            if upload:
+                file_manager.cleanup_folder(upload['temp_folder_path'])
             return jsonify({'error': f'處理過程中發生錯誤: {str(e)}'}), 500
+        finally:
+            if ticket:
+                ticket.release()
+    
+    if batch_scheduler is not None:
+        def release_decks(decks):
+            for deck in decks:
+                if deck.get('upload'):
+                    file_manager.cleanup_folder(deck['upload']['temp_folder_path'])
+        
+        def extract_archive(file, decks):
+            """
+            將 ZIP 中的 PPTX 逐一解壓到各自的臨時資料夾
+            寫入任何檔案前先依中央目錄檢查項目數、壓縮比與宣告大小；
+            宣告大小可能被竄改，寫入時再依實際 bytes 限制每個檔案
+            """
+            max_file_bytes = Config.MAX_CONTENT_LENGTH
+            with zipfile.ZipFile(file.stream) as archive:
+                infos = archive.infolist()
+                if len(infos) > Config.BATCH_ZIP_MAX_MEMBERS:
+                    raise UploadRejected(413, f'ZIP 最多 {Config.BATCH_ZIP_MAX_MEMBERS} 個項目')
+                
+                members = [
+                    info for info in infos
+                    if not info.is_dir() and info.filename.lower().endswith('.pptx')
+                    and not info.filename.startswith('__MACOSX/')
+                ]
+                if len(decks) + len(members) > Config.BATCH_MAX_FILES:
+                    raise ValueError(f'批次最多 {Config.BATCH_MAX_FILES} 個檔案')
+                for info in members:
+                    if info.file_size > max_file_bytes:
+                        raise UploadRejected(413, f'{info.filename} 超過大小限制 {max_file_bytes / (1024 * 1024):.1f}MB')
+                    if info.file_size > max(info.compress_size, 1) * Config.BATCH_ZIP_MAX_RATIO:
+                        raise UploadRejected(413, f'{info.filename} 的壓縮比超過 {Config.BATCH_ZIP_MAX_RATIO:g} 倍')
+                remaining_bytes = file_manager.max_size_bytes - file_manager.get_total_temp_size()[0]
+                if sum(info.file_size for info in members) > remaining_bytes:
+                    raise UploadRejected(507, '儲存空間不足，無法解壓縮所有檔案')
+                
+                for info in members:
+                    remaining_bytes = file_manager.max_size_bytes - file_manager.get_total_temp_size()[0]
+                    if remaining_bytes <= 0:
+                        raise UploadRejected(507, '儲存空間不足，無法解壓縮所有檔案')
+                    
+                    temp_folder_name, temp_folder_path = file_manager.create_temp_folder()
+                    pptx_path = os.path.join(temp_folder_path, f"input_{int(time.time() * 1000)}.pptx")
+                    upload_start = time.time()
+                    try:
+                        with archive.open(info) as source:
+                            size_bytes, file_hash = file_manager.save_stream(
+                                source, pptx_path, max_bytes=min(max_file_bytes, remaining_bytes)
+                            )
+                    except UploadRejected as e:
+                        file_manager.cleanup_folder(temp_folder_path)
+                        if e.code == 413 and remaining_bytes < max_file_bytes:
+                            raise UploadRejected(507, '儲存空間不足，無法解壓縮所有檔案')
+                        raise
+                    except Exception:
+                        file_manager.cleanup_folder(temp_folder_path)
+                        raise
+                    upload = {
+                        'temp_folder_name': temp_folder_name,
+                        'temp_folder_path': temp_folder_path,
+                        'pptx_path': pptx_path,
+                        'size_bytes': size_bytes,
+                        'sha256': file_hash,
+                        'upload_seconds': time.time() - upload_start
+                    }
+                    decks.append({'filename': info.filename, 'upload': upload})
+                    with open(pptx_path, 'rb') as f:
+                        if f.read(len(ZIP_SIGNATURE)) != ZIP_SIGNATURE:
+                            decks[-1]['error'] = '檔案內容不是有效的 PPTX（ZIP）格式'
+        
+        def collect_batch_decks():
+            """
+            讀取批次上傳：files 欄位可重複，每個檔案為 PPTX 或包含 PPTX 的 ZIP
+            
+            Returns:
+                tuple: (decks: list | None, error_response: tuple | None)
+            """
+            files = request.files.getlist('files') + request.files.getlist('file')
+            if not files:
+                return None, (jsonify({'error': '沒有檔案上傳'}), 400)
+            
+            decks = []
+            try:
+                for file in files:
+                    name = file.filename or ''
+                    if name.lower().endswith('.pptx'):
+                        if len(decks) >= Config.BATCH_MAX_FILES:
+                            raise ValueError(f'批次最多 {Config.BATCH_MAX_FILES} 個檔案')
+                        decks.append({'filename': name, 'upload': store_upload(file)})
+                    elif name.lower().endswith('.zip'):
+                        extract_archive(file, decks)
+                    else:
+                        raise ValueError(f'檔案必須是 PPTX 或 ZIP 格式: {name}')
+            except (ValueError, zipfile.BadZipFile) as e:
+                release_decks(decks)
+                return None, (jsonify({'error': f'參數錯誤: {str(e)}'}), 400)
+            except Exception:
+                release_decks(decks)
+                raise
+            
+            if not decks:
+                return None, (jsonify({'error': 'ZIP 檔案中沒有 PPTX'}), 400)
+            return decks, None
+        
+        def plan_batch_groups(decks):
+            """
+            將小型簡報分組，每組以一次 LibreOffice 執行產生 PDF
+            常駐實例池執行中時沒有啟動成本，每份簡報各自一組
+            """
+            group_size = Config.BATCH_GROUP_SIZE
+            if converter.office_pool is not None and converter.office_pool.running:
+                group_size = 1
+            max_group_bytes = Config.BATCH_GROUP_MAX_MB * 1024 * 1024
+            
+            groups, current = [], []
+            for deck in decks:
+                if group_size == 1 or deck['upload']['size_bytes'] > max_group_bytes:
+                    groups.append([deck])
+                    continue
+                current.append(deck)
+                if len(current) == group_size:
+                    groups.append(current)
+                    current = []
+            if current:
+                groups.append(current)
+            return groups
+        
+        def failed_deck_line(deck, error):
+            """無法轉換的簡報的 NDJSON 結果列"""
+            return {
+                'type': 'deck',
+                'index': deck['index'],
+                'filename': deck['filename'],
+                'file_sha256': deck['upload']['sha256'],
+                'status': 'failed',
+                'error': error
+            }
+        
+        def convert_deck(deck, params, pdf_export=None):
+            """轉換一份簡報並產生 NDJSON 結果列"""
+            ticket = conversion_queue.reserve() if conversion_queue and pdf_export is None else None
+            try:
+                result_data, error = run_conversion(deck['upload'], params, ticket, pdf_export=pdf_export)
+            except Exception as e:
+                file_manager.cleanup_folder(deck['upload']['temp_folder_path'])
+                result_data, error = None, f'處理過程中發生錯誤: {str(e)}'
+            finally:
+                if ticket:
+                    ticket.release()
+            return {
+                'type': 'deck',
+                'index': deck['index'],
+                'filename': deck['filename'],
+                'file_sha256': deck['upload']['sha256'],
+                'status': 'failed' if error else 'done',
+                'error': error,
+                **(result_data or {})
+            }
+        
+        def convert_group(group, params):
+            """
+            在批次工作執行緒中轉換一組簡報，回傳各簡報的結果列
+            發生非預期錯誤時該簡報標記為失敗，每份簡報都一定有結果列
+            """
+            pdf_exports = {}
+            export_error = None
+            try:
+                # 已有快取的簡報不需要產生 PDF
+                exportable = [
+                    deck for deck in group
+                    if not (conversion_cache and conversion_cache.contains(conversion_cache_key(deck['upload'], params)))
+                ]
+                if len(exportable) > 1:
+                    ticket = conversion_queue.reserve() if conversion_queue else None
+                    try:
+                        with (ticket.slot() if ticket else nullcontext(0.0)) as slot_wait:
+                            exported = converter.export_pdfs([
+                                (deck['upload']['pptx_path'], deck['upload']['temp_folder_path'],
+                                 params['include_hidden_slides'])
+                                for deck in exportable
+                            ])
+                    finally:
+                        if ticket:
+                            ticket.release()
+                    for deck, (pdf_file, timings) in zip(exportable, exported):
+                        # 產生失敗的簡報改為個別轉換
+                        if pdf_file:
+                            pdf_exports[deck['index']] = (pdf_file, {**timings, 'slot_wait': round(slot_wait, 3)})
+            except Exception as e:
+                # 合併產生 PDF 失敗時每份簡報改為個別轉換
+                batch_export_failures.inc()
+                export_error = f'合併產生 PDF 失敗，已改為個別轉換: {str(e)}'
+                pdf_exports = {}
+            
+            lines = []
+            for deck in group:
+                try:
+                    line = convert_deck(deck, params, pdf_exports.get(deck['index']))
+                except Exception as e:
+                    release_decks([deck])
+                    line = failed_deck_line(deck, f'處理過程中發生錯誤: {str(e)}')
+                if export_error:
+                    line['group_export_error'] = export_error
+                lines.append(line)
+            return lines
+        
+        @app.route('/convert/batch', methods=['POST'])
+        def convert_batch():
+            """
+            API 端點：批次轉換多個 PPTX（或 ZIP 中的 PPTX），以 NDJSON 逐份回傳完成的結果
+            相同內容的檔案只轉換一次；所有批次共用工作執行緒並輪流處理
+            """
+            batch_start = time.time()
+            
+            error_response = check_storage()
+            if error_response:
+                return error_response
+            
+            # 佇列已滿時在讀取上傳內容前拒絕；批次的轉換由排程器限制數量，
+            # 這個名額只在接收上傳期間保留
+            ticket, error_response = admit_request()
+            if error_response:
+                return error_response
+            try:
+                params, error_response = read_conversion_params()
+                if error_response:
+                    return error_response
+                
+                decks, error_response = collect_batch_decks()
+                if error_response:
+                    return error_response
+            finally:
+                if ticket:
+                    ticket.release()
+            
+            # 依雜湊去除重複的檔案，重複的檔案沿用第一份的結果
+            primaries, duplicates, invalid = {}, {}, []
+            for index, deck in enumerate(decks):
+                deck['index'] = index
+                if deck.get('error'):
+                    invalid.append(deck)
+                    continue
+                primary = primaries.setdefault(deck['upload']['sha256'], deck)
+                if primary is not deck:
+                    duplicates.setdefault(primary['index'], []).append(deck)
+            release_decks(invalid + [deck for group in duplicates.values() for deck in group])
+            
+            groups = plan_batch_groups(list(primaries.values()))
+            batch = batch_scheduler.submit([partial(convert_group, group, params) for group in groups])
+            
+            def generate():
+                counts = {'done': 0, 'failed': 0}
+                
+                def emit(line):
+                    counts[line['status']] += 1
+                    return json.dumps(line) + '\n'
+                
+                def emit_with_duplicates(line):
+                    yield emit(line)
+                    for duplicate in duplicates.get(line['index'], []):
+                        yield emit({
+                            **line,
+                            'index': duplicate['index'],
+                            'filename': duplicate['filename'],
+                            'duplicate_of': line['index']
+                        })
+                
+                try:
+                    for deck in invalid:
+                        yield emit(failed_deck_line(deck, deck['error']))
+                    
+                    reported = set()
+                    task_errors = []
+                    for lines in batch.results():
+                        if isinstance(lines, Exception):
+                            task_errors.append(str(lines))
+                            continue
+                        for line in lines:
+                            reported.add(line['index'])
+                            yield from emit_with_duplicates(line)
+                    
+                    if not batch.cancelled:
+                        # convert_group 拋出例外時無法得知是哪一組，所有沒有結果的簡報都標記為失敗
+                        error = f"處理過程中發生錯誤: {'; '.join(task_errors) or '未知錯誤'}"
+                        for deck in primaries.values():
+                            if deck['index'] not in reported:
+                                release_decks([deck])
+                                yield from emit_with_duplicates(failed_deck_line(deck, error))
+                finally:
+                    # 客戶端中斷連線時不再轉換尚未開始的簡報
+                    for task in batch_scheduler.cancel(batch):
+                        release_decks(task.args[0])
+                
+                yield json.dumps({
+                    'type': 'summary',
+                    'total': len(decks),
+                    'unique': len(primaries),
+                    'duplicates': len(decks) - len(primaries) - len(invalid),
+                    'groups': len(groups),
+                    'succeeded': counts['done'],
+                    'failed': counts['failed'],
+                    'seconds': round(time.time() - batch_start, 3)
+                }) + '\n'
+            
+            response = Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+            response.headers['Cache-Control'] = 'no-cache'
+            response.headers['X-Accel-Buffering'] = 'no'
+            return response
+    
+    # 多節點模式下工作狀態存放在共用目錄，介面與 JobManager 相同
+    jobs = spool if spool is not None else job_manager
+    
+    if jobs is not None:
+        def format_job(job):
+            """將工作狀態轉換為 API 回應格式"""
+            def to_iso(timestamp):
+                return datetime.fromtimestamp(timestamp).isoformat() if timestamp else None
+            
+            return {
+                'job_id': job['id'],
+                'status': job['status'],
+                'temp_folder': job.get('temp_folder'),
+                'created_at': to_iso(job['created_at']),
+                'started_at': to_iso(job['started_at']),
+                'finished_at': to_iso(job['finished_at']),
+                'timings': job['timings'],
+                'result': job['result'],
+                'error': job['error']
+            }
+        
+        @app.route('/jobs', methods=['POST'])
+        def submit_job():
+            """
+            API 端點：提交非同步轉換工作，立即回傳工作 ID
+            """
+            error_response = check_storage()
+            if error_response:
+                return error_response
+            
+            # 多節點模式下由工作節點轉換，不佔用本機的轉換佇列
+            ticket = None
+            if spool is None:
+                # 佇列已滿時在讀取上傳內容前拒絕
+                ticket, error_response = admit_request()
+                if error_response:
+                    return error_response
+            
+            params, error_response = read_conversion_params()
+            if error_response:
+                if ticket:
+                    ticket.release()
+                return error_response
+            
+            if spool is not None:
+                return submit_spooled_job(params)
+            
+            upload = None
+            try:
+                upload, error_response = receive_upload()
+                if error_response:
+                    if ticket:
+                        ticket.release()
+                    return error_response
+            except Exception as e:
+                if ticket:
+                    ticket.release()
+                if upload:
+                    file_manager.cleanup_folder(upload['temp_folder_path'])
+                return jsonify({'error': f'處理過程中發生錯誤: {str(e)}'}), 500
+            
+            def task(job):
+                stage_duration.observe(time.time() - job['created_at'], stage='job_queue_wait')
+                try:
+                    result_data, error = run_conversion(
+                        upload, params, ticket,
+                        progress_callback=lambda event: job_manager.publish(job['id'], event)
+                    )
+                except Exception:
+                    file_manager.cleanup_folder(upload['temp_folder_path'])
+                    raise
+                finally:
+                    if ticket:
+                        ticket.release()
+                if error:
+                    raise RuntimeError(error)
+                return result_data
+            
+            job_id = job_manager.submit(task, temp_folder=upload['temp_folder_name'])
+            
+            return jsonify({
+                'job_id': job_id,
+                'status': job_manager.STATUS_QUEUED,
+                'status_url': f'/jobs/{job_id}',
+                'temp_folder': upload['temp_folder_name']
+            }), 202
+        
+        def submit_spooled_job(params):
+            """將上傳檔案與參數寫入共用目錄，由任一工作節點認領轉換"""
+            upload = None
+            try:
+                upload, error_response = receive_upload()
+                if error_response:
+                    return error_response
+                job_id = spool.submit(upload['pptx_path'], params, {
+                    'size_bytes': upload['size_bytes'],
+                    'sha256': upload['sha256'],
+                    'upload_seconds': upload['upload_seconds']
+                })
+            except Exception as e:
+                return jsonify({'error': f'處理過程中發生錯誤: {str(e)}'}), 500
+            finally:
+                if upload:
+                    file_manager.cleanup_folder(upload['temp_folder_path'])
+            
+            # 結果資料夾由認領的工作節點建立，完成後出現在工作狀態中
+            return jsonify({
+                'job_id': job_id,
+                'status': spool.STATUS_QUEUED,
+                'status_url': f'/jobs/{job_id}',
+                'temp_folder': None
+            }), 202
+        
+        @app.route('/jobs/<job_id>')
+        def get_job(job_id):
+            """
+            查詢工作狀態，可用 ?wait=秒數 等待工作完成
+            """
+            wait_seconds = request.args.get('wait', type=float)
+            if wait_seconds and wait_seconds > 0:
+                job = jobs.wait(job_id, min(wait_seconds, Config.JOB_MAX_WAIT_SECONDS))
+            else:
+                job = jobs.get(job_id)
+            
+            if job is None:
+                return jsonify({'error': '工作不存在或已過期'}), 404
+            
+            return jsonify(format_job(job)), 200
+        
+        @app.route('/jobs/<job_id>/events')
+        def job_events(job_id):
+            """
+            以 Server-Sent Events 即時推送工作進度
+            事件類型：status（queued/running/done/failed）、stage（各階段開始/完成）、page（第 N/M 頁完成）
+            """
+            if jobs.get(job_id) is None:
+                return jsonify({'error': '工作不存在或已過期'}), 404
+            
+            # 斷線重連時從 Last-Event-ID 之後繼續
+            try:
+                cursor = int(request.headers.get('Last-Event-ID', -1)) + 1
+            except ValueError:
+                cursor = 0
+            
+            def generate():
+                nonlocal cursor
+                while True:
+                    waited = jobs.wait_events(job_id, cursor, timeout=15)
+                    if waited is None:
+                        break
+                    events, finished = waited
+                    if not events:
+                        if finished:
+                            break
+                        # 保持連線，避免代理伺服器因閒置中斷
+                        yield ': keepalive\n\n'
+                        continue
+                    for event in events:
+                        yield f"id: {cursor}\nevent: {event['type']}\ndata: {json.dumps(event)}\n\n"
+                        cursor += 1
+                    if finished:
+                        break
+            
+            response = Response(stream_with_context(generate()), mimetype='text/event-stream')
+            response.headers['Cache-Control'] = 'no-cache'
+            response.headers['X-Accel-Buffering'] = 'no'
+            return response
+    
+    if spool is not None and spool.workers > 0:
+        def process_spooled_job(job, input_path, progress_callback):
+            """
+            在本節點執行共用佇列中的工作
+            
+            Returns:
+                tuple: (結果字典, 本機結果資料夾路徑)，資料夾由 Spool 移入共用目錄
+            """
+            stage_duration.observe(time.time() - job['created_at'], stage='job_queue_wait')
+            temp_folder_name, temp_folder_path = file_manager.create_temp_folder()
+            try:
+                # LibreOffice 讀取本機磁碟的副本，不直接讀取共用目錄
+                pptx_path = os.path.join(temp_folder_path, f"input_{int(time.time() * 1000)}.pptx")
+                shutil.copyfile(input_path, pptx_path)
+                file_manager.record_bytes(temp_folder_path, job['upload']['size_bytes'])
+                upload = {
+                    'temp_folder_name': temp_folder_name,
+                    'temp_folder_path': temp_folder_path,
+                    'pptx_path': pptx_path,
+                    **job['upload']
+                }
+                result_data, error = run_conversion(upload, job['params'], progress_callback=progress_callback)
+            except Exception:
+                file_manager.cleanup_folder(temp_folder_path)
+                raise
+            if error:
+                raise RuntimeError(error)
+            return result_data, temp_folder_path
+        
+        spool.start_workers(process_spooled_job, forget_folder=file_manager.cleanup_folder)
+    
+    if inspector is not None:
+        @app.route('/inspect', methods=['GET', 'POST'])
+        def inspect_pptx():
+            """
+            API 端點：讀取簡報摘要，不執行轉換
+            POST 上傳檔案；GET 以 ?sha256= 查詢先前檢查過的檔案
+            """
+            if request.method == 'GET':
+                file_hash = request.args.get('sha256', '').lower()
+                if not file_hash:
+                    return jsonify({'error': '缺少 sha256 參數'}), 400
+                manifest = inspector.get(file_hash)
+                cache_lookups.inc(cache='inspect', result='hit' if manifest is not None else 'miss')
+                if manifest is None:
+                    return jsonify({'error': '尚未檢查過此檔案，請以 POST 上傳'}), 404
+                return jsonify({**manifest, 'cache_hit': True}), 200
+            
+            if 'file' not in request.files:
+                return jsonify({'error': '沒有檔案上傳'}), 400
+            
+            file = request.files['file']
+            if not file.filename or not file.filename.lower().endswith('.pptx'):
+                return jsonify({'error': '檔案必須是 PPTX 格式'}), 400
+            
+            stream = file.stream
+            if isinstance(stream, StreamedUpload):
+                # 上傳時已計算雜湊，檔案在請求結束時清理
+                size_bytes, file_hash = stream.size_bytes, stream.sha256
+            else:
+                digest = hashlib.sha256()
+                size_bytes = 0
+                for chunk in iter(lambda: stream.read(1024 * 1024), b''):
+                    digest.update(chunk)
+                    size_bytes += len(chunk)
+                stream.seek(0)
+                file_hash = digest.hexdigest()
+            
+            try:
+                manifest, cache_hit = inspector.inspect(stream, file_hash)
+            except (zipfile.BadZipFile, KeyError, ValueError) as e:
+                return jsonify({'error': f'無法讀取 PPTX 檔案: {str(e)}'}), 400
+            except Exception as e:
+                return jsonify({'error': f'處理過程中發生錯誤: {str(e)}'}), 500
+            
+            cache_lookups.inc(cache='inspect', result='hit' if cache_hit else 'miss')
+            return jsonify({**manifest, 'file_size_bytes': size_bytes, 'cache_hit': cache_hit}), 200
+    
+    def resolve_folder(folder_name):
+        """
+        取得結果資料夾路徑：本機臨時資料夾優先，其次是其他節點寫回共用目錄的結果
+        
+        Returns:
+            tuple: (folder_path: str, is_local: bool)
+        """
+        folder_path = os.path.join(file_manager.temp_base_dir, folder_name)
+        if spool is not None and not os.path.isdir(folder_path):
+            spool_path = spool.result_path(folder_name)
+            if os.path.isdir(spool_path):
+                return spool_path, False
+        return folder_path, True
+    
+    def render_on_demand(folder_path, page_number):
+        """
+        按需渲染頁面並記錄渲染時間與寫入大小
+        
+        Returns:
+            tuple: 與 converter.render_page 相同
+        """
+        stats = {}
+        start = time.time()
+        success, render_result, rendered = converter.render_page(folder_path, page_number, stats=stats)
+        if rendered:
+            stage_duration.observe(time.time() - start, stage='on_demand_render')
+            output_bytes.inc(stats.get('bytes_written', 0), source='on_demand')
+            pages_rendered.inc(mode='on_demand')
+        return success, render_result, rendered
+    
+    def send_output_file(folder_name, filename, file_path, is_local=True):
+        """
+        傳送轉換結果，附帶內容雜湊 ETag 與長效快取標頭
+        X-Accel-Redirect 模式下只回應標頭，檔案內容與 Range 由 nginx 處理（僅限本機臨時資料夾）
+        """
+        etag = file_manager.get_file_etag(file_path)
+        
+        if Config.DOWNLOAD_ACCEL_REDIRECT and is_local:
+            if request.if_none_match.contains(etag):
+                response = app.response_class(status=304)
+            else:
+                response = app.response_class(
+                    mimetype=mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+                )
+                response.headers['X-Accel-Redirect'] = (
+                    f"{Config.DOWNLOAD_ACCEL_PREFIX.rstrip('/')}/{quote(folder_name)}/{quote(filename)}"
+                )
+                response.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+            response.set_etag(etag)
+        else:
+            # conditional 處理 If-None-Match（304）與 Range（206）
+            response = send_file(
+                file_path,
+                as_attachment=True,
+                etag=etag,
+                conditional=True,
+                max_age=Config.DOWNLOAD_CACHE_MAX_AGE
+            )
+        
+        # 同一個網址的內容在清理前不會改變
+        response.cache_control.public = True
+        response.cache_control.max_age = Config.DOWNLOAD_CACHE_MAX_AGE
+        response.cache_control.immutable = True
+        return response
     
     @app.route('/download/<folder_name>/<filename>')
     def download_file(folder_name, filename):
@@ -104,22 +1044,75 @@ def create_routes(app, converter, file_manager):
         下載檔案端點
         """
         try:
-            file_path = os.path.join(file_manager.temp_base_dir, folder_name, filename)
+            folder_path, is_local = resolve_folder(folder_name)
+            file_path = os.path.join(folder_path, filename)
             
             if not os.path.exists(file_path):
-                return jsonify({'error': '檔案不存在或已被清理'}), 404
+                # 轉換時未要求的頁面在第一次下載時才渲染
+                page_number = parse_page_filename(filename)
+                if page_number is None or not os.path.isdir(folder_path):
+                    return jsonify({'error': '檔案不存在或已被清理'}), 404
+                success, render_result, rendered = render_on_demand(folder_path, page_number)
+                if not success:
+                    # 只有頁碼超出範圍才是 404，渲染失敗是伺服器錯誤，不可被快取為不存在
+                    return jsonify({'error': render_result}), 404 if render_result == PAGE_NOT_FOUND else 500
+                if rendered and is_local:
+                    # 同一次渲染會產生所有縮小版本，重新計算此資料夾大小
+                    file_manager.update_folder_size(folder_path)
+                if not os.path.exists(file_path):
+                    # 檔名的格式與轉換時指定的格式不同
+                    return jsonify({'error': '檔案不存在或已被清理'}), 404
             
-            return send_file(file_path, as_attachment=True)
+            return send_output_file(folder_name, filename, file_path, is_local)
             
         except Exception as e:
             return jsonify({'error': f'下載失敗: {str(e)}'}), 500
     
+    @app.route('/download/<folder_name>.zip')
+    def download_zip(folder_name):
+        """
+        以串流 ZIP 一次下載 PDF 與所有頁面圖片
+        lazy 模式下尚未產生的頁面在開始回應前先渲染，渲染失敗時回應錯誤而不是中途截斷的 ZIP
+        """
+        folder_path, is_local = resolve_folder(folder_name)
+        manifest = converter.read_render_manifest(folder_path)
+        if manifest is None:
+            return jsonify({'error': '資料夾不存在或已被清理'}), 404
+        
+        extension = image_extension(manifest['encoding'])
+        
+        rendered_any = False
+        for page in manifest['pages']:
+            if os.path.exists(os.path.join(folder_path, page_filename(page, extension=extension))):
+                continue
+            success, render_result, rendered = render_on_demand(folder_path, page)
+            if not success:
+                if render_result == PAGE_NOT_FOUND:
+                    return jsonify({'error': '資料夾不存在或已被清理'}), 404
+                return jsonify({'error': render_result}), 500
+            rendered_any = rendered_any or rendered
+        if rendered_any and is_local:
+            file_manager.update_folder_size(folder_path)
+        
+        def entries():
+            yield os.path.join(folder_path, manifest['pdf_file']), manifest['pdf_file']
+            for page in manifest['pages']:
+                filename = page_filename(page, extension=extension)
+                yield os.path.join(folder_path, filename), filename
+                for width in manifest['variant_widths']:
+                    variant = page_filename(page, width, extension)
+                    yield os.path.join(folder_path, variant), variant
+        
+        response = Response(stream_with_context(stream_zip(entries())), mimetype='application/zip')
+        response.headers['Content-Disposition'] = f'attachment; filename="{folder_name}.zip"'
+        return response
+    
     @app.route('/status/<folder_name>')
     def check_status(folder_name):
         """
         檢查臨時資料夾狀態
         """
-        folder_path = os.path.join(file_manager.temp_base_dir, folder_name)
+        folder_path, _ = resolve_folder(folder_name)
         
         if not os.path.exists(folder_path):
             return jsonify({
@@ -131,7 +1124,7 @@ def create_routes(app, converter, file_manager):
         try:
             files = os.listdir(folder_path)
             pdf_files = [f for f in files if f.endswith('.pdf')]
-            image_files = [f for f in files if f.endswith(('.jpg', '.jpeg', '.png'))]
+            image_files = [f for f in files if f.endswith(('.jpg', '.jpeg', '.png', '.webp', '.avif'))]
             
             return jsonify({
                 'exists': True,
@@ -139,7 +1132,7 @@ def create_routes(app, converter, file_manager):
                 'pdf_files': pdf_files,
                 'image_files': image_files,
                 'total_files': len(files),
-                'cleanup_scheduled': folder_path in file_manager.cleanup_tasks,
+                'cleanup_scheduled': file_manager.is_cleanup_scheduled(folder_path),
                 'folder_size_bytes': file_manager.get_directory_size(folder_path)
             }), 200
             
@@ -209,7 +1202,8 @@ def create_routes(app, converter, file_manager):
             info.update({
                 'storage_available': available,
                 'warning': current_size_gb > max_size_gb * 0.8,  # 80% 警告
-                'critical': not available
+                'critical': not available,
+                'cache': conversion_cache.get_stats() if conversion_cache else {'enabled': False}
             })
             
             return jsonify(info), 200
@@ -217,6 +1211,44 @@ def create_routes(app, converter, file_manager):
         except Exception as e:
             return jsonify({'error': f'無法取得儲存資訊: {str(e)}'}), 500
     
+    if metrics is not None:
+        def collect_component_status(registry):
+            """抓取時讀取佇列、儲存空間、快取與工作的目前狀態"""
+            _, current_size_gb, max_size_gb = file_manager.is_storage_available()
+            registry.gauge('storage_used_bytes', '臨時資料夾使用量（bytes）').set(
+                int(current_size_gb * 1024 * 1024 * 1024)
+            )
+            registry.gauge('storage_limit_bytes', '臨時資料夾容量上限（bytes）').set(
+                int(max_size_gb * 1024 * 1024 * 1024)
+            )
+            if conversion_queue:
+                queue_status = conversion_queue.get_status()
+                # 每個程序各有自己的轉換佇列
+                queue_gauge = registry.gauge('queue_requests', '轉換佇列中的請求數', ('state',), per_process=True)
+                queue_gauge.set(queue_status['waiting'], state='waiting')
+                queue_gauge.set(queue_status['running'], state='running')
+                registry.gauge('queue_avg_wait_seconds', '近期平均等待轉換名額秒數', per_process=True).set(
+                    queue_status['avg_wait_seconds']
+                )
+            if conversion_cache:
+                cache_stats = conversion_cache.get_stats()
+                registry.gauge('cache_entries', '轉換快取項目數').set(cache_stats['entries'])
+                registry.gauge('cache_size_bytes', '轉換快取大小（bytes）').set(cache_stats['size_bytes'])
+            if jobs:
+                job_status = jobs.get_status()
+                job_gauge = registry.gauge('jobs', '保留中的非同步工作數', ('status',))
+                for status in (jobs.STATUS_QUEUED, jobs.STATUS_RUNNING, jobs.STATUS_DONE, jobs.STATUS_FAILED):
+                    job_gauge.set(job_status[status], status=status)
+        
+        metrics.add_collector(collect_component_status)
+        
+        @app.route('/metrics')
+        def metrics_endpoint():
+            """
+            Prometheus 監控指標（文字格式）
+            """
+            return Response(metrics.render(), content_type=METRICS_CONTENT_TYPE)
+    
     @app.route('/health')
     def health_check():
         """
@@ -228,13 +1260,19 @@ def create_routes(app, converter, file_manager):
             return jsonify({
                 'status': 'healthy' if storage_available else 'storage_full',
                 'libreoffice_available': converter.is_libreoffice_available(),
+                'office_pool': converter.office_pool.get_status() if converter.office_pool else {'enabled': False},
+                'profile_pool': converter.profile_pool.get_status() if converter.profile_pool else None,
                 'storage_info': {
                     'available': storage_available,
                     'current_size_gb': round(current_size_gb, 2),
                     'max_size_gb': round(max_size_gb, 2),
                     'usage_percentage': round((current_size_gb / max_size_gb) * 100, 1)
                 },
-                'temp_folders': len(file_manager.cleanup_tasks),
+                'temp_folders': file_manager.scheduled_cleanup_count(),
+                'jobs': jobs.get_status() if jobs else None,
+                'queue': conversion_queue.get_status() if conversion_queue else None,
+                'batch': batch_scheduler.get_status() if batch_scheduler else None,
+                'inspector': inspector.get_stats() if inspector else None,
                 'timestamp': datetime.now().isoformat()
             }), 200
             
@@ -0,0 +1,484 @@
+"""
+共用佇列目錄模組
+API 節點將非同步工作寫入共用目錄（例如 NFS 或共用磁碟區），工作節點以原子性 rename 認領工作，
+並定期更新租約檔案的修改時間維持所有權；節點失聯時租約逾期，工作回到佇列由其他節點重新執行。
+轉換結果與工作狀態同樣寫回共用目錄，任一 API 節點都能回應 /jobs、/download 與 /status
+"""
+import json
+import os
+import shutil
+import socket
+import threading
+import time
+import uuid
+
+# 共用目錄結構
+QUEUE_DIR = 'queue'      # 等待認領的工作：<job_id>.json
+LEASES_DIR = 'leases'    # 已認領的工作：<job_id>.<token>.json，修改時間為最後一次續約
+INPUTS_DIR = 'inputs'    # 上傳的簡報：<job_id>/input.pptx
+STATUS_DIR = 'status'    # 工作狀態：<job_id>.json
+EVENTS_DIR = 'events'    # 進度事件：<job_id>.jsonl
+RESULTS_DIR = 'results'  # 轉換結果：<temp_folder>/
+TMP_DIR = 'tmp'          # 寫入中的檔案與待刪除的項目，與其他目錄位於同一檔案系統才能原子性 rename
+
+_STALE_TMP_SECONDS = 3600
+
+
+class Spool:
+    STATUS_QUEUED = 'queued'
+    STATUS_RUNNING = 'running'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+
+    def __init__(self, root, lease_seconds=60, max_attempts=3, retention_minutes=20, poll_interval=1.0,
+                 workers=0):
+        """
+        Args:
+            root (str): 所有節點共用的目錄
+            lease_seconds (int): 租約有效秒數，工作節點每三分之一的時間續約一次
+            max_attempts (int): 租約逾期後重新排入佇列的次數上限，避免讓節點當機的工作無限重試
+            retention_minutes (int): 工作結束後保留狀態與結果的分鐘數
+            poll_interval (float): 查詢佇列與等待工作狀態的間隔秒數
+            workers (int): 本程序認領工作的執行緒數，0 表示只提交與查詢工作
+        """
+        self.root = root
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.retention_seconds = retention_minutes * 60
+        self.poll_interval = poll_interval
+        self.workers = workers
+        self.node_name = f"{socket.gethostname()}:{os.getpid()}"
+
+        for name in (QUEUE_DIR, LEASES_DIR, INPUTS_DIR, STATUS_DIR, EVENTS_DIR, RESULTS_DIR, TMP_DIR):
+            os.makedirs(os.path.join(root, name), exist_ok=True)
+
+        self._handler = None
+        self._forget_folder = None
+        self._leases = {}  # 執行中工作的租約路徑 -> 是否仍持有
+        self._leases_lock = threading.Lock()
+        self._threads = []
+        self._shutdown = threading.Event()
+
+        maintenance_thread = threading.Thread(target=self._maintenance_loop, name='spool-maintenance', daemon=True)
+        maintenance_thread.start()
+        self._threads.append(maintenance_thread)
+
+    def _path(self, directory, name):
+        return os.path.join(self.root, directory, name)
+
+    def result_path(self, folder_name):
+        """
+        取得轉換結果資料夾在共用目錄中的路徑
+
+        Args:
+            folder_name (str): 結果中的 temp_folder
+
+        Returns:
+            str: 資料夾路徑（可能不存在）
+        """
+        return self._path(RESULTS_DIR, folder_name)
+
+    def _write_json(self, path, data):
+        """先寫入暫存檔再 rename，讀取端不會看到寫到一半的內容"""
+        temp_path = self._path(TMP_DIR, f"{uuid.uuid4().hex}.json")
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f)
+        os.replace(temp_path, path)
+
+    @staticmethod
+    def _read_json(path):
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _discard(self, path):
+        """先 rename 到暫存目錄再刪除，多個節點同時清理時只有一個會成功"""
+        trash_path = self._path(TMP_DIR, f"trash_{uuid.uuid4().hex}")
+        try:
+            os.rename(path, trash_path)
+        except OSError:
+            return False
+        if os.path.isdir(trash_path):
+            shutil.rmtree(trash_path, ignore_errors=True)
+        else:
+            os.remove(trash_path)
+        return True
+
+    def _update_status(self, job_id, **fields):
+        """
+        更新工作狀態，只由目前擁有工作的一方呼叫（提交的 API 節點、持有租約的工作節點或回收租約的節點）
+        """
+        status_path = self._path(STATUS_DIR, f"{job_id}.json")
+        record = self._read_json(status_path)
+        if record is None:
+            return None
+        record.update(fields)
+        self._write_json(status_path, record)
+        return record
+
+    def submit(self, pptx_path, params, upload):
+        """
+        將工作寫入共用目錄，上傳檔案會被移入共用目錄
+
+        Args:
+            pptx_path (str): 上傳的 PPTX 路徑
+            params (dict): 轉換參數，需可轉為 JSON
+            upload (dict): 上傳資訊（size_bytes、sha256、upload_seconds）
+
+        Returns:
+            str: 工作 ID
+        """
+        job_id = uuid.uuid4().hex
+        input_dir = self._path(INPUTS_DIR, job_id)
+        os.makedirs(input_dir)
+        shutil.move(pptx_path, os.path.join(input_dir, 'input.pptx'))
+
+        created_at = time.time()
+        self._write_json(self._path(STATUS_DIR, f"{job_id}.json"), {
+            'id': job_id,
+            'status': self.STATUS_QUEUED,
+            'created_at': created_at,
+            'started_at': None,
+            'finished_at': None,
+            'node': None,
+            'attempts': 0,
+            'timings': {},
+            'result': None,
+            'error': None,
+            'temp_folder': None
+        })
+        self.publish(job_id, {'type': 'status', 'status': self.STATUS_QUEUED})
+        # 佇列檔案最後寫入，工作節點看到時狀態與輸入都已就緒
+        self._write_json(self._path(QUEUE_DIR, f"{job_id}.json"), {
+            'id': job_id,
+            'params': params,
+            'upload': upload,
+            'created_at': created_at,
+            'attempts': 0
+        })
+        return job_id
+
+    def publish(self, job_id, event):
+        """
+        記錄工作進度事件（每行一個 JSON）
+
+        Args:
+            job_id (str): 工作 ID
+            event (dict): 事件內容，需包含 type
+        """
+        with open(self._path(EVENTS_DIR, f"{job_id}.jsonl"), 'a', encoding='utf-8') as f:
+            f.write(json.dumps(event) + '\n')
+
+    def _read_events(self, job_id, cursor):
+        try:
+            with open(self._path(EVENTS_DIR, f"{job_id}.jsonl"), 'r', encoding='utf-8') as f:
+                lines = f.read().split('\n')
+        except OSError:
+            return []
+        # 最後一段沒有換行符號表示仍在寫入，下次再讀
+        return [json.loads(line) for line in lines[:-1]][cursor:]
+
+    def get(self, job_id):
+        """
+        取得工作狀態（與 JobManager.get 相同格式）
+
+        Returns:
+            dict | None: 工作狀態，不存在時回傳 None
+        """
+        return self._read_json(self._path(STATUS_DIR, f"{job_id}.json"))
+
+    def _is_finished(self, job):
+        return job['status'] in (self.STATUS_DONE, self.STATUS_FAILED)
+
+    def wait(self, job_id, timeout):
+        """
+        等待工作完成或逾時
+
+        Returns:
+            dict | None: 工作狀態
+        """
+        deadline = time.time() + timeout
+        job = self.get(job_id)
+        while job is not None and not self._is_finished(job) and time.time() < deadline:
+            time.sleep(min(self.poll_interval, max(0.0, deadline - time.time())))
+            job = self.get(job_id)
+        return job
+
+    def wait_events(self, job_id, cursor, timeout):
+        """
+        等待新的進度事件
+
+        Returns:
+            tuple | None: (新事件清單, 工作是否已結束)，工作不存在時回傳 None
+        """
+        deadline = time.time() + timeout
+        while True:
+            job = self.get(job_id)
+            if job is None:
+                return None
+            # 先讀取狀態再讀取事件，結束事件在狀態更新前寫入
+            finished = self._is_finished(job)
+            events = self._read_events(job_id, cursor)
+            if events or finished:
+                return events, finished
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                return [], False
+            time.sleep(min(self.poll_interval, remaining))
+
+    def get_status(self):
+        """
+        取得共用佇列狀態
+
+        Returns:
+            dict: 各狀態的工作數量（所有節點），max_workers 為本程序認領工作的執行緒數
+        """
+        counts = {
+            self.STATUS_QUEUED: 0,
+            self.STATUS_RUNNING: 0,
+            self.STATUS_DONE: 0,
+            self.STATUS_FAILED: 0
+        }
+        for entry in os.scandir(os.path.join(self.root, STATUS_DIR)):
+            record = self._read_json(entry.path)
+            if record is not None:
+                counts[record['status']] = counts.get(record['status'], 0) + 1
+        return {
+            'max_workers': self.workers,
+            **counts,
+            'pending': len(os.listdir(os.path.join(self.root, QUEUE_DIR))),
+            'leased': len(os.listdir(os.path.join(self.root, LEASES_DIR)))
+        }
+
+    def claim(self):
+        """
+        認領最早排入佇列的工作
+
+        Returns:
+            tuple | None: (工作內容, 租約路徑)，佇列為空時回傳 None
+        """
+        try:
+            entries = sorted(os.scandir(os.path.join(self.root, QUEUE_DIR)), key=lambda entry: entry.stat().st_mtime)
+        except FileNotFoundError:
+            entries = []
+        for entry in entries:
+            job_id = entry.name[:-len('.json')]
+            lease_path = self._path(LEASES_DIR, f"{job_id}.{uuid.uuid4().hex}.json")
+            try:
+                # 同一個佇列檔案只有一個節點能 rename 成功
+                os.rename(entry.path, lease_path)
+            except OSError:
+                continue
+            # rename 保留原本的修改時間，立即續約；這之前被誤判逾期時只會讓工作重新排隊，不會遺失
+            try:
+                os.utime(lease_path)
+            except FileNotFoundError:
+                continue
+            ticket = self._read_json(lease_path)
+            if ticket is None:
+                continue
+            return ticket, lease_path
+        return None
+
+    def _renew_leases(self):
+        with self._leases_lock:
+            lease_paths = [path for path, held in self._leases.items() if held]
+        for lease_path in lease_paths:
+            try:
+                os.utime(lease_path)
+            except FileNotFoundError:
+                print(f"工作租約已被其他節點回收: {os.path.basename(lease_path)}")
+                with self._leases_lock:
+                    if lease_path in self._leases:
+                        self._leases[lease_path] = False
+
+    def reclaim_expired(self):
+        """
+        將逾期未續約的工作重新排入佇列，超過重試次數時標記為失敗
+
+        Returns:
+            int: 回收的工作數量
+        """
+        now = time.time()
+        reclaimed = 0
+        for entry in os.scandir(os.path.join(self.root, LEASES_DIR)):
+            try:
+                if now - entry.stat().st_mtime < self.lease_seconds:
+                    continue
+            except FileNotFoundError:
+                continue
+            # 先 rename 取得回收權，同時回收的其他節點與原本的工作節點都會失敗
+            reclaim_path = self._path(TMP_DIR, f"reclaim_{entry.name}")
+            try:
+                os.rename(entry.path, reclaim_path)
+            except OSError:
+                continue
+            ticket = self._read_json(reclaim_path)
+            if ticket is not None:
+                self._requeue(ticket)
+                reclaimed += 1
+            os.remove(reclaim_path)
+        return reclaimed
+
+    def _requeue(self, ticket):
+        job_id = ticket['id']
+        ticket['attempts'] = ticket.get('attempts', 0) + 1
+        if ticket['attempts'] >= self.max_attempts:
+            error = f"工作節點在處理期間失去回應 {ticket['attempts']} 次，已停止重試"
+            self._finish(job_id, None, self.STATUS_FAILED, error)
+            return
+        print(f"工作租約逾期，重新排入佇列: {job_id}（第 {ticket['attempts']} 次）")
+        self.publish(job_id, {'type': 'status', 'status': self.STATUS_QUEUED, 'attempts': ticket['attempts']})
+        self._update_status(job_id, status=self.STATUS_QUEUED, node=None, attempts=ticket['attempts'])
+        self._write_json(self._path(QUEUE_DIR, f"{job_id}.json"), ticket)
+
+    def _finish(self, job_id, result, status, error):
+        job = self.get(job_id)
+        if job is None:
+            return
+        finished_at = time.time()
+        timings = dict(job.get('timings') or {})
+        if result and isinstance(result.get('timings'), dict):
+            timings.update(result['timings'])
+        timings['total'] = round(finished_at - job['created_at'], 3)
+        # 先寫入事件再更新狀態，看到結束狀態的讀取端一定能讀到結束事件
+        self.publish(job_id, {'type': 'status', 'status': status, 'timings': timings, 'result': result,
+                              'error': error})
+        self._update_status(
+            job_id, status=status, finished_at=finished_at, timings=timings, result=result, error=error,
+            temp_folder=result.get('temp_folder') if result else None
+        )
+        self._discard(self._path(INPUTS_DIR, job_id))
+
+    def prune(self):
+        """移除超過保留時間的已結束工作與其結果，以及當機節點留下的暫存檔案"""
+        now = time.time()
+        for entry in os.scandir(os.path.join(self.root, STATUS_DIR)):
+            record = self._read_json(entry.path)
+            if record is None or not record.get('finished_at'):
+                continue
+            if now - record['finished_at'] < self.retention_seconds:
+                continue
+            if not self._discard(entry.path):
+                continue
+            job_id = record['id']
+            self._discard(self._path(EVENTS_DIR, f"{job_id}.jsonl"))
+            self._discard(self._path(INPUTS_DIR, job_id))
+            if record.get('temp_folder'):
+                self._discard(self.result_path(record['temp_folder']))
+
+        for entry in os.scandir(os.path.join(self.root, TMP_DIR)):
+            try:
+                if now - entry.stat().st_mtime > _STALE_TMP_SECONDS:
+                    self._discard(entry.path)
+            except FileNotFoundError:
+                continue
+
+    def _maintenance_loop(self):
+        while not self._shutdown.wait(min(self.poll_interval * 5, self.lease_seconds / 3)):
+            try:
+                self._renew_leases()
+                self.reclaim_expired()
+                self.prune()
+            except OSError as e:
+                print(f"共用佇列維護失敗: {e}")
+
+    def start_workers(self, handler, forget_folder=None):
+        """
+        啟動認領工作的執行緒
+
+        Args:
+            handler (callable): 接收 (工作內容, 輸入檔案路徑, 進度回呼)，回傳 (結果字典, 結果資料夾路徑)，
+                失敗時拋出例外；結果資料夾會被移入共用目錄
+            forget_folder (callable): 結果資料夾移走後呼叫，用於取消本機的清理排程與儲存用量記錄（可選）
+        """
+        self._handler = handler
+        self._forget_folder = forget_folder
+        for index in range(self.workers):
+            thread = threading.Thread(target=self._worker_loop, name=f'spool-worker-{index}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def _worker_loop(self):
+        while not self._shutdown.is_set():
+            try:
+                claimed = self.claim()
+            except OSError as e:
+                print(f"認領工作失敗: {e}")
+                claimed = None
+            if claimed is None:
+                self._shutdown.wait(self.poll_interval)
+                continue
+            self._process(*claimed)
+
+    def _process(self, ticket, lease_path):
+        job_id = ticket['id']
+        with self._leases_lock:
+            self._leases[lease_path] = True
+
+        started_at = time.time()
+        job = self._update_status(
+            job_id,
+            status=self.STATUS_RUNNING,
+            started_at=started_at,
+            node=self.node_name,
+            timings={'queue_wait': round(started_at - ticket['created_at'], 3)}
+        )
+        self.publish(job_id, {'type': 'status', 'status': self.STATUS_RUNNING, 'node': self.node_name})
+
+        result, folder_path, error = None, None, None
+        try:
+            result, folder_path = self._handler(
+                ticket, self._path(INPUTS_DIR, os.path.join(job_id, 'input.pptx')),
+                lambda event: self.publish(job_id, event)
+            )
+        except Exception as e:
+            error = str(e) or e.__class__.__name__
+
+        try:
+            self._commit(job_id, lease_path, result, folder_path, error, job)
+        finally:
+            with self._leases_lock:
+                self._leases.pop(lease_path, None)
+
+    def _commit(self, job_id, lease_path, result, folder_path, error, job):
+        """將結果移入共用目錄並結束工作；租約已被回收時捨棄結果，由重新認領的節點完成"""
+        staged_path = None
+        if folder_path:
+            staged_path = self._path(TMP_DIR, f"{os.path.basename(folder_path)}.{uuid.uuid4().hex}")
+            shutil.move(folder_path, staged_path)
+            if self._forget_folder:
+                self._forget_folder(folder_path)
+
+        # rename 租約檔案證明仍擁有工作，之後其他節點不會再回收
+        commit_path = self._path(TMP_DIR, f"commit_{os.path.basename(lease_path)}")
+        try:
+            os.rename(lease_path, commit_path)
+        except OSError:
+            print(f"工作租約已失效，捨棄結果: {job_id}")
+            if staged_path:
+                shutil.rmtree(staged_path, ignore_errors=True)
+            return
+
+        if job is None:
+            # 狀態已被清除（例如提交後超過保留時間才執行），結果沒有人能查詢
+            if staged_path:
+                shutil.rmtree(staged_path, ignore_errors=True)
+            os.remove(commit_path)
+            return
+        if staged_path:
+            os.rename(staged_path, self.result_path(os.path.basename(folder_path)))
+        if error:
+            self._finish(job_id, None, self.STATUS_FAILED, error)
+        else:
+            self._finish(job_id, result, self.STATUS_DONE, None)
+        os.remove(commit_path)
+
+    def shutdown(self, wait=False):
+        """停止認領新工作，執行中的工作完成後結束"""
+        self._shutdown.set()
+        if wait:
+            for thread in self._threads:
+                thread.join()
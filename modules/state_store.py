@@ -0,0 +1,179 @@
+"""
+共用狀態模組
+以 SQLite 保存清理排程、儲存用量、非同步工作與轉換快取索引，
+同一台主機上的多個服務程序讀寫同一個資料庫，狀態保持一致
+"""
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+_STATE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS state (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+
+def is_process_alive(pid):
+    """
+    檢查程序是否仍在執行
+
+    Args:
+        pid (int): 程序 ID
+
+    Returns:
+        bool: 無法判斷時視為仍在執行
+    """
+    if pid is None or pid == os.getpid():
+        return True
+    if os.name == 'nt':
+        # Windows 的 os.kill 會直接結束程序，改用 psutil 判斷
+        try:
+            import psutil
+        except ImportError:
+            return True
+        return psutil.pid_exists(pid)
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class StateStore:
+    """
+    每個程序使用一個連線，程序內以鎖串行化；程序間由 SQLite 的檔案鎖協調
+    資料庫需位於本機磁碟（WAL 模式不支援網路檔案系統）
+    """
+
+    def __init__(self, db_path, busy_timeout_seconds=30):
+        self.db_path = db_path
+        self.busy_timeout_seconds = busy_timeout_seconds
+        self._lock = threading.RLock()
+        self._connection = None
+        self._pid = None
+
+        directory = os.path.dirname(os.path.abspath(db_path))
+        os.makedirs(directory, exist_ok=True)
+        self.ensure_schema(_STATE_SCHEMA)
+
+    def _connect(self):
+        # fork 之後不可沿用父程序的連線
+        if self._connection is None or self._pid != os.getpid():
+            connection = sqlite3.connect(
+                self.db_path,
+                timeout=self.busy_timeout_seconds,
+                isolation_level=None,
+                check_same_thread=False
+            )
+            connection.row_factory = sqlite3.Row
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            self._connection = connection
+            self._pid = os.getpid()
+        return self._connection
+
+    def close(self):
+        """關閉本程序的連線，下次存取時重新建立"""
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+    def ensure_schema(self, script):
+        """
+        建立資料表（已存在時略過）
+
+        Args:
+            script (str): CREATE TABLE IF NOT EXISTS 等 SQL 敘述
+        """
+        with self._lock:
+            self._connect().executescript(script)
+
+    def execute(self, sql, params=()):
+        """
+        執行單一寫入敘述（自動提交）
+
+        Returns:
+            int: 受影響的列數
+        """
+        with self._lock:
+            return self._connect().execute(sql, params).rowcount
+
+    def query(self, sql, params=()):
+        """
+        執行查詢
+
+        Returns:
+            list: sqlite3.Row 清單
+        """
+        with self._lock:
+            return self._connect().execute(sql, params).fetchall()
+
+    def query_one(self, sql, params=()):
+        """
+        執行查詢並回傳第一列
+
+        Returns:
+            sqlite3.Row | None: 沒有資料時回傳 None
+        """
+        with self._lock:
+            return self._connect().execute(sql, params).fetchone()
+
+    @contextmanager
+    def transaction(self):
+        """
+        以 BEGIN IMMEDIATE 開始交易，交易期間其他程序的寫入會等待
+
+        Yields:
+            sqlite3.Connection: 資料庫連線
+        """
+        with self._lock:
+            connection = self._connect()
+            connection.execute('BEGIN IMMEDIATE')
+            try:
+                yield connection
+            except BaseException:
+                connection.execute('ROLLBACK')
+                raise
+            connection.execute('COMMIT')
+
+    def get_value(self, key, default=None):
+        row = self.query_one('SELECT value FROM state WHERE key = ?', (key,))
+        return row['value'] if row is not None else default
+
+    def set_value(self, key, value):
+        self.execute(
+            'INSERT INTO state (key, value) VALUES (?, ?) '
+            'ON CONFLICT (key) DO UPDATE SET value = excluded.value',
+            (key, value)
+        )
+
+    def claim_interval(self, name, interval_seconds):
+        """
+        週期性工作的執行權：距離上次執行（任一程序）已超過間隔時才回傳 True
+
+        Args:
+            name (str): 工作名稱
+            interval_seconds (float): 執行間隔
+
+        Returns:
+            bool: 本程序是否應該執行
+        """
+        key = f"last_run:{name}"
+        now = time.time()
+        with self.transaction() as connection:
+            row = connection.execute('SELECT value FROM state WHERE key = ?', (key,)).fetchone()
+            if row is not None and now - float(row['value']) < interval_seconds:
+                return False
+            connection.execute(
+                'INSERT INTO state (key, value) VALUES (?, ?) '
+                'ON CONFLICT (key) DO UPDATE SET value = excluded.value',
+                (key, str(now))
+            )
+        return True
@@ -0,0 +1,163 @@
+"""
+串流上傳模組
+multipart 中的 PPTX 在解析時直接寫入臨時資料夾中的最終位置，同一次寫入計算 SHA-256 與大小，
+不再由 Werkzeug 先暫存整個檔案再複製一次；開頭不是 ZIP 簽章或超過儲存空間時立即中止上傳
+"""
+import hashlib
+import json
+import os
+import time
+
+from flask import Request, Response
+from werkzeug.exceptions import HTTPException
+
+# PPTX（OOXML）是 ZIP 檔案，以本機檔案標頭開頭
+ZIP_SIGNATURE = b'PK\x03\x04'
+# 每寫入這麼多 bytes 更新一次儲存用量並重新檢查容量，同時進行的上傳互相可見
+RECORD_INTERVAL_BYTES = 8 * 1024 * 1024
+
+
+class UploadRejected(HTTPException):
+    """上傳內容無效或儲存空間不足，回應 JSON 錯誤並要求關閉連線，不再讀取剩餘內容"""
+
+    def __init__(self, code, message):
+        response = Response(json.dumps({'error': message}), status=code, mimetype='application/json')
+        response.headers['Connection'] = 'close'
+        super().__init__(description=message, response=response)
+        self.code = code
+
+
+class StreamedUpload:
+    """
+    Werkzeug 寫入上傳內容的目標檔案
+    解析完成後可像一般檔案一樣讀取；未被 claim 的上傳在請求結束時清理
+    """
+
+    def __init__(self, file_manager):
+        self.file_manager = file_manager
+        self.folder_name, self.folder_path = file_manager.create_temp_folder()
+        self.path = os.path.join(self.folder_path, f"input_{int(time.time() * 1000)}.pptx")
+        self.size_bytes = 0
+        self.sha256 = None
+        self.upload_seconds = None
+        self.claimed = False
+        self.closed = False
+        self._file = open(self.path, 'w+b')
+        self._digest = hashlib.sha256()
+        self._head = b''
+        self._unrecorded_bytes = 0
+        self._start = time.time()
+
+    def _reject(self, code, message):
+        self.close()
+        raise UploadRejected(code, message)
+
+    def _record_bytes(self):
+        if self._unrecorded_bytes:
+            self.file_manager.record_bytes(self.folder_path, self._unrecorded_bytes)
+            self._unrecorded_bytes = 0
+
+    def write(self, data):
+        if len(self._head) < len(ZIP_SIGNATURE):
+            self._head += data[:len(ZIP_SIGNATURE) - len(self._head)]
+            if not ZIP_SIGNATURE.startswith(self._head):
+                self._reject(400, '檔案內容不是有效的 PPTX（ZIP）格式')
+
+        self._digest.update(data)
+        self._file.write(data)
+        self.size_bytes += len(data)
+        self._unrecorded_bytes += len(data)
+
+        if self._unrecorded_bytes >= RECORD_INTERVAL_BYTES:
+            self._record_bytes()
+            available, current_size_gb, max_size_gb = self.file_manager.is_storage_available()
+            if not available:
+                self._reject(507, f'儲存空間不足，目前使用 {current_size_gb:.2f}GB，超過限制 {max_size_gb:.2f}GB')
+        return len(data)
+
+    def _finish(self):
+        """Werkzeug 寫完檔案後呼叫 seek(0)，此時完成雜湊並記錄大小"""
+        if len(self._head) < len(ZIP_SIGNATURE):
+            self._reject(400, '檔案內容不是有效的 PPTX（ZIP）格式')
+        self._file.flush()
+        self._record_bytes()
+        self.sha256 = self._digest.hexdigest()
+        self.upload_seconds = time.time() - self._start
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        if self.sha256 is None:
+            self._finish()
+        return self._file.seek(offset, whence)
+
+    def __getattr__(self, name):
+        # read、tell 等操作直接交給檔案，供 zipfile 等讀取已完成的上傳
+        return getattr(self._file, name)
+
+    def claim(self):
+        """
+        取得上傳檔案的所有權，請求結束時不再清理
+
+        Returns:
+            dict: 與 receive_upload 相同格式的上傳資訊
+        """
+        self.claimed = True
+        return {
+            'temp_folder_name': self.folder_name,
+            'temp_folder_path': self.folder_path,
+            'pptx_path': self.path,
+            'size_bytes': self.size_bytes,
+            'sha256': self.sha256,
+            'upload_seconds': self.upload_seconds
+        }
+
+    def close(self):
+        # 請求結束時與 Werkzeug 關閉檔案時都會呼叫，只清理一次
+        if self.closed:
+            return
+        self.closed = True
+        self._file.close()
+        if not self.claimed:
+            self.file_manager.cleanup_folder(self.folder_path)
+
+
+def create_request_class(file_manager):
+    """
+    建立將 PPTX 上傳直接寫入臨時資料夾的 Request 類別
+
+    Args:
+        file_manager: FileManager 實例
+
+    Returns:
+        type: flask.Request 的子類別
+    """
+    class StreamingUploadRequest(Request):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            # 本次請求建立的所有上傳；後面的欄位被拒絕時 request.files 不會建立，需要自行清理
+            self._streamed_uploads = []
+
+        def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+            # 其他檔案沿用 Werkzeug 的暫存方式，由各端點回應格式錯誤
+            if not filename or not filename.lower().endswith('.pptx'):
+                return super()._get_file_stream(total_content_length, content_type, filename, content_length)
+
+            size_bytes, _ = file_manager.get_total_temp_size()
+            expected_bytes = content_length or total_content_length or 0
+            if size_bytes + expected_bytes > file_manager.max_size_bytes:
+                max_size_gb = file_manager.max_size_bytes / (1024 * 1024 * 1024)
+                raise UploadRejected(
+                    507, f'儲存空間不足，上傳 {expected_bytes / (1024 * 1024):.1f}MB 將超過限制 {max_size_gb:.2f}GB'
+                )
+            upload = StreamedUpload(file_manager)
+            self._streamed_uploads.append(upload)
+            return upload
+
+        def close(self):
+            try:
+                super().close()
+            finally:
+                # 未被 claim 的上傳（包括解析中止前已完成的欄位）在請求結束時清理
+                for upload in self._streamed_uploads:
+                    upload.close()
+
+    return StreamingUploadRequest
@@ -0,0 +1,69 @@
+"""
+串流 ZIP 模組
+邊讀取檔案邊產生 ZIP 內容，不在磁碟或記憶體中建立完整壓縮檔
+"""
+import os
+import zipfile
+
+# 已壓縮的格式再壓縮效益很低，直接以 STORED 寫入
+COMPRESSED_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.webp', '.avif', '.pdf', '.zip'}
+
+
+class _StreamBuffer:
+    """
+    提供給 zipfile 的不可 seek 寫入目標
+    zipfile 偵測到無法 seek 時會改用資料描述區，寫入的內容由產生器分段取出
+    """
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def stream_zip(entries, chunk_size=64 * 1024):
+    """
+    依序讀取檔案並產生 ZIP 資料
+
+    Args:
+        entries (iterable): (檔案路徑, 壓縮檔內名稱) 的序列，可為產生器，
+            取得下一個項目前已送出的資料都會先傳給客戶端
+        chunk_size (int): 每次讀取的大小（bytes）
+
+    Yields:
+        bytes: ZIP 資料片段
+    """
+    buffer = _StreamBuffer()
+    with zipfile.ZipFile(buffer, 'w', allowZip64=True) as archive:
+        for file_path, arcname in entries:
+            info = zipfile.ZipInfo.from_file(file_path, arcname)
+            extension = os.path.splitext(arcname)[1].lower()
+            info.compress_type = zipfile.ZIP_STORED if extension in COMPRESSED_EXTENSIONS else zipfile.ZIP_DEFLATED
+
+            with open(file_path, 'rb') as source, archive.open(info, 'w') as target:
+                while True:
+                    chunk = source.read(chunk_size)
+                    if not chunk:
+                        break
+                    target.write(chunk)
+                    data = buffer.drain()
+                    if data:
+                        yield data
+            data = buffer.drain()
+            if data:
+                yield data
+
+    # 中央目錄在關閉時寫入
+    data = buffer.drain()
+    if data:
+        yield data
@@ -0,0 +1,60 @@
+"""
+共用佇列工作節點
+不提供 HTTP 服務，只從 SPOOL_FOLDER 認領 API 節點提交的工作並將結果寫回共用目錄
+可在同一台主機啟動多個程序共用同一個目錄，或在多個容器掛載同一個共用磁碟區
+"""
+import importlib.util
+import os
+import signal
+import sys
+import threading
+
+# 未指定時以 JOB_WORKERS（預設為 CPU 核心數）作為認領執行緒數
+os.environ.setdefault(
+    'SPOOL_WORKERS', os.environ.get('JOB_WORKERS', os.environ.get('MAX_CONCURRENT_CONVERSIONS', str(os.cpu_count() or 1)))
+)
+
+from modules.config import Config  # noqa: E402
+
+# api-server.py 的檔名含有連字號，無法直接 import
+_spec = importlib.util.spec_from_file_location(
+    'api_server', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'api-server.py')
+)
+api_server = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(api_server)
+
+
+def main():
+    """主函數"""
+    if not Config.SPOOL_FOLDER:
+        print("未設定 SPOOL_FOLDER，工作節點需要與 API 節點共用的目錄")
+        sys.exit(1)
+    
+    # 同一台主機可能同時執行多個工作節點，各自使用獨立的 LibreOffice 設定檔目錄
+    _, converter, _, error = api_server.build_app(multi_process=True)
+    if error:
+        print(f"初始化失敗: {error}")
+        sys.exit(1)
+    
+    print("=" * 60)
+    print("PPTX 轉換工作節點")
+    print("=" * 60)
+    print(f"  - LibreOffice: {'可用' if converter.is_libreoffice_available() else '不可用'}")
+    print(f"  - 共用佇列目錄: {Config.SPOOL_FOLDER}")
+    print(f"  - 認領執行緒: {Config.SPOOL_WORKERS} 個")
+    print(f"  - 租約有效時間: {Config.SPOOL_LEASE_SECONDS} 秒（最多重試 {Config.SPOOL_MAX_ATTEMPTS} 次）")
+    print("=" * 60)
+    
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda signum, frame: stop.set())
+    try:
+        while not stop.wait(1):
+            pass
+    except KeyboardInterrupt:
+        pass
+    # 執行中的工作不再續約，租約逾期後由其他節點重新執行
+    print("\n工作節點已停止")
+
+
+if __name__ == '__main__':
+    main()
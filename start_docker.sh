@@ -101,6 +101,7 @@ echo "  - DEBUG: ${DEBUG:-false}"
 echo "  - TEMP_FOLDER: ${TEMP_FOLDER:-/app/temp}"
 echo "  - MAX_STORAGE_GB: ${MAX_STORAGE_GB:-10}"
 echo "  - CLEANUP_INTERVAL_MINUTES: ${CLEANUP_INTERVAL_MINUTES:-20}"
+echo "  - WEB_WORKERS: ${WEB_WORKERS:-1}"
 
 # 測試 LibreOffice 轉換功能
 echo ""
@@ -121,5 +122,8 @@ echo ""
 echo "🚀 啟動 PPTX 轉換 API 服務器..."
 echo "=========================================="
 
-# 執行主應用程式
+# 執行主應用程式（WEB_WORKERS 大於 1 時以 gunicorn 啟動多個工作程序）
+if [ "${WEB_WORKERS:-1}" -gt 1 ]; then
+    exec gunicorn -c gunicorn.conf.py wsgi:app
+fi
 exec python3 api-server.py
@@ -0,0 +1,57 @@
+"""
+轉換佇列的准入測試
+"""
+import threading
+import unittest
+
+from modules.admission import ConversionQueue
+
+
+class ConversionQueueAdmitTest(unittest.TestCase):
+    def test_idle_queue_admits_up_to_free_slots_with_depth_zero(self):
+        conversion_queue = ConversionQueue(max_concurrent=2, max_queue_depth=0)
+
+        first = conversion_queue.admit()
+        second = conversion_queue.admit()
+
+        self.assertIsNotNone(first)
+        self.assertIsNotNone(second)
+        self.assertIsNone(conversion_queue.admit())
+        self.assertEqual(conversion_queue.get_status()['rejected'], 1)
+
+    def test_running_conversions_leave_room_for_queue_depth(self):
+        conversion_queue = ConversionQueue(max_concurrent=1, max_queue_depth=1)
+        started = threading.Event()
+        finish = threading.Event()
+
+        def convert(ticket):
+            with ticket.slot():
+                started.set()
+                finish.wait(5)
+
+        worker = threading.Thread(target=convert, args=(conversion_queue.admit(),))
+        worker.start()
+        try:
+            self.assertTrue(started.wait(5))
+            queued = conversion_queue.admit()
+            self.assertIsNotNone(queued)
+            self.assertIsNone(conversion_queue.admit())
+        finally:
+            finish.set()
+            worker.join(5)
+
+        queued.release()
+        self.assertIsNotNone(conversion_queue.admit())
+
+    def test_released_ticket_frees_its_place(self):
+        conversion_queue = ConversionQueue(max_concurrent=1, max_queue_depth=0)
+
+        ticket = conversion_queue.admit()
+        self.assertIsNone(conversion_queue.admit())
+        ticket.release()
+
+        self.assertIsNotNone(conversion_queue.admit())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,17 @@
+"""
+WSGI 進入點
+供 gunicorn 等多程序伺服器載入：gunicorn -c gunicorn.conf.py wsgi:app
+"""
+import importlib.util
+import os
+
+# api-server.py 的檔名含有連字號，無法直接 import
+_spec = importlib.util.spec_from_file_location(
+    'api_server', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'api-server.py')
+)
+api_server = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(api_server)
+
+app, _, _, _error = api_server.build_app(multi_process=True)
+if _error:
+    raise RuntimeError(f"初始化失敗: {_error}")